@@ -1,11 +1,18 @@
 # Updated OperatorAgent with new OpenAI v1 syntax for handling chat completions
 
+import asyncio
 import os
-from openai import OpenAI
-from config.constants import DEFAULT_SECURITY_LEVEL
+from config.constants import DEFAULT_SECURITY_LEVEL, DEFAULT_TIMEOUT, SESSION_ID_MIN_LENGTH
+from core.chunk_store import SECURITY_LEVELS
+from core.generic_agent import GenericAgent
+from core.intent_router import create_intent_router
+from core.metrics import LatencyStats, MetricSample, RequestTimer, get_metrics, span
+from core.openai_clients import iterate_sync, run_sync
+from core.providers import create_client, resolve_providers
 
 class OperatorAgent:
-    def __init__(self, openai_api_key, config_manager=None, session_manager=None, prompt_path="prompts/operator_prompt.md"):
+    def __init__(self, openai_api_key, config_manager=None, session_manager=None, prompt_path="prompts/operator_prompt.md",
+                 client=None, async_client=None, intent_router=None):
         """
         Initialize the OperatorAgent with OpenAI API key, configuration, session managers, and system prompt.
         
@@ -14,11 +21,34 @@ class OperatorAgent:
         - config_manager (ConfigManager, optional): Manages configuration data.
         - session_manager (SessionManager, optional): Manages session data for interactions.
         - prompt_path (str): Path to the system prompt file.
+        - client (openai.OpenAI, optional): Client to use instead of the shared pooled client.
+        - async_client (openai.AsyncOpenAI, optional): Async client to use instead of the shared pooled client.
+        - intent_router (IntentRouter, optional): Picks the agent for requests without a 'type';
+                                                  defaults to one built from the `intent_router` settings.
         """
         self.config_manager = config_manager
         self.session_manager = session_manager
         self.agent_registry = {}
-        self.client = OpenAI(api_key=openai_api_key)  # Initialize OpenAI client with new syntax
+        self.openai_api_key = openai_api_key
+        self.openai_timeout = DEFAULT_TIMEOUT
+        if config_manager is not None:
+            self.openai_timeout = (config_manager.get_global_setting("openai", {}) or {}).get("timeout", DEFAULT_TIMEOUT)
+        # Completions (and the router's embeddings) come from the global providers; OpenAI
+        # clients are shared with every other agent in the process, so connections are pooled
+        self.providers = resolve_providers(config_manager)
+        self.chat_model = self.providers["completions"]["model"]
+        self.client = client if client is not None else create_client(self.providers, openai_api_key,
+                                                                      timeout=self.openai_timeout)
+        self.async_client = async_client
+        self.time_to_first_token = LatencyStats()
+        self.total_latency = LatencyStats()
+        # Requests without a 'type' are classified locally, falling back to the chat model only when unsure
+        if intent_router is None:
+            intent_router = create_intent_router(config_manager, client=self.client,
+                                                 model=self.providers["embeddings"]["model"],
+                                                 chat_model=self.chat_model)
+        self.intent_router = intent_router
+        get_metrics().register_collector(self.metric_samples)
 
         # Load system prompt from file
         self.system_prompt = self.load_prompt(prompt_path)
@@ -49,7 +79,12 @@ class OperatorAgent:
         """
         self.agent_registry[name] = agent_instance
 
-    def interpret_and_respond(self, user_input):
+    def _get_async_client(self):
+        if self.async_client is not None:
+            return self.async_client
+        return create_client(self.providers, self.openai_api_key, timeout=self.openai_timeout, asynchronous=True)
+
+    async def interpret_and_respond_async(self, user_input):
         """
         Conversationally interprets user input and provides a response based on intent.
         
@@ -59,17 +94,15 @@ class OperatorAgent:
         Returns:
         - str: A conversational response based on the input.
         """
+        timer = RequestTimer(self.time_to_first_token, self.total_latency)
         try:
-            # Use the new OpenAI client syntax for chat completions
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                max_tokens=150,
-                temperature=0.7
-            )
+            with span("completion", agent="operator"):
+                response = await self._get_async_client().chat.completions.create(
+                    model=self.chat_model,
+                    messages=self._messages(user_input),
+                    max_tokens=150,
+                    temperature=0.7
+                )
             
             # Correctly access the response content
             response_text = response.choices[0].message.content.strip()
@@ -78,18 +111,88 @@ class OperatorAgent:
         except Exception as e:
             print(f"Error in interpreting user input: {e}")
             return "I'm sorry, but I encountered an issue processing your request."
+        finally:
+            timer.finish()
 
+    def interpret_and_respond(self, user_input):
+        return run_sync(self.interpret_and_respond_async(user_input))
 
-    def route_request(self, request):
+    async def interpret_and_respond_stream_async(self, user_input):
         """
-        Routes the request to the appropriate agent based on its type.
-        
+        Like `interpret_and_respond_async`, but yields the response as it is generated.
+
         Parameters:
-        - request (dict): A dictionary containing request details.
-                          Expected keys are 'type' (str) and 'content' (str).
-        
+        - user_input (str): The conversational input from the user.
+
+        Yields:
+        - str: Pieces of the response text, in order.
+        """
+        timer = RequestTimer(self.time_to_first_token, self.total_latency)
+        started = False
+        try:
+            stream = await self._get_async_client().chat.completions.create(
+                model=self.chat_model,
+                messages=self._messages(user_input),
+                max_tokens=150,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if not started and token:
+                    token = token.lstrip()
+                if token:
+                    timer.first_token()
+                    if not started:
+                        started = True
+                        yield "Operator Agent: "
+                    yield token
+
+        except Exception as e:
+            print(f"Error in interpreting user input: {e}")
+            if not started:
+                yield "I'm sorry, but I encountered an issue processing your request."
+        finally:
+            timer.finish()
+
+    def interpret_and_respond_stream(self, user_input):
+        """
+        Synchronous generator version of `interpret_and_respond_stream_async`.
+        """
+        return iterate_sync(self.interpret_and_respond_stream_async(user_input))
+
+    def latency_stats(self):
+        """
+        Returns 'time_to_first_token' and 'total' latency summaries, in seconds.
+        """
+        return {"time_to_first_token": self.time_to_first_token.summary(), "total": self.total_latency.summary()}
+
+    def metric_samples(self):
+        """
+        Returns the operator's latency summaries and the intent router's decisions per stage,
+        for the metrics registry.
+        """
+        samples = [MetricSample("request_seconds", "summary", {"agent": "operator", "measure": measure}, stats,
+                                "Request latency")
+                   for measure, stats in self.latency_stats().items()]
+        if self.intent_router is not None:
+            samples += [MetricSample("intent_route_decisions", "counter", {"path": path}, count,
+                                     "Routing decisions by the stage that made them")
+                        for path, count in self.intent_router.stats().items() if path != "fast_path_rate"]
+        return samples
+
+    def _messages(self, user_input):
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_input}
+        ]
+
+    def _select_agent(self, request):
+        """
+        Finds the registered agent for a request's type.
+
         Returns:
-        - response (str): The response from the routed agent.
+        - (object, str): The agent (or None) and an error message (or None).
         """
         request_type = request.get('type')
         
@@ -99,17 +202,113 @@ class OperatorAgent:
         elif request_type == 'document_processing':
             agent = self.agent_registry.get('Document_Processor')
         else:
-            return "Error: Unknown request type."
+            return None, "Error: Unknown request type."
 
-        if agent:
-            # Pass the entire request dictionary to the agent
-            return agent.handle_request(request)
+        if agent is None:
+            return None, f"Error: No agent found for {request_type}"
+        return agent, None
+
+    async def _classify_request(self, request):
+        """
+        Picks the agent for a request without a 'type' using the intent router.
+
+        Returns:
+        - (object, RouteDecision): The agent (None if no route fits) and the router's decision.
+        """
+        content = request.get('content', '')
+        with span("intent_routing", agent="operator"):
+            # If the chat model is asked, it answers unroutable requests in the same call
+            decision = await self.intent_router.route_async(content, candidates=list(self.agent_registry),
+                                                            async_client=self._get_async_client(),
+                                                            fallback_prompt=self.system_prompt)
+        agent = self.agent_registry.get(decision.route) if decision.route else None
+        if (isinstance(agent, GenericAgent) and decision.query_embedding is not None
+                and agent.embedding_model == self.intent_router.model):
+            agent.remember_query_embedding(content, decision.query_embedding)  # Reused for retrieval
+        return agent, decision
+
+    def route_request(self, request, return_route=False):
+        """
+        Routes the request to the appropriate agent based on its type.
+
+        Requests without a 'type' are classified by the intent router; if no agent fits,
+        the operator answers conversationally.
+        
+        Parameters:
+        - request (dict): A dictionary containing request details.
+                          Expected keys are 'type' (str, optional) and 'content' (str).
+        - return_route (bool): Also return the router's decision (None for typed requests).
+        
+        Returns:
+        - response (str): The response from the routed agent, or (response, RouteDecision) with `return_route`.
+        """
+        return run_sync(self.route_request_async(request, return_route))
+
+    async def route_request_async(self, request, return_route=False):
+        """
+        Async version of `route_request`; agents without an async API run in a worker thread.
+        """
+        decision = None
+        if request.get('type') is None and self.intent_router is not None:
+            agent, decision = await self._classify_request(request)
+            if agent is None:
+                if decision.reply:
+                    response = f"Operator Agent: {decision.reply}"
+                else:
+                    response = await self.interpret_and_respond_async(request.get('content', ''))
+                return (response, decision) if return_route else response
+            error = None
+        else:
+            agent, error = self._select_agent(request)
+
+        if error:
+            response = error
+        elif not self.access_control(request):
+            response = "Error: Access denied."
+        elif isinstance(agent, GenericAgent):
+            # Retrieval agents filter chunks by the user's clearance inside the index search
+            response = await agent.handle_request_async(request.get('content', ''), clearance=self.clearance_for(request),
+                                                        session_id=request.get('session_id'))
         else:
-            return f"Error: No agent found for {request_type}"
+            # Pass the entire request dictionary to the agent
+            response = await asyncio.to_thread(agent.handle_request, request)
+        return (response, decision) if return_route else response
+
+    def clearance_for(self, request):
+        """
+        Determines the security level a request's user is cleared for.
+
+        The clearance comes from the session the request's 'session_id' names (its 'clearance'
+        value), never from a level the request asks for. The session ID is therefore a bearer
+        secret: it must be random and unguessable (see `core.session_manager.new_session_id`),
+        and IDs shorter than SESSION_ID_MIN_LENGTH never get more than the default clearance.
+        Requests without a known session get the configured `access_control.default_clearance`,
+        or the default security level.
+
+        Parameters:
+        - request (dict): A dictionary containing request details, optionally a 'session_id' key.
+
+        Returns:
+        - str: One of the chunk store's security levels.
+        """
+        default = None
+        if self.config_manager is not None:
+            default = (self.config_manager.get_global_setting('access_control', {}) or {}).get('default_clearance')
+        default = default if default in SECURITY_LEVELS else DEFAULT_SECURITY_LEVEL
+
+        clearance = None
+        session_id = request.get('session_id')
+        if self.session_manager is not None and session_id is not None:
+            clearance = self.session_manager.get_session_data(session_id, 'clearance')
+        if clearance not in SECURITY_LEVELS:
+            return default
+        if SECURITY_LEVELS.index(clearance) > SECURITY_LEVELS.index(default) and len(str(session_id)) < SESSION_ID_MIN_LENGTH:
+            return default  # A short ID could be guessed, so it grants nothing beyond the default
+        return clearance
 
     def access_control(self, request):
         """
-        Simulate access control by checking if the request has proper access permissions.
+        Checks whether the request's user is cleared for the security level the request asks for.
         
         Parameters:
         - request (dict): A dictionary containing request details, including a 'security_level' key.
@@ -117,12 +316,9 @@ class OperatorAgent:
         Returns:
         - (bool): True if access is allowed, False otherwise.
         """
-        required_security_level = request.get('security_level', 'public')
-        
-        # Placeholder for more detailed access control using config or session data
-        if required_security_level == 'confidential':
-            return False  # Placeholder restriction on confidential access
-        
-        return True
+        required_security_level = request.get('security_level', DEFAULT_SECURITY_LEVEL)
+        if required_security_level not in SECURITY_LEVELS:
+            return False
+        return SECURITY_LEVELS.index(required_security_level) <= SECURITY_LEVELS.index(self.clearance_for(request))
 
 # This allows `OperatorAgent` to accept and use both config_manager and session_manager if needed.
@@ -1,7 +1,10 @@
 from core.generic_agent import GenericAgent
 
 class VProTroubleshootingAgent(GenericAgent):
-    def __init__(self, openai_api_key, config_manager=None, session_manager=None):
+    def __init__(self, openai_api_key, config_manager=None, session_manager=None, client=None, async_client=None,
+                 vector_store_path=None):
         prompt_path = "teams/intel_vpro/prompts/vpro_troubleshooting_prompt.md"
-        super().__init__(openai_api_key, prompt_path, config_manager=config_manager, session_manager=session_manager)
+        super().__init__(openai_api_key, prompt_path, config_manager=config_manager, session_manager=session_manager,
+                         team_name="intel_vpro", client=client, async_client=async_client,
+                         vector_store_path=vector_store_path)
 
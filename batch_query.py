@@ -0,0 +1,102 @@
+# batch_query.py
+
+# Replays many queries (e.g. historical tickets) through a team agent and writes one JSON
+# line per answer, with per-stage timings, as soon as each answer is ready.
+#
+# Input is JSONL with a "query" (or "content") field and an optional "id", or plain text
+# with one query per line. Output lines carry the input's id, the query, the response,
+# the chunks used and the timings; a summary goes to stderr at the end.
+#
+# Usage:
+#   python batch_query.py tickets.jsonl --output answers.jsonl
+#   python batch_query.py tickets.txt --batch-size 512 --max-concurrency 32 --fake-openai
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from agents.troubleshooting_agent import VProTroubleshootingAgent
+from core.config_manager import ConfigManager
+from core.providers import resolve_providers, uses_openai
+
+def read_queries(path, ids):
+    """
+    Reads queries from a JSONL or plain text file, one per line.
+
+    Parameters:
+    - path (str): The input file.
+    - ids (list): Receives each query's id (its "id" field, or its line number).
+
+    Yields:
+    - str: The queries, in file order.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = None
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+            if isinstance(record, dict):
+                query = record.get("query") or record.get("content") or ""
+                ids.append(record.get("id", line_number))
+            else:
+                query = line
+                ids.append(line_number)
+            yield query
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of queries in bulk, writing JSONL.")
+    parser.add_argument("input", help="JSONL file with a 'query' field per line, or a text file with one query per line.")
+    parser.add_argument("--output", help="Output JSONL file; defaults to stdout.")
+    parser.add_argument("--config", default="config/team_config.yaml")
+    parser.add_argument("--clearance", help="Security level the queries are answered at; defaults to the team's.")
+    parser.add_argument("--batch-size", type=int, help="Queries embedded and searched together.")
+    parser.add_argument("--max-concurrency", type=int, help="Completions in flight at once.")
+    parser.add_argument("--fake-openai", action="store_true", help="Use the offline fake OpenAI client.")
+    args = parser.parse_args()
+
+    config_manager = ConfigManager(args.config)
+    client, async_client = None, None
+    if args.fake_openai:
+        from core.fake_openai import FakeAsyncOpenAIClient, FakeOpenAIClient
+        client, async_client = FakeOpenAIClient(), FakeAsyncOpenAIClient()
+    openai_api_key = os.getenv("OPENAI_API_KEY") or ("fake" if args.fake_openai else None)
+    if not openai_api_key and uses_openai(resolve_providers(config_manager, 'intel_vpro')):
+        raise EnvironmentError("OPENAI_API_KEY not found in environment variables.")
+    agent = VProTroubleshootingAgent(openai_api_key, config_manager=config_manager, client=client, async_client=async_client)
+
+    ids = []
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    count = errors = 0
+    try:
+        for result in agent.handle_batch(read_queries(args.input, ids), clearance=args.clearance,
+                                         batch_size=args.batch_size, max_concurrency=args.max_concurrency):
+            result["id"] = ids[result["index"]]
+            result["timings"] = {stage: round(seconds, 4) for stage, seconds in result["timings"].items()}
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            count += 1
+            errors += result["error"] is not None
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"Answered {count} queries in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f}/s), {errors} errors.",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
+
+# Example usage:
+# $ python batch_query.py tickets.jsonl --output answers.jsonl --max-concurrency 32
+# $ head -1 answers.jsonl
+# {"index": 0, "query": "AMT provisioning fails", "response": "...", "error": null, "sources": [["intel_vpro", 12]],
+#  "timings": {"embedding": 0.0004, "search": 0.0001, "completion": 0.61, "total": 0.83}, "id": "INC-1001"}
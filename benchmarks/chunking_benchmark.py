@@ -0,0 +1,89 @@
+# benchmarks/chunking_benchmark.py
+
+# Compares the single-pass chunker in core/text_utils.py against the original
+# word-by-word implementation on a multi-megabyte synthetic document.
+#
+# The original re-encodes the growing chunk after every word, so it is only run on a
+# prefix of the document (--legacy-bytes) and its throughput is reported per MB.
+#
+# Usage:
+#   python -m benchmarks.chunking_benchmark --megabytes 4
+
+import argparse
+import random
+import time
+
+from core.text_utils import chunk_text_with_offsets, get_encoding
+
+def legacy_chunk_text(text, max_tokens=1000):
+    """
+    The original chunk_text: re-encodes the whole chunk after each appended word.
+    """
+    encoding = get_encoding("text-embedding-ada-002")
+    words = text.split()
+    chunks = []
+    current_chunk = []
+
+    for word in words:
+        current_chunk.append(word)
+        if len(encoding.encode(" ".join(current_chunk))) > max_tokens:
+            chunks.append(" ".join(current_chunk[:-1]))
+            current_chunk = [word]
+
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+
+    return chunks
+
+def make_document(size_bytes, seed=0):
+    """
+    Generates a manual-like document with headings, paragraphs and error codes.
+    """
+    rng = random.Random(seed)
+    words = ["Intel", "vPro", "AMT", "provisioning", "certificate", "the", "firmware", "must", "be",
+             "configured", "before", "remote", "KVM", "session", "network", "adapter", "TLS", "BIOS",
+             "MEBx", "password", "error", "0x80070005", "returned", "when", "client", "console"]
+    parts = []
+    size = 0
+    section = 0
+    while size < size_bytes:
+        section += 1
+        heading = f"\n\n{section}. TROUBLESHOOTING SECTION {section}\n\n"
+        paragraph = " ".join(
+            " ".join(rng.choice(words) for _ in range(rng.randint(8, 25))).capitalize() + "."
+            for _ in range(rng.randint(3, 8))
+        )
+        parts.append(heading)
+        parts.append(paragraph)
+        size += len(heading) + len(paragraph)
+    return "".join(parts)
+
+def time_call(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk_text implementations.")
+    parser.add_argument("--megabytes", type=float, default=4.0, help="Size of the synthetic document.")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="Maximum tokens per chunk.")
+    parser.add_argument("--overlap", type=int, default=0, help="Overlap tokens for the new chunker.")
+    parser.add_argument("--legacy-bytes", type=int, default=256 * 1024, help="Prefix size to run the legacy chunker on.")
+    args = parser.parse_args()
+
+    document = make_document(int(args.megabytes * 1024 * 1024))
+    megabytes = len(document.encode("utf-8")) / (1024 * 1024)
+    get_encoding("text-embedding-ada-002")  # Exclude tokenizer loading from both timings
+
+    chunks, elapsed = time_call(chunk_text_with_offsets, document, max_tokens=args.max_tokens, overlap_tokens=args.overlap)
+    print(f"New chunker:    {megabytes:.2f} MB in {elapsed:.2f}s ({megabytes / elapsed:.2f} MB/s), {len(chunks)} chunks")
+
+    prefix = document[:args.legacy_bytes]
+    prefix_megabytes = len(prefix.encode("utf-8")) / (1024 * 1024)
+    legacy_chunks, legacy_elapsed = time_call(legacy_chunk_text, prefix, max_tokens=args.max_tokens)
+    legacy_rate = prefix_megabytes / legacy_elapsed
+    print(f"Legacy chunker: {prefix_megabytes:.2f} MB in {legacy_elapsed:.2f}s ({legacy_rate:.3f} MB/s), "
+          f"{len(legacy_chunks)} chunks; ~{megabytes / legacy_rate:.0f}s projected for the full document")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/cold_start.py
+
+# Measures how long a fresh process takes to open a vector store and answer its first
+# query, and how much private memory it holds, for the legacy format (pickled chunk list,
+# index read into RAM) versus the memory-mapped chunk store and index.
+#
+# Private (anonymous) memory is what each worker process pays on its own; file-backed
+# memory comes from the page cache and is shared by every process mapping the same files.
+#
+# Usage:
+#   python -m benchmarks.cold_start --chunks 50000 --dimension 1536 --workers 4
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from core.chunk_store import write_chunk_store
+
+def write_stores(directory, chunk_count, dimension):
+    rng = np.random.default_rng(0)
+    chunks = [f"Chunk {i}: " + "AMT provisioning requires a valid certificate. " * 30 for i in range(chunk_count)]
+    vector_index = faiss.IndexFlatL2(dimension)
+    for start in range(0, chunk_count, 10000):
+        count = min(10000, chunk_count - start)
+        vector_index.add(rng.standard_normal((count, dimension)).astype('float32'))
+    faiss.write_index(vector_index, os.path.join(directory, "vector_store.index"))
+    with open(os.path.join(directory, "vector_store.index_chunks.pkl"), 'wb') as f:
+        pickle.dump(chunks, f)
+    write_chunk_store(os.path.join(directory, "vector_store.index_chunks.bin"), chunks)
+
+def memory_usage_mb():
+    """
+    Returns (private, file-backed) resident memory of this process in MB, from /proc (Linux only).
+    """
+    values = {}
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                key, value = line.split(":")
+                values[key] = int(value.split()[0]) / 1024
+    return values.get("RssAnon", 0.0), values.get("RssFile", 0.0)
+
+def run_child(mode, directory, dimension):
+    """
+    Runs in a fresh interpreter: loads the store, answers one query, and prints timings as JSON.
+    """
+    from core.vector_store import load_vector_store
+
+    index_path = os.path.join(directory, "vector_store.index")
+    chunks_path = os.path.join(directory, "vector_store.index_chunks.pkl" if mode == "legacy" else "vector_store.index_chunks.bin")
+
+    start = time.perf_counter()
+    vector_index, document_chunks = load_vector_store(index_path, chunks_path, mmap=(mode == "mmap"))
+    loaded = time.perf_counter()
+    query = np.random.default_rng(1).standard_normal((1, dimension)).astype('float32')
+    _, indices = vector_index.search(query, 3)
+    texts = [document_chunks[int(i)] for i in indices[0]]
+    answered = time.perf_counter()
+
+    private_mb, shared_mb = memory_usage_mb()
+    print(json.dumps({"load_s": loaded - start, "first_query_s": answered - loaded, "private_mb": private_mb,
+                      "file_backed_mb": shared_mb, "chars": sum(len(text) for text in texts)}))
+
+def spawn(mode, directory, dimension, workers):
+    command = [sys.executable, "-m", "benchmarks.cold_start", "--child", mode, "--dir", directory, "--dimension", str(dimension)]
+    processes = [subprocess.Popen(command, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    results = []
+    for process in processes:
+        output, _ = process.communicate()
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure vector store cold-start time and memory.")
+    parser.add_argument("--chunks", type=int, default=50000, help="Number of chunks in the synthetic store.")
+    parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension.")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes started concurrently.")
+    parser.add_argument("--child", choices=("legacy", "mmap"), help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.dir, args.dimension)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Writing a synthetic store with {args.chunks} chunks of dimension {args.dimension}...")
+        write_stores(directory, args.chunks, args.dimension)
+        print(f"{'format':<8}{'load s':>10}{'first query s':>16}{'private MB/worker':>20}{'file-backed MB/worker':>24}")
+        for mode in ("legacy", "mmap"):
+            results = spawn(mode, directory, args.dimension, args.workers)
+            average = {key: sum(result[key] for result in results) / len(results) for key in results[0]}
+            print(f"{mode:<8}{average['load_s']:>10.3f}{average['first_query_s']:>16.3f}"
+                  f"{average['private_mb']:>20.1f}{average['file_backed_mb']:>24.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/embedding_throughput.py
+
+# Compares one-request-per-chunk embedding against the batched, concurrent pipeline
+# using the offline fake client, so no API key or network access is needed.
+#
+# Usage:
+#   python -m benchmarks.embedding_throughput --chunks 2000 --latency 0.05
+
+import argparse
+import time
+
+from core.embeddings import embed_texts
+from core.fake_openai import FakeOpenAIClient
+
+def make_chunks(count, words_per_chunk=150):
+    """
+    Generates synthetic chunks of roughly realistic size.
+    """
+    vocabulary = ["vPro", "AMT", "provisioning", "certificate", "firmware", "BIOS", "MEBx",
+                  "network", "error", "0x8007", "remote", "KVM", "configuration", "TLS"]
+    return [
+        " ".join(vocabulary[(i * 7 + j) % len(vocabulary)] for j in range(words_per_chunk)) + f" chunk-{i}"
+        for i in range(count)
+    ]
+
+def run_sequential(chunks, client):
+    for chunk in chunks:
+        client.embeddings.create(model="text-embedding-ada-002", input=chunk)
+
+def run_batched(chunks, client, batch_size, concurrency):
+    embed_texts(chunks, client, max_batch_size=batch_size, max_concurrency=concurrency, show_progress=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput against a fake backend.")
+    parser.add_argument("--chunks", type=int, default=2000, help="Number of synthetic chunks to embed.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request.")
+    parser.add_argument("--per-input-latency", type=float, default=0.0002, help="Simulated seconds per input.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Inputs per batched request.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batched requests in flight.")
+    parser.add_argument("--skip-sequential", action="store_true", help="Only run the batched pipeline.")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+
+    if not args.skip_sequential:
+        client = FakeOpenAIClient(latency=args.latency, per_input_latency=args.per_input_latency)
+        start = time.perf_counter()
+        run_sequential(chunks, client)
+        elapsed = time.perf_counter() - start
+        print(f"Sequential: {elapsed:.2f}s, {len(chunks) / elapsed:.0f} chunks/s, {client.request_count} requests")
+
+    client = FakeOpenAIClient(latency=args.latency, per_input_latency=args.per_input_latency)
+    start = time.perf_counter()
+    run_batched(chunks, client, args.batch_size, args.concurrency)
+    elapsed = time.perf_counter() - start
+    print(f"Batched:    {elapsed:.2f}s, {len(chunks) / elapsed:.0f} chunks/s, {client.request_count} requests, "
+          f"max {client.max_in_flight} in flight")
+
+if __name__ == "__main__":
+    main()
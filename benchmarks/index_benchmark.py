@@ -0,0 +1,107 @@
+# benchmarks/index_benchmark.py
+
+# Measures recall@k against exact (flat) search, per-query latency and in-memory index
+# size for each index type and vector storage the index factory supports, on the same
+# synthetic clustered data. Compressed storage is measured with and without reranking
+# from the exact vectors side file.
+#
+# Usage:
+#   python -m benchmarks.index_benchmark --vectors 100000 --dimension 256 --queries 500
+
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from core.exact_vectors import ExactVectors, write_exact_vectors
+from core.index_factory import IndexBuilder, apply_search_params, prepare_vectors, resolve_index_config
+
+def make_clustered_vectors(count, dimension, clusters=200, seed=0):
+    """
+    Generates vectors grouped around random centers, which is closer to real embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    assignments = rng.integers(0, clusters, count)
+    return centers[assignments] + 0.3 * rng.standard_normal((count, dimension)).astype('float32')
+
+def build(vectors, index_config):
+    start = time.perf_counter()
+    builder = IndexBuilder(index_config)
+    for offset in range(0, len(vectors), 4096):
+        builder.add(vectors[offset:offset + 4096])
+    vector_index = builder.finish()
+    apply_search_params(vector_index, index_config)
+    return vector_index, builder.exact_vectors(), time.perf_counter() - start
+
+def measure(vector_index, queries, k, metric, exact_vectors=None):
+    queries = prepare_vectors(queries, metric)
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        if exact_vectors is None:
+            _, indices = vector_index.search(query.reshape(1, -1), k)
+        else:
+            _, candidates = vector_index.search(query.reshape(1, -1), k * exact_vectors.rerank_factor)
+            _, indices = exact_vectors.rerank(query.reshape(1, -1), candidates, k, vector_index.metric_type)
+        latencies.append(time.perf_counter() - start)
+        results.append(indices[0])
+    return np.array(results), np.array(latencies) * 1000
+
+def recall_at_k(results, ground_truth):
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ANN index options against flat search.")
+    parser.add_argument("--vectors", type=int, default=100000, help="Number of indexed vectors.")
+    parser.add_argument("--dimension", type=int, default=256, help="Vector dimension.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries.")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query for recall@k.")
+    parser.add_argument("--metric", choices=("l2", "cosine"), default="l2", help="Distance metric.")
+    parser.add_argument("--nlist", type=int, default=1024, help="IVF cells.")
+    parser.add_argument("--pq-m", type=int, default=32, help="PQ sub-quantizers (must divide dimension).")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates re-scored per result for compressed storage.")
+    args = parser.parse_args()
+
+    vectors = make_clustered_vectors(args.vectors, args.dimension)
+    queries = make_clustered_vectors(args.queries, args.dimension, seed=1)
+    base = {"metric": args.metric, "nlist": args.nlist, "pq_m": args.pq_m}
+
+    candidates = [("flat", {"type": "flat"})]
+    candidates += [(f"ivf_flat nprobe={n}", {"type": "ivf_flat", "nprobe": n}) for n in (8, 32, 128)]
+    candidates += [(f"ivf_pq nprobe={n}", {"type": "ivf_pq", "nprobe": n}) for n in (8, 32, 128)]
+    candidates += [(f"hnsw ef_search={ef}", {"type": "hnsw", "ef_search": ef}) for ef in (32, 64, 256)]
+    candidates += [(f"flat {storage}", {"type": "flat", "storage": storage}) for storage in ("fp16", "sq8", "pq")]
+    candidates += [("ivf_flat sq8 nprobe=32", {"type": "ivf_flat", "storage": "sq8", "nprobe": 32})]
+    candidates += [(f"hnsw {storage} ef_search=64", {"type": "hnsw", "storage": storage, "ef_search": 64})
+                   for storage in ("sq8", "pq")]
+
+    ground_truth = None
+    print(f"{'index':<32}{'build s':>10}{'index MB':>10}{'recall@' + str(args.k):>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    with tempfile.TemporaryDirectory(prefix="index_benchmark_") as directory:
+        for name, overrides in candidates:
+            index_config = resolve_index_config(overrides=dict(base, **overrides))
+            vector_index, exact, build_seconds = build(vectors, index_config)
+            index_mb = faiss.serialize_index(vector_index).size / 2 ** 20
+            runs = [(name, None)]
+            if exact is not None:
+                path = os.path.join(directory, "vectors.bin")
+                write_exact_vectors(path, *exact)
+                runs.append((f"{name} +rerank", ExactVectors(path, rerank_factor=args.rerank_factor)))
+            for run_name, exact_vectors in runs:
+                results, latencies = measure(vector_index, queries, args.k, args.metric, exact_vectors)
+                if ground_truth is None:
+                    ground_truth = results  # The flat index runs first and is exact
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                print(f"{run_name:<32}{build_seconds:>10.2f}{index_mb:>10.1f}{recall_at_k(results, ground_truth):>12.3f}"
+                      f"{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}")
+                if exact_vectors is not None:
+                    exact_vectors.close()
+
+if __name__ == "__main__":
+    main()
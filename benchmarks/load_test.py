@@ -0,0 +1,113 @@
+# benchmarks/load_test.py
+
+# Drives the HTTP server (server.py) with many concurrent users and reports throughput,
+# latency percentiles and how many requests were refused with 429.
+#
+# By default the ASGI app is built in-process around a synthetic vector store and the
+# offline fake OpenAI client, so no API key, network or ASGI server is needed. With --url
+# it loads a running server instead (start it with RESIDENT_TA_FAKE_OPENAI=1 to keep the
+# fake backend).
+#
+# Usage:
+#   python -m benchmarks.load_test --requests 1000 --concurrency 200 --max-in-flight 32 --max-queued 64
+#   python -m benchmarks.load_test --url http://127.0.0.1:8000 --requests 1000 --concurrency 100
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+from agents.operator import OperatorAgent
+from core.fake_openai import FakeAsyncOpenAIClient, FakeOpenAIClient
+from core.generic_agent import GenericAgent
+from core.vector_store_registry import VectorStoreRegistry
+from server import ResidentTAServer
+
+QUERIES = ["How do I reset the MEBx password?", "AMT provisioning fails with 0x80070005",
+           "Remote KVM session drops after login", "Which BIOS settings enable vPro?",
+           "TLS certificate hash is missing", "Power state S3 wake over network"]
+
+def make_documents(count, seed=0):
+    rng = random.Random(seed)
+    words = ["Intel", "vPro", "AMT", "provisioning", "certificate", "firmware", "remote", "KVM", "session",
+             "network", "adapter", "TLS", "BIOS", "MEBx", "password", "error", "0x80070005", "console", "wake"]
+    return [" ".join(rng.choice(words) for _ in range(300)) + "." for _ in range(count)]
+
+def build_app(directory, documents, completion_latency, max_in_flight, max_queued):
+    client = FakeOpenAIClient(completion_latency=completion_latency)
+    async_client = FakeAsyncOpenAIClient(completion_latency=completion_latency)
+    agent = GenericAgent("fake", "teams/intel_vpro/prompts/vpro_troubleshooting_prompt.md",
+                         vector_store_path=f"{directory}/vector_store.index", client=client, async_client=async_client,
+                         vector_store_registry=VectorStoreRegistry())
+    agent.initialize_vector_store(make_documents(documents))
+    operator_agent = OperatorAgent("fake", client=client, async_client=async_client)
+    operator_agent.register_agent('vPRO_Troubleshooting', agent)
+    return ResidentTAServer(operator_agent, {"bench": agent}, max_in_flight=max_in_flight, max_queued=max_queued)
+
+async def run_load(http_client, path, total_requests, concurrency):
+    latencies, statuses = [], Counter()
+    remaining = iter(range(total_requests))
+
+    async def user():
+        for number in remaining:
+            payload = {"query": QUERIES[number % len(QUERIES)], "session_id": f"user-{number % concurrency}"}
+            start = time.perf_counter()
+            response = await http_client.post(path, json=payload)
+            elapsed = time.perf_counter() - start
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+async def main_async(args):
+    if args.url:
+        http_client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        app = None
+    else:
+        directory = tempfile.mkdtemp(prefix="load_test_")
+        app = build_app(directory, args.documents, args.latency, args.max_in_flight, args.max_queued)
+        await app.startup()
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=60)
+
+    async with http_client:
+        health = (await http_client.get("/health")).json()
+        elapsed, latencies, statuses = await run_load(http_client, args.path, args.requests, args.concurrency)
+        health = (await http_client.get("/health")).json()
+
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    results = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(statuses[200] / elapsed, 1),
+        "statuses": dict(statuses),
+        "latency_p50": round(float(np.percentile(latencies, 50)), 4),
+        "latency_p95": round(float(np.percentile(latencies, 95)), 4),
+        "latency_p99": round(float(np.percentile(latencies, 99)), 4),
+        "server": health,
+    }
+    print(json.dumps(results, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the HTTP server.")
+    parser.add_argument("--url", help="Base URL of a running server; omit to test in-process with a fake backend.")
+    parser.add_argument("--path", default="/agents/bench/query", help="Endpoint to load; use /agents/intel_vpro/query with --url.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100, help="Simulated users sending requests back to back.")
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic documents in the in-process store.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake chat completion latency, in seconds.")
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--max-queued", type=int, default=64)
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/startup_time.py
+
+# Measures how long resident_ta.py takes to show its query prompt, and to answer the
+# first query, when a valid vector store already exists (a warm start).
+#
+# The CLI is run in a scratch copy of the team layout (configuration, prompt and a small
+# synthetic PDF corpus) with the local hashing embedder and fake completions, so no API
+# key or tokenizer download is needed. The first run builds the store; the timed runs then
+# wait for the query prompt, ask one question and exit.
+#
+# Usage:
+#   python -m benchmarks.startup_time --runs 5 --pages 200
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+from benchmarks.suite import check_tokenizers, ensure_corpus, make_vocabulary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY_PROMPT = b"Enter your troubleshooting query: "
+RESPONSE_PREFIX = b"Troubleshooting Response: "
+
+def make_workspace(directory, pages):
+    """
+    Lays out the configuration, prompt and reference PDFs resident_ta.py expects.
+    """
+    with open(os.path.join(REPO_ROOT, "config", "team_config.yaml")) as file:
+        config = yaml.safe_load(file)
+    config["global"]["providers"] = {"embeddings": {"type": "local_hashing"}, "completions": {"type": "fake"}}
+    os.makedirs(os.path.join(directory, "config"))
+    with open(os.path.join(directory, "config", "team_config.yaml"), 'w') as file:
+        yaml.safe_dump(config, file)
+    shutil.copytree(os.path.join(REPO_ROOT, "teams", "intel_vpro", "prompts"),
+                    os.path.join(directory, "teams", "intel_vpro", "prompts"))
+    vocabulary, cumulative = make_vocabulary(0)
+    ensure_corpus(os.path.join(directory, "teams", "intel_vpro", "reference_materials", "public"), 0, pages, 150,
+                  vocabulary, cumulative)
+
+def read_until(stream, marker, buffer, start=0):
+    """
+    Reads a child's output into `buffer` until `marker` appears at or after `start`.
+
+    Returns:
+    - int: The position just past the marker.
+    """
+    while buffer.find(marker, start) < 0:
+        data = os.read(stream.fileno(), 65536)
+        if not data:
+            raise RuntimeError("resident_ta.py exited early:\n" + buffer.decode(errors="replace")[-2000:])
+        buffer.extend(data)
+    return buffer.find(marker, start) + len(marker)
+
+def run_once(directory, query):
+    """
+    Starts resident_ta.py and returns (seconds to the query prompt, seconds to answer the first query).
+    """
+    env = dict(os.environ, PYTHONUNBUFFERED="1", TERM=os.environ.get("TERM", "dumb"),
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_ROOT, "resident_ta.py")], cwd=directory, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        buffer = bytearray()
+        position = read_until(process.stdout, QUERY_PROMPT, buffer)
+        ready = time.perf_counter() - start
+        asked = time.perf_counter()
+        process.stdin.write(query.encode() + b"\n")
+        process.stdin.flush()
+        position = read_until(process.stdout, RESPONSE_PREFIX, buffer, position)
+        read_until(process.stdout, b"\n", buffer, position)
+        answered = time.perf_counter() - asked
+        process.stdin.write(b"exit\n")
+        process.stdin.flush()
+        process.wait(timeout=60)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return ready, answered
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure resident_ta.py warm-start time.")
+    parser.add_argument("--runs", type=int, default=5, help="Timed warm starts.")
+    parser.add_argument("--pages", type=int, default=200, help="Pages of synthetic reference material.")
+    parser.add_argument("--query", default="How do I reset the MEBx password?")
+    args = parser.parse_args()
+
+    from config.constants import FAKE_CHAT_MODEL, LOCAL_EMBEDDING_DIMENSION
+
+    error = check_tokenizers([f"local_hashing-{LOCAL_EMBEDDING_DIMENSION}", FAKE_CHAT_MODEL])
+    if error:
+        parser.error(error)
+
+    with tempfile.TemporaryDirectory(prefix="startup_time_") as directory:
+        make_workspace(directory, args.pages)
+        build_ready, _ = run_once(directory, args.query)  # Builds the store
+        results = [run_once(directory, args.query) for _ in range(args.runs)]
+    ready = np.array([result[0] for result in results])
+    answered = np.array([result[1] for result in results])
+    print(json.dumps({
+        "pages": args.pages,
+        "runs": args.runs,
+        "first_run_with_build_s": round(build_ready, 3),
+        "ready_median_s": round(float(np.median(ready)), 3),
+        "ready_max_s": round(float(ready.max()), 3),
+        "first_answer_median_s": round(float(np.median(answered)), 3),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+# benchmarks/suite.py
+
+# Reproducible, offline benchmark of the whole retrieval and agent pipeline at several
+# corpus sizes, so a change to chunk_text, build_vector_store or query_vector_store can
+# be compared with a saved baseline.
+#
+# For every scale, a synthetic PDF corpus is generated from a seed (one page per target
+# chunk, words drawn from a Zipf-like vocabulary) and put through the real pipeline:
+#   extraction  iter_pdf_records over the PDFs;
+#   chunking    chunk_text over each page;
+#   indexing    build_vector_store plus save_vector_store;
+#   query       query_vector_store for a query set of phrases taken from known pages,
+#               giving latency percentiles and recall@1/recall@k/MRR against those pages;
+#   agent       GenericAgent.handle_request end to end, with fake completions.
+# Embeddings come from the deterministic local hashing embedder (or the fake random one),
+# so no API key is needed and every run embeds the same vectors. Chunks, batches and
+# contexts are sized with the local tokenizer those embedders and fake completions use,
+# so nothing is downloaded either.
+#
+# Each scale runs in a fresh process, so its peak RSS is its own; the peak of each stage
+# is measured by resetting the kernel's high-water mark (Linux) before the stage. PDF
+# extraction workers are separate processes and not included.
+#
+# Generated corpora can be kept with --corpus-dir and are reused while the seed and
+# sizes match. Scales of 100k and 1m chunks take minutes to hours, mostly generating PDFs.
+#
+# Usage:
+#   python -m benchmarks.suite --scales 1k,10k --output results.json
+#   python -m benchmarks.suite --scales 1k,10k --baseline results.json --output new.json
+#   python -m benchmarks.suite --current new.json --baseline results.json --tolerance 0.5
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT_PATH = os.path.join(REPO_ROOT, "teams", "intel_vpro", "prompts", "vpro_troubleshooting_prompt.md")
+
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+STAGES = ("extraction", "chunking", "indexing", "query", "agent")
+PAGES_PER_FILE = 500
+VOCABULARY_SIZE = 20000
+QUERY_WORDS = 12
+DOMAIN_WORDS = ["vPro", "AMT", "provisioning", "certificate", "firmware", "BIOS", "MEBx", "network", "error",
+                "remote", "KVM", "configuration", "TLS", "console", "wake", "password", "adapter", "session"]
+
+# Figures compared against a baseline, and whether higher (1) or lower (-1) is better
+COMPARED_FIGURES = {
+    "seconds": -1, "pages_per_s": 1, "chunks_per_s": 1, "index_mb": -1, "queries_per_s": 1,
+    "latency_p50": -1, "latency_p95": -1, "latency_p99": -1,
+    "recall_at_1": 1, "recall_at_k": 1, "mrr": 1, "peak_rss_mb": -1,
+}
+
+# Settings that must match for two results to be comparable
+COMPARABLE_SETTINGS = ("seed", "words_per_page", "queries", "agent_queries", "top_k", "chunk_tokens",
+                       "embedder", "dimension", "index_type", "storage")
+# Values of settings added after baselines may have been recorded
+SETTING_DEFAULTS = {"storage": "float32"}
+
+def make_vocabulary(seed, size=VOCABULARY_SIZE):
+    """
+    Generates pronounceable pseudo-words plus a few domain words, with Zipf-like frequencies.
+
+    Returns:
+    - (list of str, np.ndarray): The words and the cumulative distribution to sample them from.
+    """
+    rng = np.random.default_rng(seed)
+    syllables = [consonant + vowel for consonant in "bdfgklmnprstvz" for vowel in "aeiou"]
+    words = list(DOMAIN_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(syllables, size=int(rng.integers(2, 5))))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    rng.shuffle(words)
+    weights = 1.0 / (np.arange(len(words)) + 10.0)
+    return words, np.cumsum(weights / weights.sum())
+
+def page_words(seed, page_id, words_per_page, vocabulary, cumulative):
+    """
+    Returns the words of one synthetic page; each page only depends on the seed and its ID.
+    """
+    rng = np.random.default_rng([seed, page_id])
+    indices = np.searchsorted(cumulative, rng.random(words_per_page), side='right')
+    return [vocabulary[min(i, len(vocabulary) - 1)] for i in indices]
+
+def page_text(words):
+    # Sentences of 8-15 words, so the text reads (and wraps) like prose
+    sentences, position = [], 0
+    while position < len(words):
+        length = 8 + (position * 7) % 8
+        sentence = words[position:position + length]
+        sentences.append(" ".join([sentence[0].capitalize()] + sentence[1:]) + ".")
+        position += length
+    return " ".join(sentences)
+
+def make_queries(seed, page_count, query_count, words_per_page, vocabulary, cumulative):
+    """
+    Picks query pages and takes a phrase from each; the page is the query's relevant document.
+
+    Returns:
+    - list of (int, str): (page ID, query text) pairs.
+    """
+    rng = np.random.default_rng([seed, page_count, 1])
+    pages = rng.choice(page_count, size=min(query_count, page_count), replace=False)
+    queries = []
+    for page_id in sorted(int(page) for page in pages):
+        words = page_words(seed, page_id, words_per_page, vocabulary, cumulative)
+        start = int(rng.integers(0, max(1, len(words) - QUERY_WORDS)))
+        queries.append((page_id, " ".join(words[start:start + QUERY_WORDS])))
+    return queries
+
+def ensure_corpus(directory, seed, page_count, words_per_page, vocabulary, cumulative):
+    """
+    Writes the synthetic PDF corpus for a scale, unless an identical one already exists.
+
+    Returns:
+    - (list of str, float or None): The PDF paths in page order and the generation time
+      (None when the corpus was reused).
+    """
+    import fitz
+
+    spec = {"seed": seed, "pages": page_count, "words_per_page": words_per_page, "pages_per_file": PAGES_PER_FILE}
+    spec_path = os.path.join(directory, "corpus.json")
+    file_paths = [os.path.join(directory, f"corpus_{number:05d}.pdf")
+                  for number in range((page_count + PAGES_PER_FILE - 1) // PAGES_PER_FILE)]
+    if os.path.exists(spec_path):
+        with open(spec_path) as file:
+            if json.load(file) == spec and all(os.path.exists(path) for path in file_paths):
+                return file_paths, None
+
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    for number, file_path in enumerate(file_paths):
+        pdf = fitz.open()
+        for page_id in range(number * PAGES_PER_FILE, min((number + 1) * PAGES_PER_FILE, page_count)):
+            page = pdf.new_page()
+            text = page_text(page_words(seed, page_id, words_per_page, vocabulary, cumulative))
+            if page.insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=8) < 0:
+                raise ValueError(f"{words_per_page} words do not fit on a page; lower --words-per-page.")
+        pdf.save(file_path)
+        pdf.close()
+    with open(spec_path, 'w') as file:
+        json.dump(spec, file)
+    return file_paths, time.perf_counter() - start
+
+def reset_peak_rss():
+    """
+    Resets this process's peak RSS to its current RSS, where the kernel allows it (Linux).
+    """
+    try:
+        with open("/proc/self/clear_refs", 'w') as file:
+            file.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb():
+    """
+    Returns this process's peak RSS in MB since the last `reset_peak_rss`.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return process_peak_rss_mb()
+
+def process_peak_rss_mb():
+    """
+    Returns this process's peak RSS in MB since it started.
+    """
+    # ru_maxrss is in KB on Linux and bytes on macOS, and is not affected by `reset_peak_rss`
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def percentiles(latencies):
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {f"latency_p{p}": round(float(np.percentile(latencies, p)), 6) for p in (50, 95, 99)}
+
+def write_config(path, settings):
+    """
+    Writes a configuration that selects the offline providers and the benchmarked index.
+    """
+    import yaml
+
+    embeddings = {"type": settings["embedder"], "dimension": settings["dimension"]}
+    config = {"global": {
+        "providers": {"embeddings": embeddings, "completions": {"type": "fake"}},
+        "vector_index": {"type": settings["index_type"], "storage": settings.get("storage", "float32"),
+                         "chunk_max_tokens": settings["chunk_tokens"]},
+    }}
+    with open(path, 'w') as file:
+        yaml.safe_dump(config, file)
+
+def check_tokenizers(models):
+    """
+    Loads the tokenizers a run needs before any stage starts, so a missing encoding is
+    reported once rather than as a traceback from every scale's process.
+
+    Parameters:
+    - models (list of str): Models whose tokenizers are used (embedding, chat and chunking).
+
+    Returns:
+    - str or None: Why a tokenizer could not be loaded, or None if all of them loaded.
+    """
+    from core.text_utils import get_encoding
+
+    for model in models:
+        try:
+            get_encoding(model)
+        except Exception as e:
+            return (f"Could not load the tokenizer for {model} ({e}). OpenAI models need tiktoken's encodings "
+                    "in its cache when offline; point TIKTOKEN_CACHE_DIR at a directory holding them.")
+    return None
+
+def run_scale(scale, settings, corpus_root, work_directory):
+    """
+    Runs every stage for one scale, in the current process.
+
+    Returns:
+    - dict: Chunk count, corpus details, per-stage figures and the process's peak RSS.
+    """
+    from config.constants import PDF_EXTRACTION_WORKERS
+    from core.config_manager import ConfigManager
+    from core.generic_agent import GenericAgent
+    from core.index_factory import resolve_index_config
+    from core.pdf_tools import iter_pdf_records
+    from core.providers import create_client, embedder_identity, resolve_providers
+    from core.text_utils import chunk_text
+    from core.vector_store import (build_vector_store, chunk_store_path_for, exact_vectors_path_for, load_exact_vectors,
+                                   query_vector_store, save_vector_store)
+    from core.vector_store_registry import VectorStoreRegistry
+
+    seed, words_per_page = settings["seed"], settings["words_per_page"]
+    page_count = SCALES[scale]
+    vocabulary, cumulative = make_vocabulary(seed)
+    corpus_directory = os.path.join(corpus_root, f"{scale}-seed{seed}-words{words_per_page}")
+    file_paths, generation_seconds = ensure_corpus(corpus_directory, seed, page_count, words_per_page, vocabulary,
+                                                   cumulative)
+    queries = make_queries(seed, page_count, settings["queries"], words_per_page, vocabulary, cumulative)
+    page_of_file = {path: number * PAGES_PER_FILE for number, path in enumerate(file_paths)}
+    stages = {}
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    pages = {}
+    for record in iter_pdf_records(file_paths, max_workers=settings["workers"] or PDF_EXTRACTION_WORKERS,
+                                   pages_per_record=1):
+        pages[page_of_file[record.file_path] + record.page_start - 1] = record.text
+    elapsed = time.perf_counter() - start
+    stages["extraction"] = {"seconds": elapsed, "pages": len(pages), "pages_per_s": len(pages) / elapsed,
+                            "corpus_mb": sum(os.path.getsize(path) for path in file_paths) / 2 ** 20,
+                            "peak_rss_mb": peak_rss_mb()}
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    chunks, chunk_pages = [], []
+    for page_id in sorted(pages):
+        for chunk in chunk_text(pages.pop(page_id), max_tokens=settings["chunk_tokens"],
+                                model=f"{settings['embedder']}-{settings['dimension']}"):
+            chunks.append(chunk)
+            chunk_pages.append(page_id)
+    elapsed = time.perf_counter() - start
+    stages["chunking"] = {"seconds": elapsed, "chunks": len(chunks), "chunks_per_s": len(chunks) / elapsed,
+                          "peak_rss_mb": peak_rss_mb()}
+
+    config_path = os.path.join(work_directory, "config.yaml")
+    write_config(config_path, settings)
+    config_manager = ConfigManager(config_path)
+    providers = resolve_providers(config_manager)
+    index_config = resolve_index_config(config_manager)
+    vector_store_path = os.path.join(work_directory, "vector_store.index")
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    client = create_client(providers)
+    # Chunks are at most chunk_max_tokens (= chunk_tokens) long, so build_vector_store keeps them as they are
+    vector_index, document_chunks = build_vector_store(chunks, None, model=providers["embeddings"]["model"],
+                                                       client=client, index_config=index_config,
+                                                       exact_vectors_path=exact_vectors_path_for(vector_store_path))
+    built = time.perf_counter()
+    save_vector_store(vector_index, vector_store_path, chunk_store_path_for(vector_store_path), document_chunks,
+                      embedder=embedder_identity(providers))
+    elapsed = time.perf_counter() - start
+    if len(document_chunks) != len(chunks):
+        raise RuntimeError("build_vector_store re-split the benchmark chunks.")
+    stages["indexing"] = {"seconds": elapsed, "build_seconds": built - start, "save_seconds": elapsed - (built - start),
+                          "chunks_per_s": len(chunks) / elapsed, "index_mb": os.path.getsize(vector_store_path) / 2 ** 20,
+                          "exact_vectors_mb": (os.path.getsize(exact_vectors_path_for(vector_store_path)) / 2 ** 20
+                                               if os.path.exists(exact_vectors_path_for(vector_store_path)) else 0.0),
+                          "peak_rss_mb": peak_rss_mb()}
+
+    # A returned chunk is relevant if it came from the query's page
+    texts_of_page = {}
+    for chunk, page_id in zip(chunks, chunk_pages):
+        texts_of_page.setdefault(page_id, set()).add(chunk)
+    del chunks, chunk_pages
+
+    exact_vectors = load_exact_vectors(vector_store_path, index_config)
+    reset_peak_rss()
+    latencies, first_hits, any_hits, reciprocal_ranks = [], 0, 0, 0.0
+    for page_id, query in queries:
+        start = time.perf_counter()
+        texts = query_vector_store(query, vector_index, document_chunks, None, model=providers["embeddings"]["model"],
+                                   top_k=settings["top_k"], client=client, exact_vectors=exact_vectors)
+        latencies.append(time.perf_counter() - start)
+        ranks = [rank for rank, text in enumerate(texts, start=1) if text in texts_of_page.get(page_id, ())]
+        first_hits += bool(ranks) and ranks[0] == 1
+        any_hits += bool(ranks)
+        reciprocal_ranks += 1.0 / ranks[0] if ranks else 0.0
+    count = max(len(queries), 1)
+    stages["query"] = {"seconds": sum(latencies), "queries": len(queries),
+                       "queries_per_s": len(queries) / sum(latencies) if latencies else 0.0, **percentiles(latencies),
+                       "recall_at_1": first_hits / count, "recall_at_k": any_hits / count,
+                       "mrr": reciprocal_ranks / count, "peak_rss_mb": peak_rss_mb()}
+    del vector_index, document_chunks, exact_vectors
+
+    reset_peak_rss()
+    agent = GenericAgent("fake", PROMPT_PATH, config_manager=config_manager, vector_store_path=vector_store_path,
+                         vector_store_registry=VectorStoreRegistry())
+    latencies = []
+    for _, query in queries[:settings["agent_queries"]]:
+        start = time.perf_counter()
+        agent.handle_request(query)
+        latencies.append(time.perf_counter() - start)
+    stages["agent"] = {"seconds": sum(latencies), "queries": len(latencies),
+                       "queries_per_s": len(latencies) / sum(latencies) if latencies else 0.0, **percentiles(latencies),
+                       "peak_rss_mb": peak_rss_mb()}
+
+    return {
+        "chunks": stages["chunking"]["chunks"],
+        "corpus": {"files": len(file_paths), "pages": page_count, "generation_seconds": generation_seconds},
+        "stages": stages,
+        "peak_rss_mb": process_peak_rss_mb(),
+    }
+
+def run_child(scale, settings, corpus_root):
+    with tempfile.TemporaryDirectory(prefix="benchmark_suite_") as work_directory:
+        result = run_scale(scale, settings, corpus_root, work_directory)
+    print(json.dumps(result))
+
+def spawn(scale, settings, corpus_root):
+    """
+    Runs one scale in a fresh interpreter and returns its result.
+    """
+    command = [sys.executable, "-m", "benchmarks.suite", "--child", scale, "--settings", json.dumps(settings),
+               "--corpus-dir", corpus_root]
+    output = subprocess.run(command, cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def environment():
+    """
+    Describes the machine and code the results were measured on.
+    """
+    import faiss
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "faiss": getattr(faiss, "__version__", None),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "commit": commit}
+
+def compare(current, baseline, tolerance):
+    """
+    Compares two suite results figure by figure.
+
+    Parameters:
+    - current (dict): The new results.
+    - baseline (dict): The saved baseline.
+    - tolerance (float): Relative change beyond which a worse figure is a regression.
+
+    Returns:
+    - list of dict: One row per figure present in both: scale, stage, figure, baseline,
+      current, relative change and status ('ok', 'better' or 'regression').
+    """
+    rows = []
+    for scale, result in current["scales"].items():
+        baseline_result = baseline["scales"].get(scale)
+        if baseline_result is None:
+            continue
+        for stage in STAGES:
+            figures = result["stages"].get(stage, {})
+            baseline_figures = baseline_result["stages"].get(stage, {})
+            for figure, direction in COMPARED_FIGURES.items():
+                if figure not in figures or figure not in baseline_figures:
+                    continue
+                old, new = baseline_figures[figure], figures[figure]
+                change = (new - old) / abs(old) if old else (0.0 if new == old else float("inf"))
+                status = "ok"
+                if change * direction < -tolerance:
+                    status = "regression"
+                elif change * direction > tolerance:
+                    status = "better"
+                rows.append({"scale": scale, "stage": stage, "figure": figure, "baseline": old, "current": new,
+                             "change": change, "status": status})
+    return rows
+
+def print_comparison(rows, current, baseline):
+    mismatched = [key for key in COMPARABLE_SETTINGS
+                  if current["settings"].get(key, SETTING_DEFAULTS.get(key)) != baseline["settings"].get(key, SETTING_DEFAULTS.get(key))]
+    if mismatched:
+        print(f"Warning: settings differ from the baseline ({', '.join(mismatched)}); figures may not be comparable.")
+    print(f"{'scale':<7}{'stage':<12}{'figure':<15}{'baseline':>14}{'current':>14}{'change':>10}  status")
+    for row in rows:
+        print(f"{row['scale']:<7}{row['stage']:<12}{row['figure']:<15}{row['baseline']:>14.6g}{row['current']:>14.6g}"
+              f"{row['change']:>+10.1%}  {row['status']}")
+    regressions = sum(row["status"] == "regression" for row in rows)
+    print(f"{regressions} regressions in {len(rows)} figures.")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval and agent pipeline on synthetic corpora.")
+    parser.add_argument("--scales", default="1k,10k", help=f"Comma-separated corpus sizes, from {', '.join(SCALES)}.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--words-per-page", type=int, default=150, help="Words per synthetic page (one chunk each).")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per scale for latency and recall.")
+    parser.add_argument("--agent-queries", type=int, default=50, help="Queries answered end to end by an agent.")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--chunk-tokens", type=int, default=1000, help="max_tokens passed to chunk_text, and the stores' chunk_max_tokens.")
+    parser.add_argument("--embedder", choices=("local_hashing", "fake"), default="local_hashing",
+                        help="Deterministic offline embedder; 'fake' vectors are random, so recall is meaningless.")
+    parser.add_argument("--dimension", type=int, default=256, help="Embedding dimension.")
+    parser.add_argument("--index-type", default="flat", help="Vector index type (see core/index_factory.py).")
+    parser.add_argument("--storage", default="float32", help="Vector storage: float32, fp16, sq8 or pq.")
+    parser.add_argument("--workers", type=int, default=0, help="PDF extraction processes; 0 uses the default.")
+    parser.add_argument("--corpus-dir", help="Directory keeping generated corpora for reuse; defaults to a temporary one.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Saved results to compare with; exits with status 1 on regressions.")
+    parser.add_argument("--current", help="Compare these saved results with --baseline instead of running.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Relative change tolerated before a regression.")
+    parser.add_argument("--child", choices=tuple(SCALES), help=argparse.SUPPRESS)
+    parser.add_argument("--settings", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, json.loads(args.settings), args.corpus_dir)
+        return
+
+    if args.current:
+        with open(args.current) as file:
+            results = json.load(file)
+    else:
+        scales = [scale.strip().lower() for scale in args.scales.split(",") if scale.strip()]
+        unknown = [scale for scale in scales if scale not in SCALES]
+        if unknown:
+            parser.error(f"Unknown scales {unknown}; expected some of {list(SCALES)}.")
+        from config.constants import FAKE_CHAT_MODEL
+
+        error = check_tokenizers([f"{args.embedder}-{args.dimension}", FAKE_CHAT_MODEL])
+        if error:
+            parser.error(error)
+        settings = {"seed": args.seed, "words_per_page": args.words_per_page, "queries": args.queries,
+                    "agent_queries": args.agent_queries, "top_k": args.top_k, "chunk_tokens": args.chunk_tokens,
+                    "embedder": args.embedder, "dimension": args.dimension, "index_type": args.index_type,
+                    "storage": args.storage, "workers": args.workers}
+        results = {"created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                   "environment": environment(), "settings": settings, "scales": {}}
+        with tempfile.TemporaryDirectory(prefix="benchmark_corpora_") as temporary_root:
+            corpus_root = os.path.abspath(args.corpus_dir) if args.corpus_dir else temporary_root
+            for scale in scales:
+                print(f"Running the {scale} scale...", file=sys.stderr)
+                results["scales"][scale] = spawn(scale, settings, corpus_root)
+        summary = {scale: {stage: {key: value for key, value in figures.items() if key in ("seconds", "latency_p95",
+                                                                                          "recall_at_k", "peak_rss_mb")}
+                           for stage, figures in result["stages"].items()}
+                   for scale, result in results["scales"].items()}
+        print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}.")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if print_comparison(compare(results, baseline, args.tolerance), results, baseline):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
+
+# Example usage:
+# $ python -m benchmarks.suite --scales 1k,10k --corpus-dir /tmp/corpora --output baseline.json
+# $ git checkout my-branch
+# $ python -m benchmarks.suite --scales 1k,10k --corpus-dir /tmp/corpora --baseline baseline.json
+# scale  stage       figure               baseline       current    change  status
+# 1k     query       latency_p95          0.000412      0.000398     -3.4%  ok
+# ...
@@ -1,5 +1,7 @@
 # config/constants.py
 
+import os
+
 # Constants and shared settings for the project
 
 # Example constants
@@ -16,6 +18,111 @@ EXTERNAL_API_ENDPOINT = 'https://api.example.com/endpoint'
 # Timeout values (if needed for any operations)
 DEFAULT_TIMEOUT = 30  # in seconds
 
+# OpenAI client settings
+OPENAI_MAX_CONNECTIONS = 100              # Connections in each shared client's pool
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 20     # Idle connections kept open for reuse
+OPENAI_MAX_CONCURRENT_REQUESTS = 32       # Requests an agent handles at once; extra requests wait
+
+# HTTP server settings
+SERVER_MAX_IN_FLIGHT = 64                 # Requests each worker processes at once
+SERVER_MAX_QUEUED = 256                   # Requests waiting for a slot before new ones get 429
+SERVER_RETRY_AFTER_SECONDS = 1            # Retry-After sent with 429 responses
+SERVER_MAX_BODY_BYTES = 64 * 1024         # Largest accepted request body
+
+# Intent router settings
+# ada-002 embeddings of unrelated English sentences still score about 0.7-0.8, so the threshold
+# only rejects clear noise; telling routes from off-topic requests is the margin's job, measured
+# against the out-of-scope centroid (`intent_router.out_of_scope_examples`). Recalibrate both
+# for other embedding models.
+INTENT_ROUTER_CONFIDENCE_THRESHOLD = 0.8  # Minimum cosine similarity to a route's example centroid
+INTENT_ROUTER_MARGIN = 0.02               # Minimum lead of the best centroid over the runner-up, out of scope included
+INTENT_ROUTER_CACHE_PATH = 'intent_router_embeddings.sqlite'  # Cached embeddings of routing examples and queries
+
+# Chunking settings (build-time: changing them rebuilds the stores)
+CHUNK_MAX_TOKENS = 1000                   # Largest chunk embedded and stored
+CHUNK_OVERLAP_TOKENS = 0                  # Tokens shared by consecutive chunks of a document
+
+# Vector store registry settings
+VECTOR_STORE_MEMORY_BUDGET_MB = 4096      # Combined size of open vector stores before LRU eviction
+VECTOR_STORE_KEEP_VERSIONS = 2            # On-disk versions kept per store, counting the one being served
+VECTOR_STORE_BUILD_LOCK_POLL_SECONDS = 1  # How often a builder checks whether another build of the store finished
+VECTOR_STORE_BUILD_LOCK_STALE_SECONDS = 6 * 3600  # Age after which a build lock taken on another host is abandoned
+
+# Background indexer settings
+BACKGROUND_INDEXER_POLL_SECONDS = 5       # How often watched reference folders are scanned
+BACKGROUND_INDEXER_DEBOUNCE_SECONDS = 10  # Quiet time after the last change before a rebuild starts
+
+# Federated search settings
+FEDERATED_SEARCH_WORKERS = min(8, os.cpu_count() or 1)  # Threads searching stores in parallel
+FEDERATED_DEDUPE_THRESHOLD = 0.9          # Shingle overlap at which two chunks count as the same passage
+
+# Hybrid (keyword + vector) retrieval settings
+HYBRID_SEARCH_ENABLED = True              # Whether BM25 keyword hits are fused with vector hits
+KEYWORD_TOP_K = 10                        # Candidates taken from each ranking before fusion
+RRF_K = 60                                # Reciprocal rank fusion constant; higher flattens rank differences
+BM25_K1 = 1.2                             # BM25 term-frequency saturation
+BM25_B = 0.75                             # BM25 document-length normalization
+
+# Provider settings
+EMBEDDING_PROVIDER = 'openai'             # 'openai', 'local_hashing' or 'fake'
+COMPLETION_PROVIDER = 'openai'            # 'openai' or 'fake'
+DEFAULT_CHAT_MODEL = 'gpt-3.5-turbo'
+LOCAL_EMBEDDING_DIMENSION = 768           # Vector length of the local hashing embedder
+FAKE_CHAT_MODEL = 'fake-chat'             # Model name of fake completions; its tokenizer needs no download
+KNOWN_EMBEDDING_DIMENSIONS = {'text-embedding-ada-002': 1536, 'text-embedding-3-small': 1536,
+                              'text-embedding-3-large': 3072}
+
+# Embedding settings
+DEFAULT_EMBEDDING_MODEL = 'text-embedding-ada-002'
+EMBEDDING_MAX_BATCH_SIZE = 2048       # Max inputs per embeddings request
+EMBEDDING_MAX_BATCH_TOKENS = 300000   # Max total tokens per embeddings request
+EMBEDDING_MAX_CONCURRENCY = 4         # Max embedding batches in flight at once
+EMBEDDING_MAX_RETRIES = 6             # Retries for rate-limited or transient failures
+EMBEDDING_RETRY_BASE_DELAY = 1.0      # Initial backoff delay, in seconds
+EMBEDDING_CACHE_MAX_ENTRIES = 200000  # ~1.2 GB of ada-002 vectors on disk
+EMBEDDING_FLUSH_CHUNKS = 4096         # Chunks buffered before a streaming build embeds them
+
+# PDF extraction settings
+PDF_EXTRACTION_WORKERS = os.cpu_count() or 1  # Worker processes for PDF text extraction
+PDF_PAGES_PER_RECORD = 8                      # Pages of text per streamed extraction record
+
+# Context assembly settings
+CONTEXT_TOKEN_BUDGET = 1500               # Prompt tokens spent on retrieved context per request
+CONTEXT_CANDIDATES = 8                    # Chunks retrieved per request before packing into the budget
+CONTEXT_MIN_CHUNK_TOKENS = 50             # Smallest shortened chunk worth adding to the context
+
+# Batch query settings
+BATCH_SIZE = 256                          # Queries embedded and searched together by handle_batch
+BATCH_MAX_CONCURRENCY = 16                # Batch completions in flight at once
+
+# Session settings
+SESSION_BACKEND = 'memory'                # 'memory' or 'sqlite'
+SESSION_DB_PATH = 'sessions/sessions.sqlite'
+SESSION_MAX_SESSIONS = 10000              # Sessions kept before the least recently used are dropped
+SESSION_TTL_SECONDS = 86400               # Idle seconds after which a session expires
+SESSION_MAX_TURNS = 20                    # Most recent turns kept verbatim per session
+SESSION_HISTORY_TOKEN_BUDGET = 1000       # Tokens of verbatim turns before the oldest are summarized
+SESSION_SUMMARY_TOKEN_BUDGET = 250        # Maximum tokens of a session's rolling summary
+SESSION_ID_BYTES = 32                     # Random bytes in generated session IDs (43 URL-safe characters)
+SESSION_ID_MIN_LENGTH = 32                # Shorter session IDs are guessable and never raise a user's clearance
+
+# Request caching settings
+QUERY_CACHE_MAX_ENTRIES = 10000           # Query embeddings kept in memory per agent
+QUERY_CACHE_TTL_SECONDS = 3600            # Seconds a cached query embedding stays valid
+ANSWER_CACHE_ENABLED = False              # Whether answers are reused for near-identical queries
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.97  # Minimum cosine similarity for a cached answer to be reused
+ANSWER_CACHE_MAX_ENTRIES = 5000           # Answers kept per team/prompt namespace
+ANSWER_CACHE_INITIAL_ROWS = 64            # Rows first allocated per namespace; doubled as needed up to the maximum
+ANSWER_CACHE_TTL_SECONDS = 86400          # Seconds a cached answer stays valid
+
+# Metrics settings
+LATENCY_MAX_SAMPLES = 10000               # Recent samples kept per latency metric for percentiles
+METRICS_ENABLED = True                    # Whether stage spans and counters are recorded
+METRICS_PREFIX = 'resident_ta_'           # Prefix of exported metric names
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_PROFILE_DIR = 'profiles'          # Where per-request cProfile/tracemalloc reports are written
+METRICS_PROFILE_TOP = 30                  # Functions or lines listed in a profile report
+
 # Add any additional constants as needed, such as default settings for agents, etc.
 
 # Usage example:
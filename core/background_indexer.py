@@ -0,0 +1,244 @@
+# core/background_indexer.py
+
+# Keeps agents' vector stores in line with their reference folders while they serve queries.
+#
+# A daemon thread scans each watched folder (e.g. teams/<team>/reference_materials, with its
+# public/ and confidential/ subfolders) every `poll_seconds` for PDFs that were added,
+# changed or removed. Once a folder has been quiet for `debounce_seconds`, so copies in
+# progress are finished, the agent's store is updated into a new on-disk version and
+# swapped into the running agents (see GenericAgent.update_vector_store and
+# core/store_versions.py). Queries keep being answered from the previous version meanwhile
+# and requests already under way finish on it.
+#
+# Processes that only serve (e.g. several server workers) run the indexer with build=False:
+# it then only swaps in versions that another process has published. A separate building
+# process can be run with `python -m core.background_indexer --team intel_vpro`.
+
+import argparse
+import os
+import threading
+import time
+
+from config.constants import BACKGROUND_INDEXER_DEBOUNCE_SECONDS, BACKGROUND_INDEXER_POLL_SECONDS
+from core.pdf_tools import list_pdf_files
+
+def reference_materials_path(team_name):
+    """
+    Returns the folder holding a team's public and confidential reference PDFs.
+    """
+    return os.path.join("teams", team_name, "reference_materials")
+
+def folder_snapshot(folder_path):
+    """
+    Returns the PDFs under a folder with their modification times and sizes.
+
+    Parameters:
+    - folder_path (str or None): Folder to scan recursively.
+
+    Returns:
+    - dict: {relative path: (mtime in ns, size)}; empty if there is no such folder.
+    """
+    snapshot = {}
+    if not folder_path or not os.path.isdir(folder_path):
+        return snapshot
+    for file_path in list_pdf_files(folder_path, recursive=True):
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            continue  # Deleted while scanning; the next scan sees it gone
+        snapshot[os.path.relpath(file_path, folder_path)] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+class BackgroundIndexer:
+    def __init__(self, config_manager=None, poll_seconds=None, debounce_seconds=None, build=True):
+        """
+        Initialize an indexer with no watched folders.
+
+        Parameters:
+        - config_manager (ConfigManager, optional): Source of the global `background_indexer` settings.
+        - poll_seconds (float, optional): Seconds between folder scans.
+        - debounce_seconds (float, optional): Quiet time after the last change before a rebuild.
+        - build (bool): Whether to build new versions; without, only versions published by
+                        another process are swapped in.
+        """
+        settings = {}
+        if config_manager is not None:
+            settings = config_manager.get_global_setting("background_indexer", {}) or {}
+        self.poll_seconds = poll_seconds if poll_seconds is not None else settings.get(
+            "poll_seconds", BACKGROUND_INDEXER_POLL_SECONDS)
+        self.debounce_seconds = debounce_seconds if debounce_seconds is not None else settings.get(
+            "debounce_seconds", BACKGROUND_INDEXER_DEBOUNCE_SECONDS)
+        self.build = build
+        self.rebuilds = 0
+        self.swaps = 0
+        self.failures = 0
+        self._watches = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def watch(self, agent, folder_path=None):
+        """
+        Keeps an agent's store up to date with a folder of PDFs.
+
+        The first scan after `start` brings the store up to date without waiting for the debounce.
+
+        Parameters:
+        - agent (GenericAgent): The agent whose store is rebuilt and hot-swapped.
+        - folder_path (str, optional): Folder of reference PDFs; defaults to the team's reference materials.
+        """
+        if folder_path is None and agent.team_name:
+            folder_path = reference_materials_path(agent.team_name)
+        with self._lock:
+            self._watches.append({"agent": agent, "folder_path": folder_path, "snapshot": folder_snapshot(folder_path),
+                                  "built": None, "changed_at": float("-inf"), "force": False, "error": None})
+
+    def request_rebuild(self, agent=None, force=True):
+        """
+        Schedules a rebuild of one agent's store (or all of them) on the indexer thread, and returns at once.
+
+        Parameters:
+        - agent (GenericAgent, optional): The agent to rebuild; None rebuilds every watched store.
+        - force (bool): Rebuild from every file rather than only the changed ones.
+        """
+        with self._lock:
+            for watch in self._watches:
+                if agent is None or watch["agent"] is agent:
+                    watch["force"] = "full" if force else watch["force"] or "update"
+        self._wake.set()
+
+    def start(self):
+        """
+        Starts the indexer thread. It is a daemon thread, so it never keeps the process alive.
+
+        Returns:
+        - threading.Thread: The indexer thread.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="background-indexer", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        """
+        Stops the indexer thread, waiting for a rebuild in progress to finish.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll_once(self):
+        """
+        Scans every watched folder once, and rebuilds the stores whose folders changed and settled.
+
+        Returns:
+        - list of GenericAgent: The agents whose store was swapped for a new version.
+        """
+        with self._lock:
+            watches = list(self._watches)
+        return [watch["agent"] for watch in watches if self._poll_watch(watch)]
+
+    def status(self):
+        """
+        Returns the indexer's counters and each watched folder's state.
+
+        Returns:
+        - dict: Rebuild, swap and failure counts, and per watch the folder, whether changes are
+          waiting for a rebuild, and the last error.
+        """
+        with self._lock:
+            watches = [{"agent": watch["agent"].agent_label, "folder_path": watch["folder_path"],
+                        "pending": self.build and (bool(watch["force"]) or watch["snapshot"] != watch["built"]),
+                        "error": watch["error"]} for watch in self._watches]
+        return {"running": self._thread is not None and self._thread.is_alive(), "build": self.build,
+                "rebuilds": self.rebuilds, "swaps": self.swaps, "failures": self.failures, "watches": watches}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Background indexer error: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def _poll_watch(self, watch):
+        agent = watch["agent"]
+        registry = agent.vector_store_registry
+        if not self.build:
+            if registry.refresh(agent.vector_store_path, agent.index_config):
+                self.swaps += 1
+                print(f"Swapped in a new version of the {agent.agent_label} vector store.")
+                return True
+            return False
+
+        snapshot = folder_snapshot(watch["folder_path"])
+        now = time.monotonic()
+        with self._lock:
+            if snapshot != watch["snapshot"]:
+                # Still changing (or a copy is in progress); wait until it settles
+                watch["snapshot"], watch["changed_at"] = snapshot, now
+            force = watch["force"]
+            settled = now - watch["changed_at"] >= self.debounce_seconds
+            if not force and (snapshot == watch["built"] or not settled):
+                return False
+            watch["force"] = False
+
+        print(f"\nBackground indexer: updating the {agent.agent_label} vector store from {watch['folder_path']}...")
+        try:
+            swapped = agent.update_vector_store(watch["folder_path"], force_rebuild=force == "full")
+        except Exception as e:
+            # The version being served is untouched; the build is retried once the folder changes again
+            self.failures += 1
+            watch["built"], watch["error"] = snapshot, str(e)
+            print(f"Background indexer: updating the {agent.agent_label} vector store failed: {e}")
+            return False
+        self.rebuilds += 1
+        watch["built"], watch["error"] = snapshot, None
+        if swapped:
+            self.swaps += 1
+            print(f"Background indexer: the {agent.agent_label} vector store was updated and swapped in.")
+        return swapped
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild team vector stores when their reference PDFs change.")
+    parser.add_argument("--team", action="append", default=None, help="Team to watch; repeat for several (default intel_vpro).")
+    parser.add_argument("--config", default="config/team_config.yaml")
+    parser.add_argument("--once", action="store_true", help="Bring the stores up to date once and exit.")
+    args = parser.parse_args()
+
+    from core.config_manager import ConfigManager
+    from core.generic_agent import GenericAgent
+
+    config_manager = ConfigManager(args.config)
+    indexer = BackgroundIndexer(config_manager, debounce_seconds=0 if args.once else None)
+    for team_name in args.team or ["intel_vpro"]:
+        prompt_path = os.path.join("teams", team_name, "prompts")
+        prompts = sorted(name for name in os.listdir(prompt_path) if name.endswith(".md")) if os.path.isdir(prompt_path) else []
+        if not prompts:
+            parser.error(f"No prompt found in {prompt_path} for team '{team_name}'.")
+        # Only the store is built here; the prompt is never sent
+        agent = GenericAgent(os.getenv("OPENAI_API_KEY"), os.path.join(prompt_path, prompts[0]),
+                             config_manager=config_manager, team_name=team_name)
+        indexer.watch(agent)
+    if args.once:
+        indexer.poll_once()
+        return
+    indexer.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        indexer.stop()
+
+if __name__ == "__main__":
+    main()
+
+# Example usage:
+# indexer = BackgroundIndexer(config_manager)
+# indexer.watch(vpro_agent, 'teams/intel_vpro/reference_materials')
+# indexer.start()                      # Scans every poll_seconds; rebuilds after debounce_seconds of quiet
+# indexer.request_rebuild(vpro_agent)  # Full rebuild in the background, e.g. on an operator command
@@ -0,0 +1,297 @@
+# core/chunk_store.py
+
+# A compact, pickle-free on-disk store for document chunks.
+#
+# Everything lives in one file so it can be swapped into place atomically:
+#   8-byte magic | 8-byte header length | JSON header | aligned sections
+# Sections are an int64 array of sorted chunk IDs, int64 byte offsets into a UTF-8 blob,
+# and per-chunk metadata columns. The file is memory-mapped read-only, so opening it is
+# nearly free and every process serving the same store shares one copy in the page cache.
+
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from config.constants import DEFAULT_SECURITY_LEVEL
+
+CHUNK_STORE_MAGIC = b"RTACHNK1"
+SECURITY_LEVELS = ("public", "confidential")
+
+_ALIGNMENT = 64
+_META_DTYPE = np.dtype([("source", "<i4"), ("page_start", "<i4"), ("page_end", "<i4"), ("security", "u1"), ("team", "<i2")])
+
+def is_chunk_store(path):
+    """
+    Checks whether a file is a chunk store (as opposed to a legacy pickle).
+
+    Parameters:
+    - path (str): Path of the file.
+
+    Returns:
+    - bool: True if the file starts with the chunk store magic bytes.
+    """
+    with open(path, 'rb') as file:
+        return file.read(len(CHUNK_STORE_MAGIC)) == CHUNK_STORE_MAGIC
+
+def write_chunk_store(path, document_chunks, chunk_metadata=None):
+    """
+    Writes chunks and their metadata to a chunk store file, replacing any existing file atomically.
+
+    Parameters:
+    - path (str): Path of the chunk store file.
+    - document_chunks (list or dict): Chunk texts by position, or a {chunk_id: text} dict.
+    - chunk_metadata (dict, optional): {chunk_id: {'source', 'page_start', 'page_end', 'security_level', 'team'}}.
+                                       Missing entries get no source, no team and the default security level.
+    """
+    if isinstance(document_chunks, dict):
+        ids = np.array(sorted(document_chunks), dtype='<i8')
+        texts = [document_chunks[chunk_id] for chunk_id in ids.tolist()]
+    else:
+        ids = np.arange(len(document_chunks), dtype='<i8')
+        texts = list(document_chunks)
+    chunk_metadata = chunk_metadata or {}
+
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+
+    sources, teams = [], []
+    source_numbers, team_numbers = {}, {}
+    meta = np.zeros(len(ids), dtype=_META_DTYPE)
+    default_level = SECURITY_LEVELS.index(DEFAULT_SECURITY_LEVEL)
+    for row, chunk_id in enumerate(ids.tolist()):
+        entry = chunk_metadata.get(chunk_id)
+        if entry is None:
+            meta[row] = (-1, 0, 0, default_level, -1)
+            continue
+        source = entry.get("source")
+        if source is not None and source not in source_numbers:
+            source_numbers[source] = len(sources)
+            sources.append(source)
+        team = entry.get("team")
+        if team is not None and team not in team_numbers:
+            team_numbers[team] = len(teams)
+            teams.append(team)
+        meta[row] = (
+            source_numbers.get(source, -1),
+            entry.get("page_start", 0),
+            entry.get("page_end", 0),
+            SECURITY_LEVELS.index(entry.get("security_level", DEFAULT_SECURITY_LEVEL)),
+            team_numbers.get(team, -1),
+        )
+
+    header = {"count": len(ids), "sources": sources, "teams": teams, "security_levels": list(SECURITY_LEVELS)}
+    write_sectioned_file(path, CHUNK_STORE_MAGIC, header, [("ids", ids), ("offsets", offsets), ("meta", meta)], encoded)
+
+def write_sectioned_file(path, magic, header, sections, blob_parts):
+    """
+    Writes a memory-mappable file of aligned numpy sections plus a trailing byte blob,
+    replacing any existing file atomically.
+
+    Layout: magic | 8-byte header length | JSON header | 64-byte aligned sections | blob.
+
+    Parameters:
+    - path (str): Path of the file.
+    - magic (bytes): 8 bytes identifying the file type.
+    - header (dict): JSON-serializable header; a 'sections' entry is added describing the layout.
+    - sections (list of (str, np.ndarray)): Named arrays, in file order.
+    - blob_parts (list of bytes): Byte strings written back to back after the sections.
+    """
+    header = dict(header, sections={})
+    blob_size = sum(len(data) for data in blob_parts)
+
+    # Lay out sections after the header; offsets change the header's length, so repeat until stable
+    header_bytes = b""
+    while True:
+        first_section = _align(len(magic) + 8 + len(header_bytes))
+        position = first_section
+        for name, array in sections:
+            header["sections"][name] = {"offset": position, "dtype": array.dtype.descr if array.dtype.names else array.dtype.str,
+                                        "count": len(array)}
+            position = _align(position + array.nbytes)
+        header["sections"]["blob"] = {"offset": position, "size": blob_size}
+        header_bytes = json.dumps(header).encode("utf-8")
+        if _align(len(magic) + 8 + len(header_bytes)) <= first_section:
+            break
+
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(magic)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in sections:
+            file.write(b"\0" * (header["sections"][name]["offset"] - file.tell()))
+            file.write(array.tobytes())
+        file.write(b"\0" * (header["sections"]["blob"]["offset"] - file.tell()))
+        for data in blob_parts:
+            file.write(data)
+    os.replace(temp_path, path)
+
+def map_sectioned_file(path, magic):
+    """
+    Memory-maps a file written by `write_sectioned_file`.
+
+    Parameters:
+    - path (str): Path of the file.
+    - magic (bytes): The expected magic bytes.
+
+    Returns:
+    - (mmap.mmap, dict, dict, int): The map, the header, {name: array view} for every
+      section, and the blob's byte offset.
+    """
+    with open(path, 'rb') as file:
+        file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if file_map[:len(magic)] != magic:
+        file_map.close()
+        raise ValueError(f"{path} is not a {magic.decode()} file.")
+
+    header_length = struct.unpack_from("<Q", file_map, len(magic))[0]
+    header_start = len(magic) + 8
+    header = json.loads(file_map[header_start:header_start + header_length])
+    arrays = {}
+    for name, section in header["sections"].items():
+        if name == "blob":
+            continue
+        dtype = section["dtype"]
+        dtype = np.dtype([tuple(field) for field in dtype]) if isinstance(dtype, list) else np.dtype(dtype)
+        arrays[name] = np.frombuffer(file_map, dtype=dtype, count=section["count"], offset=section["offset"])
+    return file_map, header, arrays, header["sections"]["blob"]["offset"]
+
+def _align(position):
+    return (position + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+class ChunkStore:
+    def __init__(self, path):
+        """
+        Open a chunk store file as a read-only memory map.
+
+        Parameters:
+        - path (str): Path of the chunk store file.
+        """
+        self.path = path
+        self._mmap, header, arrays, self._blob_start = map_sectioned_file(path, CHUNK_STORE_MAGIC)
+        self.sources = header["sources"]
+        self.teams = header.get("teams", [])  # Stores written before per-chunk teams have none
+        self.security_levels = header["security_levels"]
+        self.ids = arrays["ids"]
+        self.offsets = arrays["offsets"]
+        self.meta = arrays["meta"]
+        # Full builds use IDs 0..n-1, so positions can be used directly without a search
+        self._positional = len(self.ids) == 0 or (self.ids[0] == 0 and self.ids[-1] == len(self.ids) - 1)
+
+    def _position(self, chunk_id):
+        """
+        Returns the row of a chunk ID, or -1 if it is not in the store.
+        """
+        chunk_id = int(chunk_id)
+        if self._positional:
+            return chunk_id if 0 <= chunk_id < len(self.ids) else -1
+        row = int(np.searchsorted(self.ids, chunk_id))
+        return row if row < len(self.ids) and self.ids[row] == chunk_id else -1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, chunk_id):
+        return self._position(chunk_id) >= 0
+
+    def __getitem__(self, chunk_id):
+        row = self._position(chunk_id)
+        if row < 0:
+            raise KeyError(chunk_id)
+        return self._text(row)
+
+    def _text(self, row):
+        start = self._blob_start + int(self.offsets[row])
+        end = self._blob_start + int(self.offsets[row + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    def get(self, chunk_id, default=None):
+        """
+        Returns the text of a chunk, or `default` if the ID is unknown.
+        """
+        row = self._position(chunk_id)
+        return self._text(row) if row >= 0 else default
+
+    def metadata(self, chunk_id):
+        """
+        Returns a chunk's metadata.
+
+        Parameters:
+        - chunk_id (int): The chunk ID.
+
+        Returns:
+        - dict or None: 'source', 'page_start', 'page_end', 'security_level' and 'team', or None if the ID is unknown.
+        """
+        row = self._position(chunk_id)
+        if row < 0:
+            return None
+        entry = self.meta[row]
+        source = int(entry["source"])
+        team = int(entry["team"]) if "team" in self.meta.dtype.names else -1
+        return {
+            "source": self.sources[source] if source >= 0 else None,
+            "page_start": int(entry["page_start"]),
+            "page_end": int(entry["page_end"]),
+            "security_level": self.security_levels[int(entry["security"])],
+            "team": self.teams[team] if team >= 0 else None,
+        }
+
+    def allowed_ids(self, clearance, team=None):
+        """
+        Returns the IDs of the chunks a user may retrieve.
+
+        Public chunks are always allowed. Chunks above public are allowed when the user's
+        clearance covers their security level and, if the chunk records a team, the user
+        acts for that team.
+
+        Parameters:
+        - clearance (str): The user's security level, one of the store's security levels.
+        - team (str, optional): The team the user acts for.
+
+        Returns:
+        - np.ndarray: Sorted int64 chunk IDs.
+        """
+        if clearance not in self.security_levels:
+            raise ValueError(f"Unknown security level '{clearance}'. Expected one of {self.security_levels}.")
+        security = self.meta["security"]
+        allowed = security <= self.security_levels.index(clearance)
+        if "team" in self.meta.dtype.names:
+            chunk_teams = self.meta["team"]
+            own_team = self.teams.index(team) if team in self.teams else -2
+            allowed &= (security == 0) | (chunk_teams == -1) | (chunk_teams == own_team)
+        return self.ids[allowed]
+
+    def items(self):
+        """
+        Yields (chunk_id, text) pairs in ID order.
+        """
+        for row, chunk_id in enumerate(self.ids.tolist()):
+            yield chunk_id, self._text(row)
+
+    def to_dicts(self):
+        """
+        Copies the store into mutable {chunk_id: text} and {chunk_id: metadata} dicts, for updates.
+        """
+        texts = dict(self.items())
+        return texts, {chunk_id: self.metadata(chunk_id) for chunk_id in texts}
+
+    def close(self):
+        """
+        Releases the memory map. Arrays previously returned by the store must not be used afterwards.
+        """
+        self.ids = self.offsets = self.meta = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Arrays still reference the map; it is released when they are garbage collected
+
+# Example usage:
+# write_chunk_store('vector_store.index_chunks.bin', {7: 'Reset the MEBx password...'},
+#                   {7: {'source': 'amt_guide.pdf', 'page_start': 3, 'page_end': 3, 'security_level': 'public'}})
+# store = ChunkStore('vector_store.index_chunks.bin')
+# store[7], store.metadata(7)
+# store.allowed_ids('public')
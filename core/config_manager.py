@@ -55,7 +55,29 @@ class ConfigManager:
         """
         return self.config_data.get('teams', {}).get(team_name, {})
 
+    def get_team_setting(self, team_name, key, default=None):
+        """
+        Retrieve a setting for a team, falling back to the global setting of the same name.
+        Dict settings are merged, with team values taking precedence.
+
+        Parameters:
+        - team_name (str): Name of the team, or None for the global setting only.
+        - key (str): The setting key to retrieve.
+        - default: Default value if the key is not found.
+
+        Returns:
+        - The value of the setting, or the default if not found.
+        """
+        global_value = self.get_global_setting(key)
+        team_value = self.get_team_config(team_name).get(key) if team_name else None
+        if isinstance(global_value, dict) and isinstance(team_value, dict):
+            return {**global_value, **team_value}
+        if team_value is not None:
+            return team_value
+        return global_value if global_value is not None else default
+
 # Example usage:
 # config_manager = ConfigManager('config/team_config.yaml')
 # global_setting = config_manager.get_global_setting('some_key')
 # team_config = config_manager.get_team_config('intel_vpro')
+# answer_cache_settings = config_manager.get_team_setting('intel_vpro', 'answer_cache', {})
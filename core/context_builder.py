@@ -0,0 +1,56 @@
+# core/context_builder.py
+
+# Packs retrieved chunks into the prompt within a token budget.
+#
+# Retrieval returns more candidates than will be used, best first. Whole chunks are taken
+# in that order while they fit; the first one that doesn't is cut at a sentence boundary
+# to fill the remaining budget, unless too little room is left to be worth it. Every
+# request then spends a predictable number of prompt tokens on context, however long or
+# short the individual chunks are.
+
+from collections import namedtuple
+
+from config.constants import CONTEXT_MIN_CHUNK_TOKENS
+from core.text_utils import get_encoding, truncate_to_tokens
+
+# The assembled context: its text, the hits it draws on, and its size against the budget
+PackedContext = namedtuple("PackedContext", ["text", "hits", "tokens_used", "token_budget"])
+
+CONTEXT_SEPARATOR = "\n\n"
+
+def build_context(hits, token_budget, model="gpt-3.5-turbo", min_chunk_tokens=CONTEXT_MIN_CHUNK_TOKENS):
+    """
+    Packs the best hits into a token budget.
+
+    Parameters:
+    - hits (list): Retrieved hits, best first; each has a `text` attribute (e.g. FederatedHit).
+    - token_budget (int): Maximum tokens of context, separators included.
+    - model (str): The model the prompt is for, whose tokenizer counts the tokens.
+    - min_chunk_tokens (int): Smallest shortened chunk worth including.
+
+    Returns:
+    - PackedContext: The context text, the hits used (a shortened one included), and the
+      tokens used.
+    """
+    encoding = get_encoding(model)
+    separator_tokens = len(encoding.encode_ordinary(CONTEXT_SEPARATOR))
+    min_chunk_tokens = min(min_chunk_tokens, token_budget)
+    parts, used_hits, tokens_used = [], [], 0
+    for hit in hits:
+        remaining = token_budget - tokens_used - (separator_tokens if parts else 0)
+        if remaining < min_chunk_tokens:
+            break
+        text, tokens = truncate_to_tokens(hit.text.strip(), remaining, model=model)
+        if not text or (tokens < min_chunk_tokens and text != hit.text.strip()):
+            break  # Only a fragment would fit
+        parts.append(text)
+        used_hits.append(hit)
+        tokens_used += tokens + (separator_tokens if len(parts) > 1 else 0)
+        if text != hit.text.strip():
+            break  # The budget is full
+    return PackedContext(CONTEXT_SEPARATOR.join(parts), used_hits, tokens_used, token_budget)
+
+# Example usage:
+# hits = agent.federated_query('AMT provisioning fails', top_k=8)
+# context = build_context(hits, token_budget=1500)
+# print(context.tokens_used, len(context.hits))
@@ -0,0 +1,166 @@
+# core/embedding_cache.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config.constants import EMBEDDING_CACHE_MAX_ENTRIES
+
+# SQLite limits the number of bound parameters per statement; stay well below it
+_SQL_BATCH = 500
+
+def embedding_cache_key(model, text):
+    """
+    Computes the content address of an embedding: a hash of the model name and chunk text.
+
+    Parameters:
+    - model (str): The embedding model name.
+    - text (str): The text that was embedded.
+
+    Returns:
+    - bytes: A 32-byte SHA-256 digest.
+    """
+    return hashlib.sha256(model.encode("utf-8") + b"\0" + text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    def __init__(self, cache_path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Initialize a persistent, size-bounded embedding cache stored in SQLite.
+
+        Entries are keyed by a hash of (model, text), so unchanged chunks are never
+        re-embedded across rebuilds. When the cache grows past `max_entries`, the
+        least recently used entries are evicted.
+
+        Parameters:
+        - cache_path (str): Path of the SQLite database file (created if missing).
+        - max_entries (int): Maximum number of embeddings to keep.
+        """
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entry_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, texts, model):
+        """
+        Looks up cached embeddings for a list of texts.
+
+        Parameters:
+        - texts (list of str): The texts to look up.
+        - model (str): The embedding model name.
+
+        Returns:
+        - list: One entry per text, either a float32 np.ndarray or None on a miss.
+        """
+        keys = [embedding_cache_key(model, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            results = [
+                np.frombuffer(found[key], dtype='float32') if key in found else None
+                for key in keys
+            ]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, texts, embeddings, model):
+        """
+        Stores embeddings for a list of texts, evicting old entries if the cache is full.
+
+        Parameters:
+        - texts (list of str): The texts that were embedded.
+        - embeddings (np.ndarray): A float32 matrix with one row per text.
+        - model (str): The embedding model name.
+        """
+        if len(texts) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype='float32')
+        now = time.time()
+        rows = [
+            (embedding_cache_key(model, text), embeddings.shape[1], embeddings[i].tobytes(), now)
+            for i, text in enumerate(texts)
+        ]
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._entry_count += self._conn.total_changes - before
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the cache is within its size bound.
+        """
+        overflow = self._entry_count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (overflow,)
+            )
+            self._entry_count -= overflow
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        Returns:
+        - dict: Hits, misses, hit rate, and current number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entry_count,
+        }
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._conn.close()
+
+# Example usage:
+# cache = EmbeddingCache('vector_store.index_embeddings.sqlite')
+# index, chunks = build_vector_store(documents, openai_api_key, cache=cache)
+# print(cache.stats())
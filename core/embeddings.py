@@ -0,0 +1,227 @@
+import asyncio
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from config.constants import (
+    DEFAULT_EMBEDDING_MODEL,
+    EMBEDDING_MAX_BATCH_SIZE,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RETRY_BASE_DELAY,
+)
+from core.text_utils import count_tokens
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors():
+    """
+    Returns the errors worth retrying: the request itself was fine, the service was busy or unreachable.
+
+    The openai package is only imported when a request fails, so offline providers never load it.
+    """
+    import openai
+    return (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+def batch_texts(texts, model=DEFAULT_EMBEDDING_MODEL, max_batch_size=EMBEDDING_MAX_BATCH_SIZE, max_batch_tokens=EMBEDDING_MAX_BATCH_TOKENS):
+    """
+    Groups consecutive texts into request batches that respect the embeddings API limits.
+
+    Parameters:
+    - texts (list of str): The texts to group.
+    - model (str): Model whose tokenizer is used to size each text.
+    - max_batch_size (int): Maximum number of inputs per request.
+    - max_batch_tokens (int): Maximum total tokens per request.
+
+    Returns:
+    - list of (int, int): Half-open (start, end) index ranges into `texts`, in order.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if i > start and (i - start >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+def _retry_delay(error, attempt, base_delay):
+    """
+    Works out how long to wait before retrying a failed request.
+
+    Honors the server's Retry-After header when present, otherwise uses
+    exponential backoff with full jitter.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+    return random.uniform(0, base_delay * (2 ** attempt))
+
+def create_embeddings_with_retry(client, texts, model=DEFAULT_EMBEDDING_MODEL, max_retries=EMBEDDING_MAX_RETRIES, base_delay=EMBEDDING_RETRY_BASE_DELAY):
+    """
+    Embeds one batch of texts, backing off and retrying on rate limits and transient errors.
+
+    Parameters:
+    - client (openai.OpenAI): Client used for the embeddings request.
+    - texts (list of str): The batch of texts to embed in a single request.
+    - model (str): OpenAI model for embedding generation.
+    - max_retries (int): Maximum number of retries before giving up.
+    - base_delay (float): Initial backoff delay in seconds.
+
+    Returns:
+    - list of list of float: One embedding per input text, in input order.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.embeddings.create(model=model, input=texts)
+            # The API tags each embedding with its input position; don't rely on response order
+            data = sorted(response.data, key=lambda item: item.index)
+            return [item.embedding for item in data]
+        except retryable_errors() as e:
+            if attempt == max_retries:
+                raise
+            delay = _retry_delay(e, attempt, base_delay)
+            print(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.2f}s...")
+            time.sleep(delay)
+
+async def create_embeddings_with_retry_async(client, texts, model=DEFAULT_EMBEDDING_MODEL, max_retries=EMBEDDING_MAX_RETRIES,
+                                            base_delay=EMBEDDING_RETRY_BASE_DELAY):
+    """
+    Async version of `create_embeddings_with_retry`, for use with an AsyncOpenAI client.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.embeddings.create(model=model, input=texts)
+            data = sorted(response.data, key=lambda item: item.index)
+            return [item.embedding for item in data]
+        except retryable_errors() as e:
+            if attempt == max_retries:
+                raise
+            delay = _retry_delay(e, attempt, base_delay)
+            print(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
+
+def embed_texts(texts, client, model=DEFAULT_EMBEDDING_MODEL, max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+                max_batch_tokens=EMBEDDING_MAX_BATCH_TOKENS, max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                max_retries=EMBEDDING_MAX_RETRIES, show_progress=True, cache=None):
+    """
+    Embeds a list of texts using batched requests with a bounded number in flight.
+
+    When a cache is given, only texts without a cached embedding are sent to the API,
+    and duplicate texts are embedded once.
+
+    Parameters:
+    - texts (list of str): The texts to embed.
+    - client (openai.OpenAI): Client used for the embeddings requests.
+    - model (str): OpenAI model for embedding generation.
+    - max_batch_size (int): Maximum number of inputs per request.
+    - max_batch_tokens (int): Maximum total tokens per request.
+    - max_concurrency (int): Maximum number of requests in flight at once.
+    - max_retries (int): Retries per batch for rate limits and transient errors.
+    - show_progress (bool): Whether to display a tqdm progress bar.
+    - cache (EmbeddingCache, optional): Persistent cache consulted before calling the API.
+
+    Returns:
+    - np.ndarray: A float32 matrix with one row per text, in the original order.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype='float32')
+
+    if cache is None:
+        return _embed_uncached(texts, client, model, max_batch_size, max_batch_tokens,
+                               max_concurrency, max_retries, show_progress)
+
+    cached = cache.get_many(texts, model)
+    missing_positions = {}
+    for i, (text, vector) in enumerate(zip(texts, cached)):
+        if vector is None:
+            missing_positions.setdefault(text, []).append(i)
+
+    missing_texts = list(missing_positions)
+    if missing_texts:
+        new_embeddings = _embed_uncached(missing_texts, client, model, max_batch_size, max_batch_tokens,
+                                         max_concurrency, max_retries, show_progress)
+        cache.put_many(missing_texts, new_embeddings, model)
+        for text, row in zip(missing_texts, new_embeddings):
+            for i in missing_positions[text]:
+                cached[i] = row
+
+    return np.vstack(cached).astype('float32', copy=False)
+
+def _embed_uncached(texts, client, model, max_batch_size, max_batch_tokens, max_concurrency, max_retries, show_progress):
+    """
+    Sends every text to the embeddings API in batches and assembles the result matrix.
+    """
+    from tqdm import tqdm
+
+    batches = batch_texts(texts, model, max_batch_size, max_batch_tokens)
+    embeddings = None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = {
+            executor.submit(create_embeddings_with_retry, client, texts[start:end], model, max_retries): (start, end)
+            for start, end in batches
+        }
+        with tqdm(total=len(texts), desc="Embedding chunks", unit="chunk", disable=not show_progress) as progress:
+            for future in as_completed(futures):
+                start, end = futures[future]
+                batch_embeddings = np.asarray(future.result(), dtype='float32')
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype='float32')
+                embeddings[start:end] = batch_embeddings
+                progress.update(end - start)
+
+    return embeddings
+
+def embed_query(query, client, model=DEFAULT_EMBEDDING_MODEL, cache=None):
+    """
+    Embeds a single query string.
+
+    Parameters:
+    - query (str): The query text.
+    - client (openai.OpenAI): Client used for the embeddings request.
+    - model (str): OpenAI model for embedding generation.
+    - cache (EmbeddingCache, optional): Persistent cache consulted before calling the API.
+
+    Returns:
+    - np.ndarray: A float32 matrix of shape (1, dimension).
+    """
+    if cache is not None:
+        cached = cache.get_many([query], model)[0]
+        if cached is not None:
+            return cached.reshape(1, -1)
+
+    embedding = np.asarray(create_embeddings_with_retry(client, [query], model), dtype='float32')
+    if cache is not None:
+        cache.put_many([query], embedding, model)
+    return embedding
+
+async def embed_query_async(query, client, model=DEFAULT_EMBEDDING_MODEL, cache=None):
+    """
+    Async version of `embed_query`, for use with an AsyncOpenAI client.
+    Cache lookups run in a worker thread so the event loop never waits on SQLite.
+    """
+    if cache is not None:
+        cached = (await asyncio.to_thread(cache.get_many, [query], model))[0]
+        if cached is not None:
+            return cached.reshape(1, -1)
+
+    embedding = np.asarray(await create_embeddings_with_retry_async(client, [query], model), dtype='float32')
+    if cache is not None:
+        await asyncio.to_thread(cache.put_many, [query], embedding, model)
+    return embedding
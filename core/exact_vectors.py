@@ -0,0 +1,137 @@
+# core/exact_vectors.py
+
+# Full-precision copies of a compressed index's vectors, for reranking.
+#
+# With `storage: fp16`, `sq8` or `pq` (see core/index_factory.py) the FAISS index keeps
+# compressed codes in memory, 2x, 4x or 16x+ smaller than float32, so its distances are
+# approximate. The exact float32 vectors go to a side file in the chunk store's sectioned
+# layout (see core/chunk_store.py): sorted int64 IDs and the matching vector rows. The file
+# is memory-mapped, and a search fetches `rerank_factor` times as many candidates from the
+# compressed index and re-scores only those, so just their rows are ever paged in.
+
+import numpy as np
+
+from core.chunk_store import map_sectioned_file, write_sectioned_file
+
+EXACT_VECTORS_MAGIC = b"RTAVEC01"
+
+def write_exact_vectors(path, ids, vectors):
+    """
+    Writes exact vectors to a side file, replacing any existing file atomically.
+
+    Parameters:
+    - path (str): Path of the side file.
+    - ids (np.ndarray): The vectors' IDs in the index (row positions for indexes without IDs).
+    - vectors (np.ndarray): The vectors as added to the index (normalized for cosine), shape (n, dimension).
+    """
+    ids = np.asarray(ids, dtype='<i8')
+    vectors = np.asarray(vectors, dtype='<f4')
+    order = np.argsort(ids, kind='stable')
+    if len(ids) and not np.all(np.diff(ids[order]) > 0):
+        raise ValueError("Exact vector IDs must be unique.")
+    sections = [("ids", ids[order]), ("vectors", vectors[order].reshape(-1))]
+    write_sectioned_file(path, EXACT_VECTORS_MAGIC, {"count": len(ids), "dimension": int(vectors.shape[1])}, sections, [])
+
+class ExactVectors:
+    def __init__(self, path, rerank_factor=4):
+        """
+        Open an exact vector side file as a read-only memory map.
+
+        Parameters:
+        - path (str): Path of the side file.
+        - rerank_factor (int): Candidates fetched from the compressed index per result wanted.
+        """
+        self.path = path
+        self.rerank_factor = max(1, int(rerank_factor))
+        self._mmap, header, arrays, _ = map_sectioned_file(path, EXACT_VECTORS_MAGIC)
+        self.dimension = header["dimension"]
+        self.ids = arrays["ids"]
+        self.vectors = arrays["vectors"].reshape(-1, self.dimension)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, ids):
+        """
+        Finds the rows of vector IDs.
+
+        Parameters:
+        - ids (np.ndarray): Vector IDs; -1 (FAISS's "no result") is allowed.
+
+        Returns:
+        - (np.ndarray, np.ndarray): Each ID's row, and a mask of the IDs that were found.
+        """
+        ids = np.asarray(ids, dtype='int64')
+        rows = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        found = (ids >= 0) & (self.ids[rows] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        return rows, found
+
+    def rerank(self, query_vectors, candidate_ids, k, metric_type):
+        """
+        Re-scores candidates with their exact vectors and keeps the best k per query.
+
+        Parameters:
+        - query_vectors (np.ndarray): The prepared query vectors, shape (queries, dimension).
+        - candidate_ids (np.ndarray): Candidate IDs from the compressed index, shape (queries, candidates).
+        - k (int): Results to keep per query.
+        - metric_type (int): The index's FAISS metric; inner-product scores rank highest first,
+                             squared L2 distances lowest first.
+
+        Returns:
+        - (np.ndarray, np.ndarray): Distances and IDs, shape (queries, k), in FAISS's layout
+          (missing results have ID -1).
+        """
+        import faiss
+
+        inner_product = metric_type == faiss.METRIC_INNER_PRODUCT
+        worst = -np.inf if inner_product else np.inf
+        distances = np.full((len(query_vectors), k), worst, dtype='float32')
+        ids = np.full((len(query_vectors), k), -1, dtype='int64')
+        for number, (query, candidates) in enumerate(zip(query_vectors, candidate_ids)):
+            rows, found = self.rows(candidates)
+            candidates, rows = candidates[found], rows[found]
+            if not len(candidates):
+                continue
+            # Rows are read in file order, so the page cache sees one forward pass
+            order = np.argsort(rows, kind='stable')
+            candidates, vectors = candidates[order], self.vectors[rows[order]]
+            if inner_product:
+                scores = vectors @ query
+                best = np.argsort(-scores, kind='stable')[:k]
+            else:
+                scores = ((vectors - query) ** 2).sum(axis=1)
+                best = np.argsort(scores, kind='stable')[:k]
+            distances[number, :len(best)] = scores[best]
+            ids[number, :len(best)] = candidates[best]
+        return distances, ids
+
+    def items(self, exclude=None):
+        """
+        Returns the IDs and vectors, for rewriting the file after an update.
+
+        Parameters:
+        - exclude (iterable of int, optional): IDs to leave out, e.g. those removed from the index.
+
+        Returns:
+        - (np.ndarray, np.ndarray): IDs and vectors, copied out of the memory map.
+        """
+        keep = np.ones(len(self.ids), dtype=bool)
+        if exclude is not None:
+            keep &= ~np.isin(self.ids, np.asarray(list(exclude), dtype='int64'))
+        return np.array(self.ids[keep]), np.array(self.vectors[keep])
+
+    def close(self):
+        """
+        Releases the memory map. Arrays previously returned must not be used afterwards.
+        """
+        self.ids = self.vectors = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Arrays still reference the map; it is released when they are garbage collected
+
+# Example usage:
+# write_exact_vectors('vector_store.index_vectors.bin', np.arange(len(vectors)), vectors)
+# exact_vectors = ExactVectors('vector_store.index_vectors.bin', rerank_factor=4)
+# _, candidates = compressed_index.search(query_vectors, 10 * exact_vectors.rerank_factor)
+# distances, ids = exact_vectors.rerank(query_vectors, candidates, 10, compressed_index.metric_type)
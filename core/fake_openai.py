@@ -0,0 +1,219 @@
+# core/fake_openai.py
+
+# Offline stand-in for the parts of the OpenAI client the agents use, so pipelines
+# can be exercised and benchmarked without network access or API costs.
+
+import asyncio
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+def fake_embedding(text, dimension=1536):
+    """
+    Produces a deterministic unit-length pseudo-embedding for a text.
+
+    Parameters:
+    - text (str): The text to embed.
+    - dimension (int): Length of the embedding vector.
+
+    Returns:
+    - np.ndarray: A float32 vector that is always the same for the same text.
+    """
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype('float32')
+    return vector / np.linalg.norm(vector)
+
+class _FakeEmbeddings:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model, input):
+        """
+        Mimics `client.embeddings.create`, including simulated latency and rate limits.
+        """
+        owner = self._owner
+        inputs = owner._begin_embeddings(input)
+        try:
+            time.sleep(owner.latency + owner.per_input_latency * len(inputs))
+            return owner._embeddings_response(model, inputs)
+        finally:
+            owner._end_request()
+
+class _FakeAsyncEmbeddings(_FakeEmbeddings):
+    async def create(self, model, input):
+        """
+        Mimics `AsyncOpenAI.embeddings.create`.
+        """
+        owner = self._owner
+        inputs = owner._begin_embeddings(input)
+        try:
+            await asyncio.sleep(owner.latency + owner.per_input_latency * len(inputs))
+            return owner._embeddings_response(model, inputs)
+        finally:
+            owner._end_request()
+
+class _FakeChatCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, model, messages, stream=False, **kwargs):
+        """
+        Mimics `client.chat.completions.create`, answering after the simulated completion latency.
+        With `stream=True`, returns an iterator of chunks; the first arrives after `first_token_latency`.
+        """
+        owner = self._owner
+        if stream:
+            return self._stream(model, messages)
+        owner._begin_request()
+        try:
+            time.sleep(owner.completion_latency)
+            return owner._chat_response(model, messages)
+        finally:
+            owner._end_request()
+
+    def _stream(self, model, messages):
+        owner = self._owner
+        owner._begin_request()
+        try:
+            for delay, chunk in owner._chat_chunks(model, messages):
+                time.sleep(delay)
+                yield chunk
+        finally:
+            owner._end_request()
+
+class _FakeAsyncChatCompletions(_FakeChatCompletions):
+    async def create(self, model, messages, stream=False, **kwargs):
+        """
+        Mimics `AsyncOpenAI.chat.completions.create`.
+        """
+        owner = self._owner
+        if stream:
+            return self._stream(model, messages)
+        owner._begin_request()
+        try:
+            await asyncio.sleep(owner.completion_latency)
+            return owner._chat_response(model, messages)
+        finally:
+            owner._end_request()
+
+    async def _stream(self, model, messages):
+        owner = self._owner
+        owner._begin_request()
+        try:
+            for delay, chunk in owner._chat_chunks(model, messages):
+                await asyncio.sleep(delay)
+                yield chunk
+        finally:
+            owner._end_request()
+
+class FakeOpenAIClient:
+    def __init__(self, dimension=1536, latency=0.05, per_input_latency=0.0, max_batch_size=2048,
+                 rate_limit_every=0, retry_after=0.01, completion_latency=0.2, first_token_latency=0.05):
+        """
+        Initialize a fake client whose embeddings and chat endpoints behave like a remote API.
+
+        Parameters:
+        - dimension (int): Length of the returned embedding vectors.
+        - latency (float): Simulated round-trip time per request, in seconds.
+        - per_input_latency (float): Additional simulated time per input text, in seconds.
+        - max_batch_size (int): Maximum inputs accepted per request.
+        - rate_limit_every (int): If set, every Nth request fails with a 429 rate limit error.
+        - retry_after (float): Retry-After value, in seconds, reported on simulated rate limits.
+        - completion_latency (float): Simulated time per chat completion, in seconds.
+        - first_token_latency (float): Simulated time until the first streamed token, in seconds;
+                                       the rest of `completion_latency` is spread over the other tokens.
+        """
+        self.dimension = dimension
+        self.latency = latency
+        self.per_input_latency = per_input_latency
+        self.max_batch_size = max_batch_size
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.completion_latency = completion_latency
+        self.first_token_latency = first_token_latency
+
+        # Counters for benchmarking
+        self.request_count = 0
+        self.input_count = 0
+        self.completion_count = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions(self))
+
+    def _begin_request(self):
+        with self._lock:
+            self.request_count += 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            return self.request_count
+
+    def _end_request(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _begin_embeddings(self, input):
+        inputs = [input] if isinstance(input, str) else list(input)
+        if len(inputs) > self.max_batch_size:
+            raise ValueError(f"Too many inputs in one request: {len(inputs)} > {self.max_batch_size}")
+        request_number = self._begin_request()
+        with self._lock:
+            self.input_count += len(inputs)
+        if self.rate_limit_every and request_number % self.rate_limit_every == 0:
+            self._end_request()
+            import httpx
+            import openai
+            request = httpx.Request("POST", "https://fake.local/v1/embeddings")
+            response = httpx.Response(429, request=request, headers={"retry-after": str(self.retry_after)})
+            raise openai.RateLimitError("Simulated rate limit", response=response, body=None)
+        return inputs
+
+    def _embeddings_response(self, model, inputs):
+        data = [
+            SimpleNamespace(index=i, embedding=fake_embedding(text, self.dimension).tolist(), object="embedding")
+            for i, text in enumerate(inputs)
+        ]
+        return SimpleNamespace(data=data, model=model, object="list")
+
+    def _answer(self, messages):
+        with self._lock:
+            self.completion_count += 1
+        question = messages[-1]["content"].rsplit("User Query:", 1)[-1].strip().split("\n", 1)[0]
+        return f"Fake answer to: {question[:200]}"
+
+    def _chat_response(self, model, messages):
+        message = SimpleNamespace(role="assistant", content=self._answer(messages))
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], model=model)
+
+    def _chat_chunks(self, model, messages):
+        """
+        Returns (delay before chunk, chunk) pairs for a streamed answer, one word per chunk.
+        """
+        words = self._answer(messages).split(" ")
+        tokens = [word if i == 0 else " " + word for i, word in enumerate(words)]
+        per_token = max(0.0, self.completion_latency - self.first_token_latency) / max(1, len(tokens) - 1)
+        chunks = []
+        for i, token in enumerate(tokens):
+            delta = SimpleNamespace(role="assistant" if i == 0 else None, content=token)
+            choice = SimpleNamespace(index=0, delta=delta, finish_reason="stop" if i == len(tokens) - 1 else None)
+            chunks.append((self.first_token_latency if i == 0 else per_token, SimpleNamespace(choices=[choice], model=model)))
+        return chunks
+
+class FakeAsyncOpenAIClient(FakeOpenAIClient):
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize a fake AsyncOpenAI client; takes the same arguments as FakeOpenAIClient.
+        """
+        super().__init__(*args, **kwargs)
+        self.embeddings = _FakeAsyncEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeAsyncChatCompletions(self))
+
+# Example usage:
+# client = FakeOpenAIClient(latency=0.1)
+# index, chunks = build_vector_store(documents, openai_api_key=None, client=client)
+# agent = VProTroubleshootingAgent(None, client=client, async_client=FakeAsyncOpenAIClient())
@@ -0,0 +1,235 @@
+# core/federated_search.py
+
+# Searches several vector stores (a team's own, the shared store, other teams') with one
+# query embedding and merges the results.
+#
+# Each store is searched on a shared thread pool; FAISS releases the GIL during search,
+# so total latency is close to that of the slowest store rather than the sum. Distances
+# are converted to a common similarity score before merging, per-source quotas keep one
+# large store from crowding out the others, and near-identical chunks (the same passage
+# indexed in two stores) are returned once. Keyword (BM25) rankings from each store's
+# keyword index can be fused with the vector ranking by reciprocal rank fusion.
+
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+
+from config.constants import FEDERATED_DEDUPE_THRESHOLD, FEDERATED_SEARCH_WORKERS, RRF_K
+from core.vector_store import search_keyword_index, search_vector_store_batch
+
+# A store to search: `quota` caps how many merged results it may contribute (None for no cap);
+# `clearance` and `team` restrict it to the chunks the user may see (None searches everything);
+# `keyword_index` is the store's BM25 index, if it has one; `exact_vectors` rerank a compressed index
+SearchSource = namedtuple("SearchSource", ["name", "vector_index", "document_chunks", "quota", "clearance", "team",
+                                           "keyword_index", "exact_vectors"], defaults=(None, None, None, None, None))
+
+# One merged result, with its provenance: the source store, the chunk's ID and metadata in
+# that store, the raw FAISS distance (None for keyword-only hits) and the score used for ranking
+FederatedHit = namedtuple("FederatedHit", ["source", "chunk_id", "text", "distance", "score", "metadata"])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=FEDERATED_SEARCH_WORKERS, thread_name_prefix="federated-search")
+        return _executor
+
+def distance_to_score(distance, metric_type):
+    """
+    Converts a FAISS distance to a similarity score comparable across indexes.
+
+    Inner-product indexes hold normalized vectors, so their distance already is the cosine
+    similarity. L2 indexes return squared distances; for unit-length embeddings (as OpenAI
+    returns) the cosine similarity is 1 - d / 2.
+
+    Parameters:
+    - distance (float): The distance FAISS returned.
+    - metric_type (int): The index's FAISS metric type.
+
+    Returns:
+    - float: The similarity; higher is better.
+    """
+    if metric_type == faiss.METRIC_INNER_PRODUCT:
+        return distance
+    return 1.0 - distance / 2.0
+
+def search_source(source, query_embedding, k):
+    """
+    Searches one source and returns its hits with scores and provenance.
+
+    Parameters:
+    - source (SearchSource): The store to search.
+    - query_embedding (np.ndarray): The query embedding, shape (1, dimension).
+    - k (int): Number of hits to retrieve.
+
+    Returns:
+    - list of FederatedHit: The source's hits, best first.
+    """
+    return search_source_batch(source, query_embedding, k)[0]
+
+def search_source_batch(source, query_embeddings, k):
+    """
+    Searches one source for many queries with a single matrix search.
+
+    Parameters:
+    - source (SearchSource): The store to search.
+    - query_embeddings (np.ndarray): The query embeddings, shape (queries, dimension).
+    - k (int): Number of hits to retrieve per query.
+
+    Returns:
+    - list of list of FederatedHit: Each query's hits, best first.
+    """
+    results = search_vector_store_batch(query_embeddings, source.vector_index, source.document_chunks, top_k=k,
+                                        clearance=source.clearance, team=source.team,
+                                        exact_vectors=source.exact_vectors)
+    metadata = getattr(source.document_chunks, "metadata", None)
+    return [
+        [FederatedHit(source.name, chunk_id, text, distance, distance_to_score(distance, source.vector_index.metric_type),
+                      metadata(chunk_id) if metadata else None)
+         for chunk_id, text, distance in hits]
+        for hits in results
+    ]
+
+def keyword_search_source(source, query, k):
+    """
+    Searches one source's keyword index.
+
+    Parameters:
+    - source (SearchSource): The store to search; sources without a keyword index return nothing.
+    - query (str): The query text.
+    - k (int): Number of hits to retrieve.
+
+    Returns:
+    - list of FederatedHit: The source's hits, best first, scored by BM25.
+    """
+    if source.keyword_index is None:
+        return []
+    hits = search_keyword_index(query, source.keyword_index, source.document_chunks, top_k=k,
+                                clearance=source.clearance, team=source.team)
+    metadata = getattr(source.document_chunks, "metadata", None)
+    return [
+        FederatedHit(source.name, chunk_id, text, None, score, metadata(chunk_id) if metadata else None)
+        for chunk_id, text, score in hits
+    ]
+
+def _shingles(text, size=4):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _is_near_duplicate(shingles, accepted_shingles, threshold):
+    for other in accepted_shingles:
+        overlap = len(shingles & other)
+        if overlap and overlap / len(shingles | other) >= threshold:
+            return True
+    return False
+
+def federated_search(query_embedding, sources, top_k=3, per_source_k=None, dedupe_threshold=FEDERATED_DEDUPE_THRESHOLD):
+    """
+    Searches several stores in parallel and merges their results by normalized score.
+
+    Parameters:
+    - query_embedding (np.ndarray): The query embedding, shape (1, dimension), computed once.
+    - sources (list of SearchSource): The stores to search.
+    - top_k (int): Number of merged results to return.
+    - per_source_k (int, optional): Hits retrieved from each store; defaults to `top_k`.
+    - dedupe_threshold (float): Word-shingle Jaccard similarity above which two chunks count
+                                as the same passage; None disables deduplication.
+
+    Returns:
+    - list of FederatedHit: Up to `top_k` hits, best first.
+    """
+    return federated_search_batch(query_embedding, sources, top_k, per_source_k, dedupe_threshold)[0]
+
+def federated_search_batch(query_embeddings, sources, top_k=3, per_source_k=None,
+                           dedupe_threshold=FEDERATED_DEDUPE_THRESHOLD):
+    """
+    Like `federated_search`, for many queries: each store is searched once with the whole
+    query matrix, and the results are merged per query.
+
+    Parameters:
+    - query_embeddings (np.ndarray): The query embeddings, shape (queries, dimension).
+    - sources, top_k, per_source_k, dedupe_threshold: As for `federated_search`.
+
+    Returns:
+    - list of list of FederatedHit: Up to `top_k` hits per query, best first.
+    """
+    per_source_k = per_source_k or top_k
+    if len(sources) == 1:
+        results = [search_source_batch(sources[0], query_embeddings, per_source_k)]
+    else:
+        futures = [_get_executor().submit(search_source_batch, source, query_embeddings, per_source_k)
+                   for source in sources]
+        results = [future.result() for future in futures]
+
+    merged = []
+    for row in range(len(results[0]) if results else 0):
+        candidates = sorted((hit for source_hits in results for hit in source_hits[row]),
+                            key=lambda hit: hit.score, reverse=True)
+        merged.append(_select(candidates, sources, top_k, dedupe_threshold))
+    return merged
+
+def reciprocal_rank_fusion(rankings, sources, top_k=3, k=RRF_K, dedupe_threshold=FEDERATED_DEDUPE_THRESHOLD):
+    """
+    Fuses several rankings (e.g. vector and keyword hits) by reciprocal rank.
+
+    Each hit scores the sum of 1 / (k + rank) over the rankings it appears in, so chunks
+    ranked well by both methods come first and raw scores never need to be comparable.
+
+    Parameters:
+    - rankings (list of list of FederatedHit): Rankings to fuse, each best first.
+    - sources (list of SearchSource): The searched stores, for their quotas.
+    - top_k (int): Number of fused results to return.
+    - k (int): Rank offset; higher values flatten the difference between top and lower ranks.
+    - dedupe_threshold (float): As for `federated_search`.
+
+    Returns:
+    - list of FederatedHit: Up to `top_k` hits, best first, with the fused score. A hit found
+      by the vector search keeps its distance.
+    """
+    fused, scores = {}, {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = (hit.source, hit.chunk_id)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in fused or (fused[key].distance is None and hit.distance is not None):
+                fused[key] = hit
+    candidates = sorted((hit._replace(score=scores[key]) for key, hit in fused.items()),
+                        key=lambda hit: hit.score, reverse=True)
+    return _select(candidates, sources, top_k, dedupe_threshold)
+
+def _select(candidates, sources, top_k, dedupe_threshold):
+    """
+    Takes the best candidates while respecting per-source quotas and skipping near-duplicates.
+    """
+    quotas = {source.name: source.quota for source in sources}
+    merged, taken, accepted_shingles = [], {}, []
+    for hit in candidates:
+        quota = quotas.get(hit.source)
+        if quota is not None and taken.get(hit.source, 0) >= quota:
+            continue
+        if dedupe_threshold is not None:
+            shingles = _shingles(hit.text)
+            if _is_near_duplicate(shingles, accepted_shingles, dedupe_threshold):
+                continue
+            accepted_shingles.append(shingles)
+        merged.append(hit)
+        taken[hit.source] = taken.get(hit.source, 0) + 1
+        if len(merged) == top_k:
+            break
+    return merged
+
+# Example usage:
+# sources = [SearchSource('intel_vpro', team.vector_index, team.document_chunks, clearance='confidential', team='intel_vpro'),
+#            SearchSource('shared', shared.vector_index, shared.document_chunks, quota=1, clearance='public')]
+# for hit in federated_search(query_embedding, sources, top_k=5):
+#     print(hit.source, hit.chunk_id, round(hit.score, 3), hit.metadata)
+# keyword_hits = [keyword_search_source(source, 'PTHI 0x0B', 10) for source in sources]
+# hybrid_hits = reciprocal_rank_fusion([federated_search(query_embedding, sources, top_k=10)] + keyword_hits, sources, top_k=5)
@@ -1,17 +1,182 @@
-import openai
-from core.vector_store import build_vector_store, load_vector_store, save_vector_store, query_vector_store
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import os
+import threading
+import time
+import numpy as np
+from config.constants import (ANSWER_CACHE_ENABLED, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY_THRESHOLD,
+                              ANSWER_CACHE_TTL_SECONDS, BATCH_MAX_CONCURRENCY, BATCH_SIZE, CONTEXT_CANDIDATES, CONTEXT_TOKEN_BUDGET,
+                              DEFAULT_SECURITY_LEVEL, DEFAULT_TIMEOUT,
+                              HYBRID_SEARCH_ENABLED, KEYWORD_TOP_K, METRICS_PROFILE_DIR, OPENAI_MAX_CONCURRENT_REQUESTS, OPENAI_MAX_CONNECTIONS,
+                              QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS, RRF_K)
+from core.vector_store import (build_vector_store, chunk_store_path_for, exact_vectors_path_for, is_vector_store_current,
+                               keyword_index_path_for, save_vector_store, update_vector_store)
+from core.vector_store_registry import SHARED_STORE_NAME, get_default_registry, resolve_vector_store_path
+from core.chunk_store import ChunkStore
+from core.context_builder import build_context
+from core.embedding_cache import EmbeddingCache
+from core.embeddings import embed_query_async, embed_texts
+from core.federated_search import (SearchSource, federated_search, federated_search_batch, keyword_search_source,
+                                   reciprocal_rank_fusion)
+from core.keyword_index import build_keyword_index, is_exact_identifier
+from core.security_filter import check_security_level
+from core.store_versions import (current_vector_store_path, discard_vector_store_version, new_vector_store_version,
+                                 publish_vector_store_version, vector_store_build_lock)
+from core.index_factory import resolve_index_config
+from core.metrics import LatencyStats, MetricSample, RequestTimer, get_metrics, increment, profile_request, span
+from core.openai_clients import ConcurrencyLimiter, iterate_sync, run_sync
 from core.prompt_utils import load_system_prompt
+from core.providers import create_client, embedder_identity, resolve_providers
+from core.query_cache import LRUCache, SemanticAnswerCache
+from core.text_utils import get_encoding
 
 class GenericAgent:
-    def __init__(self, openai_api_key, prompt_path, knowledge_base=None, config_manager=None, session_manager=None, vector_store_path="vector_store.index"):
+    def __init__(self, openai_api_key, prompt_path, knowledge_base=None, config_manager=None, session_manager=None, vector_store_path=None,
+                 embedding_cache=None, team_name=None, answer_cache=None, client=None, async_client=None, vector_store_registry=None):
         self.openai_api_key = openai_api_key
         self.system_prompt = load_system_prompt(prompt_path)
         self.knowledge_base = knowledge_base
         self.config_manager = config_manager
         self.session_manager = session_manager
-        self.vector_index = None
-        self.document_texts = []
+        # Team stores live under teams/<team>/vector_store/ unless configured otherwise
+        if vector_store_path is None:
+            vector_store_path = resolve_vector_store_path(team_name, config_manager) if team_name else "vector_store.index"
+        os.makedirs(os.path.dirname(vector_store_path) or ".", exist_ok=True)
         self.vector_store_path = vector_store_path
+        # Open stores are shared by every agent in the process and loaded on first query
+        self.vector_store_registry = vector_store_registry if vector_store_registry is not None else get_default_registry(config_manager)
+        # Embeddings are cached by (model, chunk text) so rebuilds only pay for changed chunks
+        self.embedding_cache = embedding_cache if embedding_cache else EmbeddingCache(vector_store_path + "_embeddings.sqlite")
+        # Builds go into a new on-disk version, one at a time, while the current one keeps serving
+        self._update_lock = threading.Lock()
+        self.team_name = team_name
+        self.agent_label = team_name or "default"  # The `agent` label of this agent's metrics
+        self.index_config = resolve_index_config(config_manager, team_name)
+
+        # Other stores (e.g. 'shared', other teams) searched together with this agent's own
+        federated_settings = self._team_setting("federated_search")
+        self.federated_sources = list(federated_settings.get("sources", []) or [])
+        self.federated_quotas = dict(federated_settings.get("quotas", {}) or {})
+        self._source_index_configs = {}
+        # BM25 keyword hits are fused with vector hits; identifier queries skip the embedding entirely
+        hybrid_settings = self._team_setting("hybrid_search")
+        self.hybrid_search = hybrid_settings.get("enabled", HYBRID_SEARCH_ENABLED)
+        self.keyword_top_k = hybrid_settings.get("keyword_top_k", KEYWORD_TOP_K)
+        self.rrf_k = hybrid_settings.get("rrf_k", RRF_K)
+        # Requests without an explicit clearance only see chunks at this level
+        self.default_clearance = check_security_level(
+            self._team_setting("access_control").get("default_clearance", DEFAULT_SECURITY_LEVEL))
+
+        # Embeddings and completions come from the team's providers (OpenAI, local or fake);
+        # clients are shared process-wide unless explicit ones are passed in
+        self.providers = resolve_providers(config_manager, team_name)
+        self.embedding_model = self.providers["embeddings"]["model"]
+        self.chat_model = self.providers["completions"]["model"]
+        self.embedder = embedder_identity(self.providers)
+        openai_settings = self._team_setting("openai")
+        self.openai_timeout = openai_settings.get("timeout", DEFAULT_TIMEOUT)
+        self.openai_max_connections = openai_settings.get("max_connections", OPENAI_MAX_CONNECTIONS)
+        self.client = client
+        self.async_client = async_client
+        self.request_limiter = ConcurrencyLimiter(openai_settings.get("max_concurrent_requests", OPENAI_MAX_CONCURRENT_REQUESTS))
+        # Perceived latency (until the first token is shown) is tracked separately from total latency
+        self.time_to_first_token = LatencyStats()
+        self.total_latency = LatencyStats()
+
+        # Retrieved chunks are packed into a fixed token budget rather than a fixed number of chunks
+        context_settings = self._team_setting("context")
+        self.context_token_budget = context_settings.get("token_budget", CONTEXT_TOKEN_BUDGET)
+        self.context_candidates = context_settings.get("candidates", CONTEXT_CANDIDATES)
+        self.context_tokens = LatencyStats()  # Samples are token counts, not seconds
+
+        # Bulk replays embed and search a batch of queries at once, then fan out the completions
+        batch_settings = self._team_setting("batch")
+        self.batch_size = batch_settings.get("size", BATCH_SIZE)
+        self.batch_max_concurrency = batch_settings.get("max_concurrency", BATCH_MAX_CONCURRENCY)
+
+        # Tier 1: query embeddings, so repeated questions skip the embeddings API
+        query_cache_settings = self._team_setting("query_cache")
+        self.query_embedding_cache = LRUCache(
+            max_entries=query_cache_settings.get("max_entries", QUERY_CACHE_MAX_ENTRIES),
+            ttl_seconds=query_cache_settings.get("ttl_seconds", QUERY_CACHE_TTL_SECONDS),
+        )
+        # Tier 2 (optional): answers, reused for near-identical queries that retrieve the same chunks.
+        # A shared SemanticAnswerCache can be passed in; answers are kept apart per team and prompt.
+        answer_cache_settings = self._team_setting("answer_cache")
+        if answer_cache is None and answer_cache_settings.get("enabled", ANSWER_CACHE_ENABLED):
+            answer_cache = SemanticAnswerCache(
+                similarity_threshold=answer_cache_settings.get("similarity_threshold", ANSWER_CACHE_SIMILARITY_THRESHOLD),
+                max_entries=answer_cache_settings.get("max_entries", ANSWER_CACHE_MAX_ENTRIES),
+                ttl_seconds=answer_cache_settings.get("ttl_seconds", ANSWER_CACHE_TTL_SECONDS),
+            )
+        self.answer_cache = answer_cache
+        prompt_digest = hashlib.sha256(self.system_prompt.encode("utf-8")).hexdigest()[:16]
+        self.cache_namespace = f"{team_name or 'default'}:{prompt_digest}"
+
+        # Stage spans are recorded as requests run; cache and latency figures are read at export time
+        self.profile_dir = self._team_setting("metrics").get("profile_dir", METRICS_PROFILE_DIR)
+        get_metrics().register_collector(self.metric_samples)
+
+    def _team_setting(self, key):
+        if self.config_manager is None:
+            return {}
+        return self.config_manager.get_team_setting(self.team_name, key, {}) or {}
+
+    def _get_client(self):
+        if self.client is not None:
+            return self.client
+        return create_client(self.providers, self.openai_api_key, timeout=self.openai_timeout,
+                             max_connections=self.openai_max_connections)
+
+    def _get_async_client(self):
+        if self.async_client is not None:
+            return self.async_client
+        return create_client(self.providers, self.openai_api_key, timeout=self.openai_timeout,
+                             max_connections=self.openai_max_connections, asynchronous=True)
+
+    def get_vector_store(self):
+        """
+        Returns the agent's vector store from the registry, loading it from disk on first use.
+
+        Returns:
+        - VectorStoreHandle or None: The open store, or None if none has been built yet.
+
+        Raises:
+        - ValueError: If the store was built with a different embedder than the team's.
+        """
+        return self.vector_store_registry.get(self.vector_store_path, self.index_config, self.embedder)
+
+    @property
+    def vector_index(self):
+        handle = self.get_vector_store()
+        return handle.vector_index if handle else None
+
+    @property
+    def document_chunks_path(self):
+        # The chunk store of the version being served
+        return chunk_store_path_for(current_vector_store_path(self.vector_store_path))
+
+    @property
+    def document_texts(self):
+        handle = self.get_vector_store()
+        return handle.document_chunks if handle else []
+
+    @property
+    def index_version(self):
+        handle = self.get_vector_store()
+        return handle.version if handle else None
+
+    def _set_vector_store(self, vector_index, document_texts):
+        """
+        Installs a rebuilt or updated vector store in the registry. Its new version
+        invalidates answers cached against the previous one.
+        """
+        if vector_index is None:
+            self.vector_store_registry.evict(self.vector_store_path)
+        else:
+            self.vector_store_registry.register(self.vector_store_path, vector_index, document_texts, self.index_config)
 
     def initialize_vector_store(self, documents, force_rebuild=False):
         """
@@ -21,57 +186,679 @@ class GenericAgent:
         - documents (list of str): List of document texts to use if building the vector store.
         - force_rebuild (bool): Whether to force a rebuild even if a stored vector exists.
         """
-        document_chunks_path = self.vector_store_path + "_chunks.pkl"  # Path to save/load document chunks
-
         # Attempt to load existing vector store and document chunks if not forcing rebuild
-        if not force_rebuild:
-            self.vector_index, self.document_texts = load_vector_store(self.vector_store_path, document_chunks_path)
-            if self.vector_index and self.document_texts:
-                print("Using existing vector store and document chunks.")
-                return  # Exit if successfully loaded
+        if not force_rebuild and self.get_vector_store() is not None:
+            print("Using existing vector store and document chunks.")
+            return  # Exit if successfully loaded
         
-        # Build and save vector store if not loaded or if rebuilding
+        # Build and save vector store if not loaded or if rebuilding; the store being served
+        # stays in place until the new version is complete
         print("Building a new vector store...")
-        self.vector_index, self.document_texts = build_vector_store(documents, self.openai_api_key)
-        save_vector_store(self.vector_index, self.vector_store_path, document_chunks_path, self.document_texts)
+        with self._update_lock, vector_store_build_lock(self.vector_store_path):
+            version_path = new_vector_store_version(self.vector_store_path)
+            try:
+                vector_index, document_texts = build_vector_store(documents, self.openai_api_key, model=self.embedding_model,
+                                                                  client=self._get_client(), cache=self.embedding_cache,
+                                                                  index_config=self.index_config,
+                                                                  exact_vectors_path=exact_vectors_path_for(version_path))
+                save_vector_store(vector_index, version_path, chunk_store_path_for(version_path), document_texts,
+                                  embedder=self.embedder)
+                build_keyword_index(keyword_index_path_for(version_path), document_texts)
+            except BaseException:
+                discard_vector_store_version(version_path)
+                raise
+            publish_vector_store_version(self.vector_store_path, version_path)
+            # Serve from the memory-mapped store rather than the in-memory list
+            self._set_vector_store(vector_index, ChunkStore(chunk_store_path_for(version_path)))
+        print(f"Embedding cache: {self.embedding_cache.stats()}")
 
-    def query_vector_store(self, query, top_k=3):
-        if not self.vector_index:
-            return "Vector store not initialized. Please build or load the vector store."
-        return query_vector_store(query, self.vector_index, self.document_texts, self.openai_api_key, top_k=top_k)
+    def update_vector_store(self, folder_path, force_rebuild=False):
+        """
+        Incrementally updates the vector store from a folder of PDFs.
 
-    def handle_request(self, query):
-        if self.vector_index is None:
-            return "The vector store is not initialized. Please build the vector store first."
+        Only added or changed files are extracted and embedded, and the vectors of
+        deleted files are removed, so unchanged documents cost nothing. When nothing changed
+        the store is not even opened here; it is memory-mapped on first use (or by `prewarm`).
 
-        full_query = f"{self.system_prompt}\n\nUser Query: {query}"
-        results = self.query_vector_store(full_query, top_k=2)
-        
-        if not results:
-            return "No relevant information found for your query."
+        The update is written to a new on-disk version, started from hard links to the current
+        one, and swapped in once complete (see core/store_versions.py). Queries keep being
+        answered from the current version meanwhile, so this can run on a background thread.
+
+        Parameters:
+        - folder_path (str): Folder containing the source PDF files.
+        - force_rebuild (bool): Whether to discard the existing store and rebuild from every file.
+
+        Returns:
+        - bool: Whether a new version of the store was swapped in.
+        """
+        with self._update_lock:
+            current_path = current_vector_store_path(self.vector_store_path)
+            if not force_rebuild and is_vector_store_current(folder_path, current_path, chunk_store_path_for(current_path),
+                                                             self.index_config, self.embedder):
+                print("Vector store is up to date.")
+                return False
+            with vector_store_build_lock(self.vector_store_path):
+                # Another process may have published a version while this one waited for the lock
+                current_path = current_vector_store_path(self.vector_store_path)
+                version_path = new_vector_store_version(self.vector_store_path,
+                                                        seed_path=None if force_rebuild else current_path)
+                try:
+                    vector_index, document_texts, _ = update_vector_store(
+                        folder_path, version_path, chunk_store_path_for(version_path), self.openai_api_key,
+                        model=self.embedding_model, client=self._get_client(), cache=self.embedding_cache,
+                        force_rebuild=force_rebuild, index_config=self.index_config, team_name=self.team_name,
+                        embedder=self.embedder
+                    )
+                except BaseException:
+                    discard_vector_store_version(version_path)
+                    raise
+                if vector_index is None:
+                    discard_vector_store_version(version_path)
+                else:
+                    publish_vector_store_version(self.vector_store_path, version_path)
+            self._set_vector_store(vector_index, document_texts)
+            return vector_index is not None
+
+    def prewarm(self, background=True):
+        """
+        Loads what the first query needs: the vector store and keyword index, the tokenizers
+        and the embedding and chat clients (importing openai if a provider uses it).
+
+        Parameters:
+        - background (bool): Whether to prewarm on a daemon thread and return at once. A query
+                             arriving first just shares the store load already under way.
+
+        Returns:
+        - threading.Thread or None: The prewarming thread, or None when run in the foreground.
+        """
+        if not background:
+            self._prewarm()
+            return None
+        thread = threading.Thread(target=self._prewarm, name=f"prewarm-{self.agent_label}", daemon=True)
+        thread.start()
+        return thread
+
+    def _prewarm(self):
+        try:
+            self.get_vector_store()
+            get_encoding(self.chat_model)  # Context packing and conversation history
+            if self.providers["embeddings"]["type"] == "openai":
+                get_encoding(self.embedding_model)  # Embedding request batching
+            self._get_client()
+            run_sync(self._prewarm_async())
+        except Exception as e:
+            # Whatever failed here fails again, and is reported, on the first query
+            print(f"Error prewarming the {self.agent_label} agent: {e}")
+
+    async def _prewarm_async(self):
+        self._get_async_client()  # Async clients belong to the background event loop
+
+    async def embed_query_async(self, query):
+        """
+        Embeds a query, serving repeated queries from the in-memory query cache.
+
+        Parameters:
+        - query (str): The query text.
+
+        Returns:
+        - np.ndarray: The query embedding, shape (1, dimension).
+        """
+        key = (self.embedding_model, query)
+        query_embedding = self.query_embedding_cache.get(key)
+        if query_embedding is None:
+            query_embedding = await embed_query_async(query, self._get_async_client(), model=self.embedding_model,
+                                                      cache=self.embedding_cache)
+            self.query_embedding_cache.put(key, query_embedding)
+        return query_embedding
+
+    def embed_query(self, query):
+        return run_sync(self.embed_query_async(query))
 
-        combined_results = "\n\n".join(results[:3])
-        prompt_with_results = f"{self.system_prompt}\n\nUser Query: {query}\n\nRelevant Information for troubleshooting:\n{combined_results}"
+    async def embed_queries_async(self, queries):
+        """
+        Embeds many queries with batched requests, serving repeated queries from the query cache.
+
+        Parameters:
+        - queries (list of str): The query texts.
+
+        Returns:
+        - np.ndarray: The query embeddings, shape (len(queries), dimension).
+        """
+        embeddings = [self.query_embedding_cache.get((self.embedding_model, query)) for query in queries]
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if missing:
+            new_embeddings = await asyncio.to_thread(embed_texts, missing, self._get_client(), model=self.embedding_model,
+                                                     show_progress=False, cache=self.embedding_cache)
+            for query, embedding in zip(missing, new_embeddings):
+                self.query_embedding_cache.put((self.embedding_model, query), embedding.reshape(1, -1))
+            embeddings = [self.query_embedding_cache.get((self.embedding_model, query)) if embedding is None else embedding
+                          for query, embedding in zip(queries, embeddings)]
+        return np.vstack(embeddings)
 
+    def remember_query_embedding(self, query, query_embedding):
+        """
+        Seeds the query cache with an embedding computed elsewhere (e.g. by the intent router),
+        so the query isn't embedded twice. The embedding must come from this agent's embedding model.
+        """
+        self.query_embedding_cache.put((self.embedding_model, query), query_embedding)
+
+    def query_vector_store(self, query, top_k=3, clearance=None):
+        if self.get_vector_store() is None:
+            return "Vector store not initialized. Please build or load the vector store."
+        return [hit.text for hit in self.federated_query(query, top_k=top_k, clearance=clearance)]
+
+    @contextlib.contextmanager
+    def _search_sources(self, clearance):
+        """
+        Collects this agent's store and its open federated stores, holding each handle for the request.
+
+        The user's clearance applies to this team's store and the shared store; other
+        teams' stores only ever return their public chunks. The handles are acquired from the
+        registry and released on exit, so a version swapped in mid-request is only used by
+        later requests and the one being read stays on disk until the request is done.
+
+        Yields:
+        - (list of SearchSource, tuple): The sources, and their combined version; ([], None)
+          if this agent's own store does not exist yet.
+        """
+        handles = []
         try:
-            # Using the updated OpenAI API client syntax
-            client = openai.OpenAI(api_key=self.openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": prompt_with_results}
-                ],
+            yield self._acquire_sources(clearance, handles)
+        finally:
+            for handle in handles:
+                self.vector_store_registry.release(handle)
+
+    def _acquire_sources(self, clearance, handles):
+        handle = self.vector_store_registry.acquire(self.vector_store_path, self.index_config, self.embedder)
+        if handle is None:
+            return [], None
+        handles.append(handle)
+        own_name = self.team_name or "default"
+        sources = [SearchSource(own_name, handle.vector_index, handle.document_chunks, self.federated_quotas.get(own_name),
+                                clearance, self.team_name, handle.keyword_index, handle.exact_vectors)]
+        versions = [(own_name, handle.version)]
+        for source_name in self.federated_sources:
+            if source_name not in self._source_index_configs:
+                self._source_index_configs[source_name] = resolve_index_config(self.config_manager, source_name)
+            try:
+                source_handle = self.vector_store_registry.acquire(resolve_vector_store_path(source_name, self.config_manager),
+                                                                   self._source_index_configs[source_name], self.embedder)
+            except ValueError as e:
+                # Another team's store embedded differently can't be searched with this query's vectors
+                print(f"Skipping federated source '{source_name}': {e}")
+                continue
+            if source_handle is None:
+                continue
+            handles.append(source_handle)
+            source_clearance = clearance if source_name == SHARED_STORE_NAME else DEFAULT_SECURITY_LEVEL
+            sources.append(SearchSource(source_name, source_handle.vector_index, source_handle.document_chunks,
+                                        self.federated_quotas.get(source_name), source_clearance, self.team_name,
+                                        source_handle.keyword_index, source_handle.exact_vectors))
+            versions.append((source_name, source_handle.version))
+        return sources, tuple(versions)
+
+    async def _retrieve(self, query, top_k, clearance):
+        """
+        Retrieves the best chunks for a query from this agent's store and its federated stores.
+
+        With hybrid search on, each store's BM25 ranking is fused with the vector ranking by
+        reciprocal rank. A query that is a single identifier (an error code, a part number)
+        is answered from the keyword indexes alone when they find it, without embedding it.
+
+        Parameters:
+        - query (str): The user's query.
+        - top_k (int): Number of results to return.
+        - clearance (str, optional): The user's security level.
+
+        Returns:
+        - (list of FederatedHit, tuple, np.ndarray): The hits, the stores' combined version, and the
+          query embedding (None if the query was never embedded); (None, None, None) if this agent's
+          store does not exist yet.
+        """
+        with self._search_sources(check_security_level(clearance or self.default_clearance)) as (sources, version):
+            if not sources:
+                return None, None, None
+
+            keyword_rankings = []
+            if self.hybrid_search:
+                with span("keyword_search", agent=self.agent_label):
+                    keyword_rankings = [keyword_search_source(source, query, self.keyword_top_k) for source in sources]
+                if is_exact_identifier(query) and any(keyword_rankings):
+                    return reciprocal_rank_fusion(keyword_rankings, sources, top_k, k=self.rrf_k), version, None
+
+            with span("embedding", agent=self.agent_label):
+                query_embedding = await self.embed_query_async(query)
+            if not any(keyword_rankings):
+                with span("vector_search", agent=self.agent_label):
+                    hits = await asyncio.to_thread(federated_search, query_embedding, sources, top_k)
+                return hits, version, query_embedding
+            with span("vector_search", agent=self.agent_label):
+                vector_ranking = await asyncio.to_thread(federated_search, query_embedding, sources,
+                                                         max(top_k, self.keyword_top_k))
+            hits = reciprocal_rank_fusion([vector_ranking] + keyword_rankings, sources, top_k, k=self.rrf_k)
+            return hits, version, query_embedding
+
+    async def _retrieve_batch(self, queries, top_k, clearance):
+        """
+        Retrieves the best chunks for many queries like `_retrieve`, but embeds them with batched
+        requests and searches each store once with the whole query matrix.
+
+        Returns:
+        - (list, tuple, dict): Each query's (hits, query embedding or None), the stores' combined
+          version, and the seconds spent embedding and searching; (None, None, timings) if this
+          agent's store does not exist yet.
+        """
+        timings = {"embedding": 0.0, "search": 0.0}
+        with self._search_sources(check_security_level(clearance or self.default_clearance)) as (sources, version):
+            if not sources:
+                return None, None, timings
+
+            start = time.perf_counter()
+            keyword_rankings = [[] for _ in queries]
+            if self.hybrid_search:
+                keyword_rankings = await asyncio.to_thread(
+                    lambda: [[keyword_search_source(source, query, self.keyword_top_k) for source in sources] for query in queries])
+            results = [None] * len(queries)
+            to_embed = []
+            for i, query in enumerate(queries):
+                if is_exact_identifier(query) and any(keyword_rankings[i]):
+                    results[i] = (reciprocal_rank_fusion(keyword_rankings[i], sources, top_k, k=self.rrf_k), None)
+                else:
+                    to_embed.append(i)
+            timings["search"] += time.perf_counter() - start
+            if not to_embed:
+                return results, version, timings
+
+            start = time.perf_counter()
+            query_embeddings = await self.embed_queries_async([queries[i] for i in to_embed])
+            timings["embedding"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            depth = max(top_k, self.keyword_top_k) if self.hybrid_search else top_k
+            vector_rankings = await asyncio.to_thread(federated_search_batch, query_embeddings, sources, depth)
+            for row, i in enumerate(to_embed):
+                if any(keyword_rankings[i]):
+                    hits = reciprocal_rank_fusion([vector_rankings[row]] + keyword_rankings[i], sources, top_k, k=self.rrf_k)
+                else:
+                    hits = vector_rankings[row][:top_k]
+                results[i] = (hits, query_embeddings[row:row + 1])
+            timings["search"] += time.perf_counter() - start
+            return results, version, timings
+
+    async def federated_query_async(self, query, top_k=3, clearance=None):
+        """
+        Searches this agent's store and its federated stores (the team's `federated_search.sources`).
+
+        The query is embedded once and every store is searched in parallel; keyword hits are
+        fused in when hybrid search is enabled.
+
+        Parameters:
+        - query (str): The query text.
+        - top_k (int): Number of merged results to return.
+        - clearance (str, optional): The user's security level; defaults to the agent's default clearance.
+
+        Returns:
+        - list of FederatedHit: Hits with their source store, chunk ID, text, distance,
+          score and chunk metadata, best first.
+        """
+        hits, _, _ = await self._retrieve(query, top_k, clearance)
+        return hits or []
+
+    def federated_query(self, query, top_k=3, clearance=None):
+        return run_sync(self.federated_query_async(query, top_k, clearance))
+
+    def cache_stats(self):
+        """
+        Returns hit rates for the embedding, query and answer caches.
+
+        Returns:
+        - dict: Stats per cache tier; 'answers' is None when the answer cache is disabled.
+        """
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "queries": self.query_embedding_cache.stats(),
+            "answers": self.answer_cache.stats() if self.answer_cache else None,
+        }
+
+    def latency_stats(self):
+        """
+        Returns request latency summaries.
+
+        Returns:
+        - dict: 'time_to_first_token' (perceived latency) and 'total' summaries, in seconds.
+        """
+        return {"time_to_first_token": self.time_to_first_token.summary(), "total": self.total_latency.summary()}
+
+    def metric_samples(self):
+        """
+        Returns this agent's cache, latency and context figures for the metrics registry.
+
+        Returns:
+        - list of MetricSample: Cache hit rates and sizes, request latency summaries and the
+          context tokens per request.
+        """
+        labels = {"agent": self.agent_label}
+        samples = []
+        for cache_name, stats in self.cache_stats().items():
+            if stats is None:
+                continue
+            cache_labels = dict(labels, cache=cache_name)
+            samples += [MetricSample("cache_hit_rate", "gauge", cache_labels, stats["hit_rate"], "Cache hit rate"),
+                        MetricSample("cache_hits", "counter", cache_labels, stats["hits"], "Cache hits"),
+                        MetricSample("cache_misses", "counter", cache_labels, stats["misses"], "Cache misses"),
+                        MetricSample("cache_entries", "gauge", cache_labels, stats["entries"], "Cached entries")]
+        for measure, stats in self.latency_stats().items():
+            samples.append(MetricSample("request_seconds", "summary", dict(labels, measure=measure), stats,
+                                        "Request latency"))
+        samples.append(MetricSample("context_tokens", "summary", labels, self.context_tokens.summary(),
+                                    "Context tokens packed into each prompt"))
+        return samples
+
+    def context_stats(self):
+        """
+        Returns a summary of the context tokens packed into each prompt.
+
+        Returns:
+        - dict: The token budget and the 'count', 'mean', percentiles and 'max' of tokens used.
+        """
+        return dict(self.context_tokens.summary(), token_budget=self.context_token_budget)
+
+    async def _prepare_request(self, query, clearance, session_id=None):
+        """
+        Retrieves context for a query and, with a session, the conversation so far.
+
+        Returns:
+        - (str, None) when the request is already answered (not initialized, nothing found, or
+          an answer-cache hit), otherwise (None, dict) with the completion messages and cache keys.
+        """
+        if self.get_vector_store() is None:
+            return "The vector store is not initialized. Please build the vector store first.", None
+
+        # Only the user's query is embedded; the system prompt would pull every query toward the same point.
+        # Handles are fetched once per request, so each index, its chunks and the version belong together.
+        hits, index_version, query_embedding = await self._retrieve(query, self.context_candidates, clearance)
+
+        history = []
+        if hits and self.session_manager is not None and session_id is not None:
+            with span("session_history", agent=self.agent_label):
+                history = await asyncio.to_thread(self.session_manager.history_messages, session_id)
+        answer, request, _ = self._compose_request(query, hits, index_version, query_embedding, clearance, history)
+        return answer, request
+
+    def _compose_request(self, query, hits, index_version, query_embedding, clearance, history=()):
+        """
+        Packs retrieved hits into the completion messages, unless the answer cache already has the answer.
+
+        Returns:
+        - As for `_prepare_request`, plus the (source, chunk_id) pairs the answer is based on,
+          so answer-cache hits can cite their sources too.
+        """
+        if not hits:
+            return "No relevant information found for your query.", None, []
+
+        with span("prompt_assembly", agent=self.agent_label):
+            return self._assemble_prompt(query, hits, index_version, query_embedding, clearance, history)
+
+    def _assemble_prompt(self, query, hits, index_version, query_embedding, clearance, history):
+        context = build_context(hits, self.context_token_budget, model=self.chat_model)
+        self.context_tokens.record(context.tokens_used)
+        increment("tokens", context.tokens_used, help="Tokens by kind", agent=self.agent_label, kind="context")
+        chunk_ids = [(hit.source, hit.chunk_id) for hit in context.hits]
+        # Answers are kept apart per clearance, on top of the retrieved-chunks check
+        cache_namespace = f"{self.cache_namespace}:{clearance or self.default_clearance}"
+        history = list(history)
+        # Identifier queries answered by keyword search alone have no embedding to match answers on,
+        # and answers that depend on earlier turns can't be reused for other conversations
+        if self.answer_cache is not None and query_embedding is not None and not history:
+            cached_answer = self.answer_cache.lookup(cache_namespace, index_version, query_embedding, chunk_ids)
+            if cached_answer is not None:
+                return cached_answer, None, chunk_ids
+
+        # The system prompt is sent once, as the system message
+        prompt_with_results = f"User Query: {query}\n\nRelevant Information for troubleshooting:\n{context.text}"
+        messages = [{"role": "system", "content": self.system_prompt}] + history + [
+            {"role": "user", "content": prompt_with_results}
+        ]
+        return None, {"messages": messages, "query_embedding": None if history else query_embedding, "chunk_ids": chunk_ids,
+                      "index_version": index_version, "cache_namespace": cache_namespace,
+                      "context_tokens": context.tokens_used}, chunk_ids
+
+    async def _complete(self, request):
+        """
+        Generates the answer to a prepared request and stores it in the answer cache.
+
+        Returns:
+        - str: The response text.
+        """
+        with span("completion", agent=self.agent_label):
+            response = await self._get_async_client().chat.completions.create(
+                model=self.chat_model,
+                messages=request["messages"],
                 max_tokens=150,
                 temperature=0.7
             )
-            
-            # Extract and return the response text
-            response_text = response.choices[0].message.content.strip()
-            return response_text
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            increment("tokens", usage.prompt_tokens, help="Tokens by kind", agent=self.agent_label, kind="prompt")
+            increment("tokens", usage.completion_tokens, help="Tokens by kind", agent=self.agent_label, kind="completion")
 
-        except Exception as e:
-            print(f"Error generating response with OpenAI API: {e}")
-            return "I'm sorry, but I encountered an issue processing your request."
+        # Extract and return the response text
+        response_text = response.choices[0].message.content.strip()
+        self._remember_answer(request, response_text)
+        return response_text
+
+    def _remember_answer(self, request, response_text):
+        if self.answer_cache is not None and request["query_embedding"] is not None:
+            self.answer_cache.store(request["cache_namespace"], request["index_version"], request["query_embedding"],
+                                    request["chunk_ids"], response_text)
+
+    async def _remember_exchange(self, session_id, query, response_text):
+        """
+        Adds a question and its answer to the session's conversation history.
+        """
+        if self.session_manager is not None and session_id is not None:
+            await asyncio.to_thread(self.session_manager.add_turns, session_id,
+                                    [("user", query), ("assistant", response_text)], self.chat_model)
+
+    async def handle_request_async(self, query, clearance=None, session_id=None, profile=None):
+        """
+        Answers a query from the vector store without blocking the event loop.
+
+        OpenAI calls go through the shared async client, FAISS searches run in a worker
+        thread, and at most `max_concurrent_requests` requests are processed at once.
+
+        Parameters:
+        - query (str): The user's query.
+        - clearance (str, optional): The user's security level; chunks above it are never retrieved.
+                                     Defaults to the team's `access_control.default_clearance`.
+        - session_id (str, optional): The conversation the query belongs to; its earlier turns are
+                                      sent with the query and the exchange is added to it.
+        - profile (str, optional): 'cprofile' or 'tracemalloc' to write a profile of this request
+                                   (see core/metrics.py); None, the default, adds no overhead.
+
+        Returns:
+        - str: The response text.
+        """
+        async with self.request_limiter.slot():
+            timer = RequestTimer(self.time_to_first_token, self.total_latency)
+            try:
+                with profile_request(profile, label=f"{self.agent_label}-query", profile_dir=self.profile_dir):
+                    answer, request = await self._prepare_request(query, clearance, session_id)
+                    if request is None:
+                        await self._remember_exchange(session_id, query, answer)
+                        return answer
+
+                    try:
+                        response_text = await self._complete(request)
+                        await self._remember_exchange(session_id, query, response_text)
+                        return response_text
+
+                    except Exception as e:
+                        print(f"Error generating response with OpenAI API: {e}")
+                        return "I'm sorry, but I encountered an issue processing your request."
+            finally:
+                timer.finish()
+
+    def handle_request(self, query, clearance=None, session_id=None, profile=None):
+        return run_sync(self.handle_request_async(query, clearance, session_id, profile))
+
+    async def stream_request_async(self, query, clearance=None, session_id=None):
+        """
+        Answers a query like `handle_request_async`, but yields the response as it is generated.
+
+        Parameters:
+        - query (str): The user's query.
+        - clearance (str, optional): The user's security level.
+        - session_id (str, optional): The conversation the query belongs to.
+
+        Yields:
+        - str: Pieces of the response text, in order.
+        """
+        async with self.request_limiter.slot():
+            timer = RequestTimer(self.time_to_first_token, self.total_latency)
+            try:
+                answer, request = await self._prepare_request(query, clearance, session_id)
+                if request is None:
+                    timer.first_token()
+                    yield answer
+                    await self._remember_exchange(session_id, query, answer)
+                    return
+
+                parts = []
+                completion_start = time.perf_counter()
+                try:
+                    stream = await self._get_async_client().chat.completions.create(
+                        model=self.chat_model,
+                        messages=request["messages"],
+                        max_tokens=150,
+                        temperature=0.7,
+                        stream=True
+                    )
+                    async for chunk in stream:
+                        token = chunk.choices[0].delta.content if chunk.choices else None
+                        if not parts and token:
+                            token = token.lstrip()  # Match the stripped non-streaming response
+                        if token:
+                            timer.first_token()
+                            parts.append(token)
+                            yield token
+                except Exception as e:
+                    print(f"Error generating response with OpenAI API: {e}")
+                    if not parts:
+                        timer.first_token()
+                        yield "I'm sorry, but I encountered an issue processing your request."
+                    return
+
+                get_metrics().record_span("completion", time.perf_counter() - completion_start, agent=self.agent_label)
+                response_text = "".join(parts).strip()
+                self._remember_answer(request, response_text)
+                await self._remember_exchange(session_id, query, response_text)
+            finally:
+                timer.finish()
+
+    def stream_request(self, query, clearance=None, session_id=None):
+        """
+        Synchronous generator version of `stream_request_async`.
+
+        Parameters:
+        - query (str): The user's query.
+        - clearance (str, optional): The user's security level.
+        - session_id (str, optional): The conversation the query belongs to.
+
+        Yields:
+        - str: Pieces of the response text, in order.
+        """
+        return iterate_sync(self.stream_request_async(query, clearance, session_id))
+
+    async def handle_batch_async(self, queries, clearance=None, batch_size=None, max_concurrency=None):
+        """
+        Answers many queries, e.g. a replay of historical tickets.
+
+        Queries are retrieved a batch at a time, with batched embedding requests and one
+        matrix search per store. Their completions then run with bounded concurrency while
+        the next batch is retrieved, and each result is yielded as soon as it is ready, so
+        it can be written out (e.g. as a JSONL line) while the replay continues.
+
+        Parameters:
+        - queries (iterable of str): The queries; may be a generator.
+        - clearance (str, optional): The security level every query is answered at.
+        - batch_size (int, optional): Queries retrieved together; defaults to the team's `batch.size`.
+        - max_concurrency (int, optional): Completions in flight at once; defaults to `batch.max_concurrency`.
+
+        Yields:
+        - dict: Per query, in completion order: 'index' (position in `queries`), 'query', 'response',
+          'error' (None on success), 'sources' ([store, chunk ID] pairs packed into the prompt) and
+          'timings' in seconds: 'embedding' and 'search' (the batch's time divided by its size),
+          'completion', and 'total' since its batch started.
+        """
+        batch_size = batch_size or self.batch_size
+        semaphore = asyncio.Semaphore(max_concurrency or self.batch_max_concurrency)
+        queries = iter(queries)
+        pending, offset = set(), 0
+        try:
+            while True:
+                batch = list(itertools.islice(queries, batch_size))
+                if batch:
+                    pending.update(await self._start_batch(batch, offset, clearance, semaphore))
+                    offset += len(batch)
+                for task in [task for task in pending if task.done()]:
+                    pending.discard(task)
+                    yield task.result()
+                # At most one retrieved batch waits for completions, so memory stays bounded
+                while pending and (not batch or len(pending) > batch_size):
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+                if not batch:
+                    return
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def handle_batch(self, queries, clearance=None, batch_size=None, max_concurrency=None):
+        """
+        Synchronous generator version of `handle_batch_async`.
+        """
+        return iterate_sync(self.handle_batch_async(queries, clearance, batch_size, max_concurrency))
+
+    async def _start_batch(self, batch, offset, clearance, semaphore):
+        """
+        Retrieves context for a batch of queries and starts a task answering each one.
+
+        Returns:
+        - list of asyncio.Task: Tasks returning the result dicts of `handle_batch_async`.
+        """
+        batch_start = time.perf_counter()
+        retrieved, index_version, timings = None, None, {"embedding": 0.0, "search": 0.0}
+        if self.get_vector_store() is not None:
+            retrieved, index_version, timings = await self._retrieve_batch(batch, self.context_candidates, clearance)
+        per_query = {stage: seconds / len(batch) for stage, seconds in timings.items()}
 
+        tasks = []
+        for i, query in enumerate(batch):
+            if retrieved is None:
+                answer, request, chunk_ids = "The vector store is not initialized. Please build the vector store first.", None, []
+            else:
+                hits, query_embedding = retrieved[i]
+                answer, request, chunk_ids = self._compose_request(query, hits, index_version, query_embedding, clearance)
+            tasks.append(asyncio.create_task(
+                self._answer_batch_query(offset + i, query, answer, request, chunk_ids, semaphore, batch_start, per_query)))
+        return tasks
 
+    async def _answer_batch_query(self, index, query, answer, request, chunk_ids, semaphore, batch_start, timings):
+        # Cached answers cite the chunks they were matched on, like fresh ones
+        result = {"index": index, "query": query, "response": answer, "error": None,
+                  "sources": [[source, int(chunk_id)] for source, chunk_id in chunk_ids],
+                  "timings": dict(timings, completion=0.0)}
+        if request is not None:
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    result["response"] = await self._complete(request)
+                except Exception as e:
+                    print(f"Error generating response with OpenAI API: {e}")
+                    result["response"] = "I'm sorry, but I encountered an issue processing your request."
+                    result["error"] = str(e)
+                result["timings"]["completion"] = time.perf_counter() - start
+        result["timings"]["total"] = time.perf_counter() - batch_start
+        return result
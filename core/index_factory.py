@@ -0,0 +1,308 @@
+# core/index_factory.py
+
+# Builds FAISS indexes from a configuration so teams can trade exactness for query speed.
+# Supported types:
+#   flat      - exact brute-force search (the default)
+#   ivf_flat  - inverted lists over k-means cells; `nprobe` cells are scanned per query
+#   ivf_pq    - inverted lists with product-quantized vectors, for very large corpora
+#   hnsw      - graph-based search; `ef_search` controls the speed/recall trade-off
+# Metrics are `l2` or `cosine` (inner product over L2-normalized vectors).
+#
+# `storage` sets how flat, ivf_flat and hnsw indexes hold vectors in memory:
+#   float32   - exact vectors, about 4 bytes per dimension (the default)
+#   fp16      - half precision, 2x smaller, near-exact distances
+#   sq8       - 8-bit scalar quantization, 4x smaller
+#   pq        - product quantization with `pq_m` codes of `pq_nbits` bits, 16x+ smaller
+# Compressed indexes (any storage but float32, and ivf_pq) keep the exact vectors in a
+# memory-mapped side file (see core/exact_vectors.py); searches fetch `rerank_factor`
+# times as many candidates and re-score them exactly, bounding the recall loss.
+#
+# `chunk_max_tokens` and `chunk_overlap_tokens` size the chunks documents are split into
+# before embedding. They are build-time settings like the index type, so changing them
+# rebuilds the store.
+
+import math
+
+import faiss
+import numpy as np
+
+from config.constants import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+DEFAULT_INDEX_CONFIG = {
+    "type": "flat",
+    "metric": "l2",
+    "nlist": 1024,            # IVF: number of k-means cells
+    "nprobe": 16,             # IVF: cells scanned per query
+    "pq_m": 64,               # IVF-PQ: sub-quantizers (must divide the embedding dimension)
+    "pq_nbits": 8,            # IVF-PQ: bits per sub-quantizer code
+    "hnsw_m": 32,             # HNSW: neighbors per graph node
+    "ef_construction": 200,   # HNSW: build-time search depth
+    "ef_search": 64,          # HNSW: query-time search depth
+    "train_points_per_list": 40,  # IVF: training vectors gathered per cell before training
+    "storage": "float32",     # float32, fp16, sq8 or pq
+    "rerank_factor": 4,       # Compressed storage: candidates re-scored per result; 0 disables reranking
+    "chunk_max_tokens": CHUNK_MAX_TOKENS,          # Largest chunk documents are split into
+    "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,  # Tokens shared by consecutive chunks
+}
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+METRICS = ("l2", "cosine")
+STORAGE_TYPES = ("float32", "fp16", "sq8", "pq")
+
+_SCALAR_QUANTIZER_TYPES = {"fp16": "QT_fp16", "sq8": "QT_8bit"}
+
+def resolve_index_config(config_manager=None, team_name=None, overrides=None):
+    """
+    Resolves the vector index settings for a team.
+
+    Settings come from the defaults, then the global `vector_index` section of the
+    configuration, then the team's `vector_index` section, then explicit overrides.
+
+    Parameters:
+    - config_manager (ConfigManager, optional): Source of global and team settings.
+    - team_name (str, optional): Team whose settings should be applied.
+    - overrides (dict, optional): Settings that take precedence over the configuration.
+
+    Returns:
+    - dict: The complete index configuration.
+    """
+    index_config = dict(DEFAULT_INDEX_CONFIG)
+    if config_manager is not None:
+        index_config.update(config_manager.get_global_setting("vector_index", {}) or {})
+        if team_name:
+            index_config.update(config_manager.get_team_config(team_name).get("vector_index", {}) or {})
+    if overrides:
+        index_config.update(overrides)
+
+    if index_config["type"] not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{index_config['type']}'. Expected one of {INDEX_TYPES}.")
+    if index_config["metric"] not in METRICS:
+        raise ValueError(f"Unknown vector index metric '{index_config['metric']}'. Expected one of {METRICS}.")
+    if index_config["storage"] not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage '{index_config['storage']}'. Expected one of {STORAGE_TYPES}.")
+    if index_config["type"] == "ivf_pq" and index_config["storage"] not in ("float32", "pq"):
+        raise ValueError("ivf_pq indexes already store product-quantized vectors; use storage 'pq' or 'float32'.")
+    if index_config["chunk_max_tokens"] < 1:
+        raise ValueError("chunk_max_tokens must be at least 1.")
+    if not 0 <= index_config["chunk_overlap_tokens"] < index_config["chunk_max_tokens"] / 2:
+        raise ValueError("chunk_overlap_tokens must be non-negative and less than half of chunk_max_tokens.")
+    return index_config
+
+def index_signature(index_config):
+    """
+    Returns the build-time settings of a configuration; an index must be rebuilt when these change.
+    Query-time settings (nprobe, ef_search) can change freely.
+    """
+    keys = ("type", "metric", "nlist", "pq_m", "pq_nbits", "hnsw_m", "ef_construction")
+    signature = {key: index_config[key] for key in keys}
+    # Left out for float32, so indexes built before storage was configurable stay valid
+    if index_config.get("storage", "float32") != "float32":
+        signature["storage"] = index_config["storage"]
+    # Likewise left out at the chunk sizes every earlier store was built with
+    for key, default in (("chunk_max_tokens", 1000), ("chunk_overlap_tokens", 0)):
+        if index_config.get(key, default) != default:
+            signature[key] = index_config[key]
+    return signature
+
+def vector_storage(index_config):
+    """
+    Returns how an index of this configuration stores vectors: 'float32', 'fp16', 'sq8' or 'pq'.
+    """
+    return "pq" if index_config["type"] == "ivf_pq" else index_config.get("storage", "float32")
+
+def keeps_exact_vectors(index_config):
+    """
+    Returns whether an index of this configuration is compressed, so its exact vectors are kept for reranking.
+    """
+    return vector_storage(index_config) != "float32"
+
+def training_size(index_config):
+    """
+    Returns how many vectors an index of this configuration wants before training (0 if none).
+    """
+    size = 0
+    if index_config["type"] in ("ivf_flat", "ivf_pq"):
+        size = index_config["nlist"] * index_config["train_points_per_list"]
+    storage = vector_storage(index_config)
+    if storage == "pq":
+        # Each PQ codebook also needs several points per code
+        size = max(size, (1 << index_config["pq_nbits"]) * index_config["train_points_per_list"])
+    elif storage == "sq8":
+        # Per-dimension ranges for 256 levels; a sample of the same size is plenty
+        size = max(size, 256 * index_config["train_points_per_list"])
+    return size
+
+def create_index(dimension, index_config, training_count=None):
+    """
+    Creates an empty FAISS index from a configuration.
+
+    Parameters:
+    - dimension (int): Embedding dimension.
+    - index_config (dict): A configuration from `resolve_index_config`.
+    - training_count (int, optional): Number of vectors available for training; IVF indexes
+                                      reduce their cell count when there are too few.
+
+    Returns:
+    - faiss.Index: The new index, untrained for IVF types.
+    """
+    metric = faiss.METRIC_INNER_PRODUCT if index_config["metric"] == "cosine" else faiss.METRIC_L2
+    index_type = index_config["type"]
+    storage = vector_storage(index_config)
+    pq_nbits = index_config["pq_nbits"]
+    if storage == "pq" and training_count is not None:
+        # A codebook can't have more codes than training points
+        pq_nbits = max(1, min(pq_nbits, int(math.log2(max(training_count, 2)))))
+    scalar_type = getattr(faiss.ScalarQuantizer, _SCALAR_QUANTIZER_TYPES[storage]) if storage in _SCALAR_QUANTIZER_TYPES else None
+
+    if index_type == "flat" and storage != "pq":
+        if scalar_type is not None:
+            return faiss.IndexScalarQuantizer(dimension, scalar_type, metric)
+        return faiss.IndexFlatIP(dimension) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dimension)
+
+    if index_type == "hnsw":
+        if storage == "pq":
+            index = faiss.IndexHNSWPQ(dimension, index_config["pq_m"], index_config["hnsw_m"], pq_nbits, metric)
+        elif scalar_type is not None:
+            index = faiss.IndexHNSWSQ(dimension, scalar_type, index_config["hnsw_m"], metric)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, index_config["hnsw_m"], metric)
+        index.hnsw.efConstruction = index_config["ef_construction"]
+        index.hnsw.efSearch = index_config["ef_search"]
+        return index
+
+    # A flat PQ index is an IVF-PQ index with a single cell: IndexPQ can't filter by ID selector
+    nlist = 1 if index_type == "flat" else index_config["nlist"]
+    if training_count is not None:
+        # k-means needs several points per cell to produce useful centroids
+        nlist = max(1, min(nlist, training_count // index_config["train_points_per_list"]))
+    quantizer = faiss.IndexFlatIP(dimension) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dimension)
+    if storage == "pq":
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, index_config["pq_m"], pq_nbits, metric)
+    elif scalar_type is not None:
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, scalar_type, metric)
+    else:
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+    index.nprobe = min(index_config["nprobe"], nlist)
+    return index
+
+def prepare_vectors(embeddings, metric):
+    """
+    Returns float32 vectors ready to add or search; cosine vectors are L2-normalized.
+
+    Parameters:
+    - embeddings (np.ndarray): The raw embeddings.
+    - metric (str or int): 'l2'/'cosine', or a FAISS metric type.
+
+    Returns:
+    - np.ndarray: A contiguous float32 matrix.
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype='float32')
+    if metric in ("cosine", faiss.METRIC_INNER_PRODUCT):
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    return vectors
+
+def apply_search_params(vector_index, index_config):
+    """
+    Applies query-time tuning (IVF nprobe, HNSW efSearch) from a configuration to an index.
+
+    Parameters:
+    - vector_index (faiss.Index): The index, possibly wrapped in an ID map.
+    - index_config (dict): A configuration from `resolve_index_config`.
+    """
+    parameters = faiss.ParameterSpace()
+    base_index = faiss.downcast_index(vector_index.index) if isinstance(vector_index, faiss.IndexIDMap) else vector_index
+    if isinstance(base_index, faiss.IndexIVF):
+        parameters.set_index_parameter(vector_index, "nprobe", min(index_config["nprobe"], base_index.nlist))
+    elif isinstance(base_index, faiss.IndexHNSW):
+        parameters.set_index_parameter(vector_index, "efSearch", index_config["ef_search"])
+
+class IndexBuilder:
+    def __init__(self, index_config, with_ids=False, vector_index=None):
+        """
+        Initialize a builder that adds embeddings to an index as they stream in.
+
+        IVF indexes need training before vectors can be added, so the builder buffers
+        embeddings until it has a full training sample, trains, and then adds directly.
+        For compressed storage it also keeps the exact vectors, see `exact_vectors`.
+
+        Parameters:
+        - index_config (dict): A configuration from `resolve_index_config`.
+        - with_ids (bool): Wrap the index in an IndexIDMap2 so vectors carry stable IDs.
+        - vector_index (faiss.Index, optional): An existing, trained index to extend.
+        """
+        self.index_config = index_config
+        self.with_ids = with_ids
+        self.vector_index = vector_index
+        self._pending_vectors = []
+        self._pending_ids = []
+        self._pending_count = 0
+        self._keep_exact = keeps_exact_vectors(index_config)
+        self._exact_ids = []
+        self._exact_vectors = []
+        self._next_position = vector_index.ntotal if vector_index is not None else 0
+
+    def add(self, embeddings, ids=None):
+        """
+        Adds a batch of embeddings, with their IDs if the builder was created with IDs.
+        """
+        vectors = prepare_vectors(embeddings, self.index_config["metric"])
+        if self._keep_exact:
+            if not self.with_ids:
+                # Indexes without IDs number vectors by position
+                ids = np.arange(self._next_position, self._next_position + len(vectors))
+                self._next_position += len(vectors)
+            self._exact_ids.append(np.asarray(ids, dtype='int64'))
+            self._exact_vectors.append(vectors)
+        if self.vector_index is not None and self.vector_index.is_trained:
+            self._add_to_index(vectors, ids)
+            return
+
+        self._pending_vectors.append(vectors)
+        self._pending_ids.append(ids)
+        self._pending_count += len(vectors)
+        if self._pending_count >= training_size(self.index_config):
+            self._train_and_flush()
+
+    def finish(self):
+        """
+        Trains on whatever has been buffered if needed, and returns the index (None if empty).
+        """
+        if self._pending_vectors:
+            self._train_and_flush()
+        return self.vector_index
+
+    def exact_vectors(self):
+        """
+        Returns the exact (ids, vectors) added so far for compressed storage, or None.
+        """
+        if not self._keep_exact:
+            return None
+        if not self._exact_ids:
+            return np.empty(0, dtype='int64'), np.empty((0, 0), dtype='float32')
+        return np.concatenate(self._exact_ids), np.vstack(self._exact_vectors)
+
+    def _train_and_flush(self):
+        vectors = np.vstack(self._pending_vectors)
+        ids = np.concatenate(self._pending_ids) if self.with_ids else None
+        if self.vector_index is None:
+            index = create_index(vectors.shape[1], self.index_config, training_count=len(vectors))
+            self.vector_index = faiss.IndexIDMap2(index) if self.with_ids else index
+        if not self.vector_index.is_trained:
+            print(f"Training {self.index_config['type']} index on {len(vectors)} vectors...")
+            self.vector_index.train(vectors)
+        self._pending_vectors, self._pending_ids, self._pending_count = [], [], 0
+        self._add_to_index(vectors, ids)
+
+    def _add_to_index(self, vectors, ids):
+        if self.with_ids:
+            self.vector_index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+        else:
+            self.vector_index.add(vectors)
+
+# Example usage:
+# index_config = resolve_index_config(config_manager, 'intel_vpro', overrides={'type': 'hnsw'})
+# builder = IndexBuilder(index_config)
+# builder.add(embeddings)
+# vector_index = builder.finish()
+# exact = builder.exact_vectors()  # (ids, vectors) when index_config['storage'] is compressed
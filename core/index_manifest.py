@@ -0,0 +1,115 @@
+# core/index_manifest.py
+
+# Tracks which source files a vector store was built from, so incremental updates
+# only re-extract and re-embed files that were added or changed.
+
+import hashlib
+import json
+import os
+
+MANIFEST_FORMAT_VERSION = 1
+
+def new_manifest():
+    """
+    Creates an empty manifest.
+
+    Returns:
+    - dict: A manifest with no tracked files.
+    """
+    return {"format": MANIFEST_FORMAT_VERSION, "version": 0, "next_chunk_id": 0, "files": {}}
+
+def load_manifest(manifest_path):
+    """
+    Loads a manifest from disk.
+
+    Parameters:
+    - manifest_path (str): Path of the manifest JSON file.
+
+    Returns:
+    - dict or None: The manifest, or None if it is missing or unreadable.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest at {manifest_path}: {e}")
+        return None
+    if manifest.get("format") != MANIFEST_FORMAT_VERSION:
+        return None
+    return manifest
+
+def save_manifest(manifest, manifest_path):
+    """
+    Writes a manifest to disk atomically.
+
+    Parameters:
+    - manifest (dict): The manifest to save.
+    - manifest_path (str): Path of the manifest JSON file.
+    """
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(temp_path, manifest_path)
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    Computes the SHA-256 of a file's contents.
+
+    Parameters:
+    - file_path (str): Path of the file to hash.
+    - block_size (int): Read size in bytes.
+
+    Returns:
+    - str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def diff_source_files(manifest, folder_path, file_paths):
+    """
+    Compares files on disk against a manifest.
+
+    Files whose mtime and size match the manifest are assumed unchanged without
+    being read. Otherwise the content hash decides, so a touched-but-identical
+    file is not re-embedded.
+
+    Parameters:
+    - manifest (dict): The manifest of the current vector store.
+    - folder_path (str): Folder that manifest keys are relative to.
+    - file_paths (list of str): Source files currently on disk.
+
+    Returns:
+    - dict: Lists of relative paths under 'added', 'changed', 'removed' and 'unchanged',
+            plus 'fingerprints' mapping each added, changed or touched path to its new
+            {'mtime', 'size', 'sha256'}.
+    """
+    tracked = manifest["files"]
+    changes = {"added": [], "changed": [], "removed": [], "unchanged": [], "fingerprints": {}}
+    seen = set()
+
+    for file_path in file_paths:
+        key = os.path.relpath(file_path, folder_path)
+        seen.add(key)
+        stat = os.stat(file_path)
+        entry = tracked.get(key)
+
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            changes["unchanged"].append(key)
+            continue
+
+        fingerprint = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": hash_file(file_path)}
+        changes["fingerprints"][key] = fingerprint
+        if entry is None:
+            changes["added"].append(key)
+        elif entry["sha256"] != fingerprint["sha256"]:
+            changes["changed"].append(key)
+        else:
+            changes["unchanged"].append(key)
+
+    changes["removed"] = sorted(key for key in tracked if key not in seen)
+    return changes
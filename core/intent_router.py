@@ -0,0 +1,277 @@
+# core/intent_router.py
+
+# Decides which registered agent should handle a free-text request, without a chat
+# completion in the common case.
+#
+# Three stages, cheapest first:
+#   1. keyword rules: a request mentioning one route's keywords (and no other route's)
+#      goes straight to it, with no network call at all;
+#   2. nearest centroid: the request's embedding is compared with the mean embedding of
+#      each route's example utterances (embedded once and cached on disk), and with an
+#      out-of-scope centroid built from requests no agent should take;
+#   3. LLM fallback: only when neither is confident does a chat model pick the route. Given
+#      a fallback prompt, the same completion answers the user when no route fits, so an
+#      unmatched request costs one chat call, not one to classify and another to answer.
+# Every decision records the stage that made it, so the fast-path rate can be monitored.
+
+import asyncio
+import re
+import threading
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from config.constants import (DEFAULT_CHAT_MODEL, DEFAULT_EMBEDDING_MODEL, INTENT_ROUTER_CACHE_PATH, INTENT_ROUTER_CONFIDENCE_THRESHOLD,
+                              INTENT_ROUTER_MARGIN, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS)
+from core.embedding_cache import EmbeddingCache
+from core.embeddings import embed_query_async, embed_texts
+from core.query_cache import LRUCache
+
+# A routing decision: the chosen route (None if nothing fits), the stage that chose it
+# ('keyword', 'centroid', 'llm' or 'none'), its confidence, the query embedding if one was computed,
+# and the LLM fallback's answer to the user when it found no route
+RouteDecision = namedtuple("RouteDecision", ["route", "path", "confidence", "query_embedding", "reply"], defaults=(None,))
+
+ROUTE_PATHS = ("keyword", "centroid", "llm", "none")
+
+# Reply prefix the LLM fallback uses to pick a route rather than answer
+_ROUTE_REPLY_PREFIX = "route:"
+
+class IntentRouter:
+    def __init__(self, routes, client=None, async_client=None, embedding_cache=None, model=DEFAULT_EMBEDDING_MODEL,
+                 confidence_threshold=INTENT_ROUTER_CONFIDENCE_THRESHOLD, margin=INTENT_ROUTER_MARGIN,
+                 chat_model=DEFAULT_CHAT_MODEL, out_of_scope_examples=None):
+        """
+        Initialize a router over a set of routes.
+
+        Parameters:
+        - routes (dict): {route_name: {'description': str, 'keywords': [str], 'examples': [str]}}.
+                         Route names are the names agents are registered under.
+        - client (object, optional): Embeddings client for the example utterances; without one
+                                     the centroid stage is skipped.
+        - async_client (object, optional): Async client for query embeddings and the LLM fallback;
+                                           can also be passed per call to `route_async`.
+        - embedding_cache (EmbeddingCache, optional): Persistent cache for example and query embeddings.
+        - model (str): Embedding model.
+        - confidence_threshold (float): Minimum cosine similarity to the best centroid.
+        - margin (float): Minimum lead of the best centroid over the runner-up.
+        - chat_model (str): Chat model for the LLM fallback.
+        - out_of_scope_examples (list of str, optional): Requests no route should take. Their
+                                                         centroid competes with the routes', so an
+                                                         off-topic request is not routed just because
+                                                         it clears the threshold.
+        """
+        self.routes = routes
+        self.out_of_scope_examples = list(out_of_scope_examples or [])
+        self.client = client
+        self.async_client = async_client
+        self.embedding_cache = embedding_cache
+        self.model = model
+        self.confidence_threshold = confidence_threshold
+        self.margin = margin
+        self.chat_model = chat_model
+        self.path_counts = Counter()
+        self._keyword_patterns = {
+            name: [re.compile(r"\b" + re.escape(keyword.lower()) + r"\b") for keyword in route.get("keywords", [])]
+            for name, route in routes.items()
+        }
+        self._centroids = None  # (route names, normalized centroid matrix), built on first use; None names out of scope
+        self._centroid_lock = threading.Lock()
+        self._query_embeddings = LRUCache(max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS)
+
+    def match_keywords(self, text, candidates):
+        """
+        Applies the keyword rules.
+
+        Parameters:
+        - text (str): The request text.
+        - candidates (list of str): Routes that may be chosen.
+
+        Returns:
+        - str or None: The single route whose keywords match best, or None if none or several tie.
+        """
+        text = text.lower()
+        scores = {name: sum(1 for pattern in self._keyword_patterns.get(name, []) if pattern.search(text))
+                  for name in candidates}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] == 0 or (len(ranked) > 1 and ranked[1][1] == ranked[0][1]):
+            return None
+        return ranked[0][0]
+
+    def _get_centroids(self):
+        """
+        Embeds every route's examples (through the cache) and returns normalized centroids.
+        """
+        with self._centroid_lock:
+            if self._centroids is None:
+                names, centroids = [], []
+                groups = [(name, route.get("examples", [])) for name, route in self.routes.items()]
+                groups.append((None, self.out_of_scope_examples))
+                for name, examples in groups:
+                    if not examples:
+                        continue
+                    embeddings = embed_texts(examples, self.client, model=self.model, show_progress=False,
+                                             cache=self.embedding_cache)
+                    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+                    centroid = embeddings.mean(axis=0)
+                    names.append(name)
+                    centroids.append(centroid / np.linalg.norm(centroid))
+                self._centroids = (names, np.array(centroids, dtype='float32'))
+            return self._centroids
+
+    def nearest_centroid(self, query_embedding, candidates):
+        """
+        Compares a query embedding with the candidates' centroids.
+
+        Returns:
+        - (str, float, float): The best route (None when the out-of-scope centroid is nearest),
+          its cosine similarity and its lead over the runner-up; (None, 0.0, 0.0) if no
+          candidate has examples.
+        """
+        names, centroids = self._get_centroids()
+        if not any(name in candidates for name in names):
+            return None, 0.0, 0.0
+        rows = [row for row, name in enumerate(names) if name is None or name in candidates]
+        query = query_embedding.reshape(-1) / np.linalg.norm(query_embedding)
+        similarities = centroids[rows] @ query
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        lead = best - float(similarities[order[1]]) if len(order) > 1 else best
+        return names[rows[order[0]]], best, lead
+
+    async def _embed_query(self, text, async_client):
+        key = (self.model, text)
+        query_embedding = self._query_embeddings.get(key)
+        if query_embedding is None:
+            query_embedding = await embed_query_async(text, async_client, model=self.model, cache=self.embedding_cache)
+            self._query_embeddings.put(key, query_embedding)
+        return query_embedding
+
+    async def _ask_llm(self, text, candidates, async_client, fallback_prompt=None):
+        """
+        Asks the chat model to pick a route.
+
+        With a fallback prompt, the model answers the user itself when no route fits, in the
+        same completion.
+
+        Returns:
+        - (str, str): The route (None if it picks none of them) and the model's answer to the
+          user (None unless `fallback_prompt` is given and no route was picked).
+        """
+        options = "\n".join(f"- {name}: {self.routes.get(name, {}).get('description', name)}" for name in candidates)
+        if fallback_prompt is None:
+            instructions = ("Classify the user's request into one of these handlers. "
+                            "Reply with the handler name only, or 'none' if none fits.\n" + options)
+            max_tokens = 10
+        else:
+            instructions = (fallback_prompt + "\n\nIf one of these handlers should take the request, reply with "
+                            f"'{_ROUTE_REPLY_PREFIX} <handler name>' and nothing else. Otherwise answer the user "
+                            "yourself.\n" + options)
+            max_tokens = 150
+        response = await async_client.chat.completions.create(
+            model=self.chat_model,
+            messages=[
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": text},
+            ],
+            max_tokens=max_tokens,
+            temperature=0
+        )
+        content = response.choices[0].message.content.strip()
+        answer = content
+        if answer.lower().startswith(_ROUTE_REPLY_PREFIX):
+            answer = answer[len(_ROUTE_REPLY_PREFIX):]
+        elif fallback_prompt is not None:
+            return None, (content if content.strip(".'\"`").lower() != "none" else None)
+        answer = answer.strip().strip(".'\"`").lower()
+        route = next((name for name in candidates if name.lower() == answer), None)
+        return route, (content if route is None and fallback_prompt is not None else None)
+
+    async def route_async(self, text, candidates=None, use_llm=True, async_client=None, fallback_prompt=None):
+        """
+        Chooses the route for a request.
+
+        Parameters:
+        - text (str): The request text.
+        - candidates (list of str, optional): Routes that may be chosen, e.g. the registered
+                                              agents; defaults to every configured route.
+        - use_llm (bool): Whether to ask the chat model when the local stages aren't confident.
+        - async_client (object, optional): Async client to use instead of the router's own.
+        - fallback_prompt (str, optional): System prompt for answering the user when the LLM
+                                           fallback finds no route; its answer is the decision's `reply`.
+
+        Returns:
+        - RouteDecision: The route, the stage that chose it and its confidence. A request the
+          out-of-scope centroid claims has no route, path 'centroid' and no LLM call.
+        """
+        candidates = [name for name in (candidates or self.routes) if name in self.routes]
+        async_client = async_client or self.async_client
+        decision = RouteDecision(None, "none", 0.0, None)
+        if candidates:
+            route = self.match_keywords(text, candidates)
+            if route is not None:
+                decision = RouteDecision(route, "keyword", 1.0, None)
+            else:
+                query_embedding = None
+                if self.client is not None and async_client is not None:
+                    query_embedding = await self._embed_query(text, async_client)
+                    route, similarity, lead = await asyncio.to_thread(self.nearest_centroid, query_embedding, candidates)
+                    if similarity >= self.confidence_threshold and lead >= self.margin:
+                        decision = RouteDecision(route, "centroid", similarity, query_embedding)
+                if decision.path == "none" and use_llm and async_client is not None:
+                    try:
+                        route, reply = await self._ask_llm(text, candidates, async_client, fallback_prompt)
+                    except Exception as e:
+                        print(f"Error classifying request with OpenAI API: {e}")
+                        route, reply = None, None
+                    if route is not None or reply:
+                        decision = RouteDecision(route, "llm", None, query_embedding, reply)
+        self.path_counts[decision.path] += 1
+        return decision
+
+    def stats(self):
+        """
+        Returns how many decisions each stage made.
+
+        Returns:
+        - dict: Counts per path ('keyword', 'centroid', 'llm', 'none') and the share of
+          decisions made without a chat completion ('fast_path_rate').
+        """
+        counts = {path: self.path_counts.get(path, 0) for path in ROUTE_PATHS}
+        total = sum(counts.values())
+        counts["fast_path_rate"] = (counts["keyword"] + counts["centroid"]) / total if total else 0.0
+        return counts
+
+def create_intent_router(config_manager=None, client=None, async_client=None, embedding_cache=None,
+                         model=DEFAULT_EMBEDDING_MODEL, chat_model=DEFAULT_CHAT_MODEL):
+    """
+    Creates an IntentRouter from the global `intent_router` settings.
+
+    Parameters:
+    - config_manager (ConfigManager, optional): Source of the routes and thresholds.
+    - client, async_client (optional): OpenAI clients for embeddings and the LLM fallback.
+    - embedding_cache (EmbeddingCache, optional): Persistent cache for example and query embeddings;
+                                                  defaults to one at the `cache_path` setting.
+    - model (str): Embedding model of `client`.
+    - chat_model (str): Chat model for the LLM fallback.
+
+    Returns:
+    - IntentRouter or None: The router, or None if no routes are configured.
+    """
+    settings = (config_manager.get_global_setting("intent_router", {}) or {}) if config_manager is not None else {}
+    routes = settings.get("routes") or {}
+    if not routes:
+        return None
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(settings.get("cache_path", INTENT_ROUTER_CACHE_PATH))
+    return IntentRouter(
+        routes, client=client, async_client=async_client, embedding_cache=embedding_cache, model=model,
+        chat_model=chat_model, confidence_threshold=settings.get("confidence_threshold", INTENT_ROUTER_CONFIDENCE_THRESHOLD),
+        margin=settings.get("margin", INTENT_ROUTER_MARGIN), out_of_scope_examples=settings.get("out_of_scope_examples"),
+    )
+
+# Example usage:
+# router = IntentRouter({'vPRO_Troubleshooting': {'keywords': ['amt', 'vpro'], 'examples': ['AMT provisioning fails']}},
+#                       client=client, async_client=async_client, out_of_scope_examples=['What is the weather today?'])
+# decision = run_sync(router.route_async('My AMT device will not provision'))
+# print(decision.route, decision.path, router.stats())
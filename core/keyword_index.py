@@ -0,0 +1,295 @@
+# core/keyword_index.py
+
+# A BM25 inverted index over a vector store's chunks, for exact terms the embeddings blur:
+# error codes, register names, BIOS option and tool names.
+#
+# The index is one memory-mapped file in the chunk store's sectioned layout (see
+# core/chunk_store.py): a sorted vocabulary, and for each term a run of uint32 chunk IDs
+# with uint16 term counts, plus every chunk's length. Looking up a term is a binary search
+# over the vocabulary, and scoring a query touches only the postings of its terms, so
+# keyword queries answer in well under a millisecond without an embedding call. Updates
+# rewrite the file from the previous one, removing and adding only the changed chunks.
+
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from config.constants import BM25_B, BM25_K1
+from core.chunk_store import map_sectioned_file, write_sectioned_file
+
+KEYWORD_INDEX_MAGIC = b"RTAKWIX1"
+
+# Identifiers keep their inner separators ('0x8007000e', 'amt-16.1', 'me_fw'); their parts are indexed too
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._:/-][a-z0-9]+)*")
+_SEPARATOR_PATTERN = re.compile(r"[._:/-]")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i if in into is it its my no not of on or "
+    "so that the their then there these this to was were what when where which who why will with you your".split()
+)
+
+def tokenize(text):
+    """
+    Splits text into lowercase index terms.
+
+    Parameters:
+    - text (str): The text to split.
+
+    Returns:
+    - list of str: The terms, in order; compound identifiers are followed by their parts.
+    """
+    terms = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if _SEPARATOR_PATTERN.search(token):
+            terms.extend(part for part in _SEPARATOR_PATTERN.split(token) if part and part not in _STOPWORDS)
+    return terms
+
+def is_exact_identifier(query):
+    """
+    Checks whether a query is a single identifier, such as an error code or part number,
+    that keyword search alone can answer.
+
+    Parameters:
+    - query (str): The query text.
+
+    Returns:
+    - bool: True for one token of at least three characters containing a digit or an inner separator.
+    """
+    query = query.strip().lower()
+    if len(query) < 3 or not _TOKEN_PATTERN.fullmatch(query):
+        return False
+    return any(character.isdigit() for character in query) or bool(_SEPARATOR_PATTERN.search(query))
+
+class KeywordIndex:
+    def __init__(self, path):
+        """
+        Open a keyword index file as a read-only memory map.
+
+        Parameters:
+        - path (str): Path of the keyword index file.
+        """
+        self.path = path
+        self._mmap, header, arrays, self._blob_start = map_sectioned_file(path, KEYWORD_INDEX_MAGIC)
+        self.document_count = header["document_count"]
+        self.average_length = header["average_length"]
+        self.term_offsets = arrays["term_offsets"]
+        self.posting_offsets = arrays["posting_offsets"]
+        self.posting_ids = arrays["posting_ids"]
+        self.posting_counts = arrays["posting_counts"]
+        self.doc_ids = arrays["doc_ids"]
+        self.doc_lengths = arrays["doc_lengths"]
+
+    def __len__(self):
+        return self.document_count
+
+    def _term(self, row):
+        start = self._blob_start + int(self.term_offsets[row])
+        return self._mmap[start:self._blob_start + int(self.term_offsets[row + 1])]
+
+    def _term_row(self, term):
+        """
+        Returns a term's row in the sorted vocabulary, or -1 if it is not indexed.
+        """
+        term = term.encode("utf-8")
+        low, high = 0, len(self.term_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self.term_offsets) - 1 and self._term(low) == term else -1
+
+    def terms(self):
+        """
+        Returns the whole vocabulary, in sorted order.
+        """
+        return [self._term(row).decode("utf-8") for row in range(len(self.term_offsets) - 1)]
+
+    def postings(self, term):
+        """
+        Returns the chunks containing a term.
+
+        Parameters:
+        - term (str): An index term, as produced by `tokenize`.
+
+        Returns:
+        - (np.ndarray, np.ndarray): Sorted chunk IDs and the term's count in each.
+        """
+        row = self._term_row(term)
+        if row < 0:
+            return self.posting_ids[:0], self.posting_counts[:0]
+        start, end = int(self.posting_offsets[row]), int(self.posting_offsets[row + 1])
+        return self.posting_ids[start:end], self.posting_counts[start:end]
+
+    def search(self, query, top_k=10, visible=None):
+        """
+        Ranks chunks against a query with BM25.
+
+        Parameters:
+        - query (str): The query text.
+        - top_k (int): Number of chunks to return.
+        - visible (callable, optional): Maps an array of chunk IDs to a boolean mask of those
+                                        that may be returned.
+
+        Returns:
+        - list of (int, float): (chunk_id, score) pairs, best first.
+        """
+        matched_ids, matched_scores = [], []
+        for term in set(tokenize(query)):
+            ids, counts = self.postings(term)
+            if not len(ids):
+                continue
+            idf = math.log(1.0 + (self.document_count - len(ids) + 0.5) / (len(ids) + 0.5))
+            lengths = self.doc_lengths[np.searchsorted(self.doc_ids, ids)]
+            counts = counts.astype('float32')
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / max(self.average_length, 1e-9))
+            matched_ids.append(ids)
+            matched_scores.append(idf * counts * (BM25_K1 + 1.0) / (counts + norm))
+        if not matched_ids:
+            return []
+
+        ids, scores = np.concatenate(matched_ids), np.concatenate(matched_scores)
+        if len(matched_ids) > 1:
+            ids, inverse = np.unique(ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        if visible is not None:
+            mask = visible(ids)
+            ids, scores = ids[mask], scores[mask]
+        if len(ids) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            ids, scores = ids[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return list(zip(ids[order].tolist(), scores[order].tolist()))
+
+    def close(self):
+        """
+        Releases the memory map. Arrays previously returned by the index must not be used afterwards.
+        """
+        self.term_offsets = self.posting_offsets = self.posting_ids = self.posting_counts = None
+        self.doc_ids = self.doc_lengths = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # Arrays still reference the map; it is released when they are garbage collected
+
+def load_keyword_index(path):
+    """
+    Opens a keyword index if one exists.
+
+    Parameters:
+    - path (str): Path of the keyword index file.
+
+    Returns:
+    - KeywordIndex or None: The index, or None if the file is missing or unreadable.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return KeywordIndex(path)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring keyword index {path}: {e}")
+        return None
+
+def _tokenize_chunks(chunks):
+    """
+    Tokenizes (chunk_id, text) pairs into term strings and flat posting arrays.
+    """
+    vocabulary = {}
+    term_rows, posting_ids, posting_counts, doc_ids, doc_lengths = [], [], [], [], []
+    for chunk_id, text in chunks:
+        terms = tokenize(text)
+        doc_ids.append(chunk_id)
+        doc_lengths.append(len(terms))
+        for term, count in Counter(terms).items():
+            term_rows.append(vocabulary.setdefault(term, len(vocabulary)))
+            posting_ids.append(chunk_id)
+            posting_counts.append(min(count, 65535))
+    return (list(vocabulary), np.array(term_rows, dtype='int64'), np.array(posting_ids, dtype='<u4'),
+            np.array(posting_counts, dtype='<u2'), np.array(doc_ids, dtype='<i8'), np.array(doc_lengths, dtype='<u4'))
+
+def update_keyword_index(path, added_chunks=(), removed_ids=(), rebuild=False):
+    """
+    Removes and adds chunks, replacing the keyword index file atomically.
+
+    Parameters:
+    - path (str): Path of the keyword index file.
+    - added_chunks (dict or iterable): {chunk_id: text} or (chunk_id, text) pairs to index.
+                                       Chunks already in the index are replaced.
+    - removed_ids (iterable of int): Chunk IDs to drop.
+    - rebuild (bool): Ignore the existing file and index only `added_chunks`.
+    """
+    if isinstance(added_chunks, dict):
+        added_chunks = added_chunks.items()
+    terms, rows, ids, counts, doc_ids, doc_lengths = _tokenize_chunks(added_chunks)
+
+    existing = None if rebuild else load_keyword_index(path)
+    if existing is not None:
+        removed = np.union1d(np.asarray(list(removed_ids), dtype='int64'), doc_ids)
+        old_terms = existing.terms()
+        old_rows = np.repeat(np.arange(len(old_terms)), np.diff(existing.posting_offsets))
+        keep = ~np.isin(existing.posting_ids, removed)
+        keep_docs = ~np.isin(existing.doc_ids, removed)
+
+        # Map both vocabularies into their sorted union, then regroup the postings by term
+        all_terms = sorted(set(old_terms).union(terms), key=lambda term: term.encode("utf-8"))
+        term_numbers = {term: number for number, term in enumerate(all_terms)}
+        old_map = np.array([term_numbers[term] for term in old_terms], dtype='int64')
+        new_map = np.array([term_numbers[term] for term in terms], dtype='int64')
+        rows = np.concatenate([old_map[old_rows[keep]], new_map[rows]])
+        ids = np.concatenate([existing.posting_ids[keep], ids])
+        counts = np.concatenate([existing.posting_counts[keep], counts])
+        doc_ids = np.concatenate([existing.doc_ids[keep_docs], doc_ids])
+        doc_lengths = np.concatenate([existing.doc_lengths[keep_docs], doc_lengths])
+        existing.close()
+        terms = all_terms
+    else:
+        order = sorted(range(len(terms)), key=lambda number: terms[number].encode("utf-8"))
+        ranks = np.empty(len(terms), dtype='int64')
+        ranks[order] = np.arange(len(terms))
+        rows = ranks[rows]
+        terms = [terms[number] for number in order]
+
+    # Terms whose postings were all removed drop out of the vocabulary
+    used, rows = np.unique(rows, return_inverse=True)
+    terms = [terms[number] for number in used.tolist()]
+    order = np.lexsort((ids, rows))
+    posting_offsets = np.zeros(len(terms) + 1, dtype='<i8')
+    np.cumsum(np.bincount(rows, minlength=len(terms)), out=posting_offsets[1:])
+    doc_order = np.argsort(doc_ids, kind='stable')
+    doc_ids, doc_lengths = doc_ids[doc_order], doc_lengths[doc_order]
+
+    encoded = [term.encode("utf-8") for term in terms]
+    term_offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(term) for term in encoded], out=term_offsets[1:])
+
+    header = {"document_count": len(doc_ids),
+              "average_length": float(doc_lengths.mean()) if len(doc_lengths) else 0.0}
+    sections = [("term_offsets", term_offsets), ("posting_offsets", posting_offsets),
+                ("posting_ids", ids[order].astype('<u4')), ("posting_counts", counts[order].astype('<u2')),
+                ("doc_ids", doc_ids.astype('<i8')), ("doc_lengths", doc_lengths.astype('<u4'))]
+    write_sectioned_file(path, KEYWORD_INDEX_MAGIC, header, sections, encoded)
+
+def build_keyword_index(path, document_chunks):
+    """
+    Builds a keyword index from scratch.
+
+    Parameters:
+    - path (str): Path of the keyword index file.
+    - document_chunks (list, dict or ChunkStore): Chunk texts by position, or by chunk ID.
+    """
+    if isinstance(document_chunks, list):
+        chunks = enumerate(document_chunks)
+    else:
+        chunks = document_chunks.items()
+    update_keyword_index(path, chunks, rebuild=True)
+
+# Example usage:
+# build_keyword_index('vector_store.index_keywords.bin', chunk_store)
+# keyword_index = KeywordIndex('vector_store.index_keywords.bin')
+# keyword_index.search('0x8007000E AMT provisioning', top_k=5)
@@ -0,0 +1,492 @@
+# core/metrics.py
+
+# Lightweight latency tracking for the request path, e.g. time-to-first-token
+# (what users perceive) versus total response time, and the process-wide metrics
+# surface built on it.
+#
+# Code marks its stages with `span(stage, ...)` (embedding, vector search, prompt assembly,
+# completion, ...), which feeds a latency histogram per stage, and counts events with
+# `increment`. Agents, caches and vector store registries add their own figures (hit
+# rates, token counts, index sizes) through collectors that are read only when metrics
+# are exported, as Prometheus text or JSON. A single request can also be profiled with
+# cProfile or tracemalloc; when no profile is requested, nothing but the spans run.
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque, namedtuple
+
+import numpy as np
+
+from config.constants import (LATENCY_MAX_SAMPLES, METRICS_ENABLED, METRICS_LATENCY_BUCKETS, METRICS_PREFIX,
+                              METRICS_PROFILE_DIR, METRICS_PROFILE_TOP)
+
+class LatencyStats:
+    def __init__(self, max_samples=LATENCY_MAX_SAMPLES):
+        """
+        Initialize a recorder of latency samples.
+
+        Parameters:
+        - max_samples (int): Number of most recent samples kept for percentiles.
+        """
+        self.count = 0
+        self.total_seconds = 0.0
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """
+        Records one latency sample, in seconds.
+        """
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self._samples.append(seconds)
+
+    def summary(self):
+        """
+        Summarizes the recorded latencies.
+
+        Returns:
+        - dict: 'count', overall 'mean', and 'p50', 'p95', 'p99' and 'max' over recent samples, in seconds.
+        """
+        with self._lock:
+            samples = np.array(self._samples, dtype='float64')
+            count, total_seconds = self.count, self.total_seconds
+        if not count:
+            return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]).tolist()
+        return {"count": count, "mean": total_seconds / count, "p50": p50, "p95": p95, "p99": p99,
+                "max": float(samples.max())}
+
+class RequestTimer:
+    def __init__(self, time_to_first_token, total):
+        """
+        Initialize a timer for one request that reports to a pair of LatencyStats.
+
+        Parameters:
+        - time_to_first_token (LatencyStats): Receives the delay until the first output.
+        - total (LatencyStats): Receives the full request duration.
+        """
+        self._time_to_first_token = time_to_first_token
+        self._total = total
+        self._start = time.perf_counter()
+        self.first_token_seconds = None
+
+    def first_token(self):
+        """
+        Marks the first output of the request; later calls are ignored.
+        """
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self._start
+            self._time_to_first_token.record(self.first_token_seconds)
+
+    def finish(self):
+        """
+        Marks the end of the request. A request that produced output all at once
+        counts its full duration as its time to first token.
+
+        Returns:
+        - float: The request duration in seconds.
+        """
+        self.first_token()
+        elapsed = time.perf_counter() - self._start
+        self._total.record(elapsed)
+        return elapsed
+
+# A collected figure: `kind` is 'gauge', 'counter' or 'summary' (whose value is a LatencyStats summary)
+MetricSample = namedtuple("MetricSample", ["name", "kind", "labels", "value", "help"], defaults=("",))
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Histogram:
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        """
+        Initialize a cumulative histogram with fixed upper bounds, as Prometheus expects.
+
+        Parameters:
+        - buckets (tuple of float): Increasing bucket upper bounds; +Inf is implied.
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value):
+        """
+        Records one observation.
+        """
+        position = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                position = i
+                break
+        with self._lock:
+            self.counts[position] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        """
+        Returns the histogram's state.
+
+        Returns:
+        - dict: 'buckets' as [upper bound, cumulative count] pairs (the last bound is '+Inf'),
+          'count' and 'sum'.
+        """
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket_count
+            buckets.append([bound, cumulative])
+        return {"buckets": buckets, "count": count, "sum": total}
+
+class _Span:
+    __slots__ = ("_registry", "_stage", "_labels", "_start")
+
+    def __init__(self, registry, stage, labels):
+        self._registry = registry
+        self._stage = stage
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._registry.record_span(self._stage, time.perf_counter() - self._start, **self._labels)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class MetricsRegistry:
+    def __init__(self, enabled=METRICS_ENABLED, buckets=METRICS_LATENCY_BUCKETS, prefix=METRICS_PREFIX):
+        """
+        Initialize an empty registry of histograms, counters and collectors.
+
+        Parameters:
+        - enabled (bool): Whether spans and counters are recorded; when False they cost a flag check.
+        - buckets (tuple of float): Upper bounds of the stage latency histograms, in seconds.
+        - prefix (str): Prefix of every exported metric name.
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}    # (name, labels) -> float
+        self._help = {}
+        self._collectors = []  # weak references to callables returning MetricSamples
+        self._lock = threading.Lock()
+
+    def span(self, stage, **labels):
+        """
+        Times a stage of work, e.g. `with metrics.span('vector_search', agent='intel_vpro'):`.
+
+        The duration is recorded in the `stage_seconds` histogram and, while a request is being
+        profiled, in that request's trace.
+
+        Parameters:
+        - stage (str): Name of the stage.
+        - labels: Extra labels, such as the agent.
+
+        Returns:
+        - A context manager.
+        """
+        if not self.enabled and _current_trace.get() is None:
+            return _NULL_SPAN
+        return _Span(self, stage, labels)
+
+    def record_span(self, stage, seconds, **labels):
+        """
+        Records a stage duration measured elsewhere.
+        """
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, seconds))
+        if self.enabled:
+            self.observe("stage_seconds", seconds, help="Duration of each request stage", stage=stage, **labels)
+
+    def observe(self, name, value, help="", **labels):
+        """
+        Records a value in the histogram `name` with the given labels.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+                self._help.setdefault(name, help)
+        histogram.record(value)
+
+    def increment(self, name, amount=1, help="", **labels):
+        """
+        Adds to the counter `name` with the given labels.
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help)
+
+    def register_collector(self, collector):
+        """
+        Adds a source of figures read at export time.
+
+        Parameters:
+        - collector (callable): Returns an iterable of MetricSample. Bound methods are held
+                                weakly, so registering an object's method does not keep it alive.
+        """
+        reference = weakref.WeakMethod(collector) if hasattr(collector, "__self__") else (lambda: collector)
+        with self._lock:
+            self._collectors.append(reference)
+
+    def collect(self):
+        """
+        Returns every current figure.
+
+        Returns:
+        - list of MetricSample: Histograms (kind 'histogram', value from `Histogram.snapshot`),
+          counters, and the collectors' samples.
+        """
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+            help_texts = dict(self._help)
+            collectors = [reference() for reference in self._collectors]
+            self._collectors = [reference for reference, collector in zip(self._collectors, collectors)
+                                if collector is not None]
+        samples = [MetricSample(name, "histogram", dict(labels), histogram.snapshot(), help_texts.get(name, ""))
+                   for (name, labels), histogram in histograms]
+        samples += [MetricSample(name, "counter", dict(labels), value, help_texts.get(name, ""))
+                    for (name, labels), value in counters]
+        for collector in collectors:
+            if collector is None:
+                continue
+            try:
+                samples.extend(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return samples
+
+    def render_prometheus(self):
+        """
+        Renders every figure in the Prometheus text exposition format.
+
+        Returns:
+        - str: The exposition text.
+        """
+        families = {}
+        for sample in self.collect():
+            families.setdefault(sample.name, []).append(sample)
+        lines = []
+        for name, samples in sorted(families.items()):
+            full_name = self.prefix + name
+            kind = samples[0].kind
+            if samples[0].help:
+                lines.append(f"# HELP {full_name} {samples[0].help}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for sample in samples:
+                if kind == "histogram":
+                    for bound, count in sample.value["buckets"]:
+                        lines.append(f"{full_name}_bucket{_labels(sample.labels, le=bound)} {count}")
+                    lines.append(f"{full_name}_sum{_labels(sample.labels)} {_number(sample.value['sum'])}")
+                    lines.append(f"{full_name}_count{_labels(sample.labels)} {sample.value['count']}")
+                elif kind == "summary":
+                    summary = sample.value
+                    for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                        if summary[key] is not None:
+                            lines.append(f"{full_name}{_labels(sample.labels, quantile=quantile)} {_number(summary[key])}")
+                    total = summary["mean"] * summary["count"] if summary["count"] else 0
+                    lines.append(f"{full_name}_sum{_labels(sample.labels)} {_number(total)}")
+                    lines.append(f"{full_name}_count{_labels(sample.labels)} {summary['count']}")
+                else:
+                    lines.append(f"{full_name}{_labels(sample.labels)} {_number(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        """
+        Returns every figure as JSON-serializable data.
+
+        Returns:
+        - dict: {metric name: [{'labels', 'kind', 'value'}]}.
+        """
+        data = {}
+        for sample in self.collect():
+            data.setdefault(self.prefix + sample.name, []).append(
+                {"labels": sample.labels, "kind": sample.kind, "value": sample.value})
+        return data
+
+    def dump_json(self, path):
+        """
+        Writes `to_dict` to a JSON file.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2, default=str)
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+def _number(value):
+    return repr(float(value)) if value is not None else "NaN"
+
+_default_metrics = MetricsRegistry()
+
+def get_metrics():
+    """
+    Returns the process-wide metrics registry.
+    """
+    return _default_metrics
+
+def configure_metrics(config_manager=None):
+    """
+    Applies the global `metrics` settings to the process-wide registry.
+
+    Parameters:
+    - config_manager (ConfigManager, optional): Source of the settings.
+
+    Returns:
+    - MetricsRegistry: The process-wide registry.
+    """
+    settings = (config_manager.get_global_setting("metrics", {}) or {}) if config_manager is not None else {}
+    _default_metrics.enabled = settings.get("enabled", METRICS_ENABLED)
+    return _default_metrics
+
+def span(stage, **labels):
+    """
+    Times a stage of work in the process-wide registry; see `MetricsRegistry.span`.
+    """
+    return _default_metrics.span(stage, **labels)
+
+def increment(name, amount=1, help="", **labels):
+    """
+    Adds to a counter in the process-wide registry; see `MetricsRegistry.increment`.
+    """
+    _default_metrics.increment(name, amount, help=help, **labels)
+
+class RequestProfiler:
+    _cprofile_lock = threading.Lock()
+
+    def __init__(self, mode, label="request", profile_dir=METRICS_PROFILE_DIR, top=METRICS_PROFILE_TOP):
+        """
+        Initialize a profiler for one request; use it as a context manager around the request.
+
+        The request's stage spans are always captured. With 'cprofile' the thread running the
+        request is profiled (on an event loop this includes whatever else runs meanwhile), and
+        the stats are saved as a .prof file for pstats or snakeviz. With 'tracemalloc', the
+        allocations made during the request are compared before and after, by line. Only one
+        cProfile session runs at a time; concurrent requests asking for one only get their spans.
+
+        Parameters:
+        - mode (str): 'cprofile' or 'tracemalloc'.
+        - label (str): Used in the report's file name.
+        - profile_dir (str): Directory the reports are written to.
+        - top (int): Number of functions or lines in the text report.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Expected one of {PROFILE_MODES}.")
+        self.mode = mode
+        self.label = label
+        self.profile_dir = profile_dir
+        self.top = top
+        self.spans = []
+        self.report_path = None
+        self._profile = None
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self.spans)
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            if self._cprofile_lock.acquire(blocking=False):
+                self._profile = cProfile.Profile()
+                self._profile.enable()
+            else:
+                print("Another request is being profiled; recording spans only.")
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self._start
+        _current_trace.reset(self._token)
+        report = io.StringIO()
+        report.write(f"{self.label}: {elapsed:.4f}s\n")
+        for stage, seconds in self.spans:
+            report.write(f"  {stage:<20} {seconds:.4f}s\n")
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base_path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.label}-{os.getpid()}-{id(self)}")
+        if self._profile is not None:
+            self._profile.disable()
+            self._cprofile_lock.release()
+            self._profile.dump_stats(base_path + ".prof")
+            report.write("\n")
+            pstats.Stats(self._profile, stream=report).sort_stats("cumulative").print_stats(self.top)
+        elif self._snapshot is not None:
+            after = tracemalloc.take_snapshot()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            report.write("\nAllocations by line:\n")
+            for stat in after.compare_to(self._snapshot, "lineno")[:self.top]:
+                report.write(f"  {stat}\n")
+        self.report_path = base_path + ".txt"
+        with open(self.report_path, 'w') as file:
+            file.write(report.getvalue())
+        print(f"Profile of {self.label} written to {self.report_path}")
+        return False
+
+def profile_request(mode, label="request", profile_dir=METRICS_PROFILE_DIR):
+    """
+    Returns a context manager profiling the code inside it, or a no-op one when `mode` is None.
+
+    Parameters:
+    - mode (str or None): 'cprofile', 'tracemalloc' or None.
+    - label (str): Used in the report's file name.
+    - profile_dir (str): Directory the reports are written to.
+    """
+    if mode is None:
+        return _NULL_SPAN
+    return RequestProfiler(mode, label, profile_dir)
+
+# Example usage:
+# with span('vector_search', agent='intel_vpro'):
+#     hits = search_vector_store(query_embedding, index, chunks)
+# print(get_metrics().render_prometheus())
+# with profile_request('cprofile', label='slow_query'):
+#     agent.handle_request('AMT provisioning fails')
+# ttft, total = LatencyStats(), LatencyStats()
+# timer = RequestTimer(ttft, total)
+# ... timer.first_token() when the first token arrives ...
+# timer.finish()
+# print(ttft.summary(), total.summary())
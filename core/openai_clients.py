@@ -0,0 +1,171 @@
+# core/openai_clients.py
+
+# Shared OpenAI clients, so every agent in a process reuses one pool of keep-alive
+# connections instead of opening a new client (and new TLS connections) per request.
+#
+# Sync clients are shared per API key and settings. Async clients are additionally
+# per event loop, because httpx async connections cannot cross loops. Sync code that
+# needs an async code path runs it on one long-lived background loop via `run_sync`,
+# so the sync API shares the same async client and connection pool.
+#
+# The openai and httpx packages are imported when the first client is created, so
+# processes that only use local or fake providers never pay for loading them.
+
+import asyncio
+import threading
+import weakref
+
+from config.constants import DEFAULT_TIMEOUT, OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE_CONNECTIONS
+
+_lock = threading.Lock()
+_sync_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {settings: AsyncOpenAI}
+_background_loop = None
+
+def _limits(max_connections):
+    import httpx
+    return httpx.Limits(max_connections=max_connections,
+                        max_keepalive_connections=min(max_connections, OPENAI_MAX_KEEPALIVE_CONNECTIONS))
+
+def get_openai_client(api_key, timeout=DEFAULT_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS):
+    """
+    Returns the shared synchronous OpenAI client for an API key.
+
+    Parameters:
+    - api_key (str): OpenAI API key.
+    - timeout (float): Request timeout in seconds.
+    - max_connections (int): Maximum open connections in the client's pool.
+
+    Returns:
+    - openai.OpenAI: A client that is created once and reused.
+    """
+    import openai
+
+    key = (api_key, timeout, max_connections)
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            http_client = openai.DefaultHttpxClient(limits=_limits(max_connections), timeout=timeout)
+            client = openai.OpenAI(api_key=api_key, timeout=timeout, http_client=http_client)
+            _sync_clients[key] = client
+        return client
+
+def get_async_openai_client(api_key, timeout=DEFAULT_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS):
+    """
+    Returns the shared AsyncOpenAI client for an API key on the running event loop.
+
+    Parameters:
+    - api_key (str): OpenAI API key.
+    - timeout (float): Request timeout in seconds.
+    - max_connections (int): Maximum open connections in the client's pool.
+
+    Returns:
+    - openai.AsyncOpenAI: A client that is created once per event loop and reused.
+    """
+    import openai
+
+    loop = asyncio.get_running_loop()
+    key = (api_key, timeout, max_connections)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            http_client = openai.DefaultAsyncHttpxClient(limits=_limits(max_connections), timeout=timeout)
+            client = openai.AsyncOpenAI(api_key=api_key, timeout=timeout, http_client=http_client)
+            clients[key] = client
+        return client
+
+def _get_background_loop():
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="openai-client-loop", daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+def run_sync(coroutine):
+    """
+    Runs a coroutine on the shared background event loop and waits for its result.
+
+    This is how the synchronous agent APIs wrap their async implementations. It is
+    safe to call from many threads at once; it must not be called from async code,
+    which should await the coroutine directly.
+
+    Parameters:
+    - coroutine (coroutine): The coroutine to run.
+
+    Returns:
+    - The coroutine's result.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        coroutine.close()
+        raise RuntimeError("run_sync() cannot be called from a running event loop; await the coroutine instead.")
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_background_loop()).result()
+
+def iterate_sync(async_iterator):
+    """
+    Consumes an async iterator from synchronous code, one item at a time, on the shared background loop.
+
+    Parameters:
+    - async_iterator (async iterator): The iterator to consume, e.g. an async generator.
+
+    Yields:
+    - Each item of the iterator, as soon as it is produced.
+    """
+    async def next_item():
+        return await async_iterator.__anext__()
+
+    async def close():
+        await async_iterator.aclose()
+
+    try:
+        while True:
+            try:
+                yield run_sync(next_item())
+            except StopAsyncIteration:
+                return
+    finally:
+        # Runs when the consumer stops early too, so the generator's cleanup is not skipped
+        if hasattr(async_iterator, "aclose"):
+            run_sync(close())
+
+class ConcurrencyLimiter:
+    def __init__(self, limit):
+        """
+        Initialize a limit on concurrent requests that works across event loops.
+
+        asyncio semaphores belong to a single loop, so one is created lazily for each
+        loop the limiter is used on.
+
+        Parameters:
+        - limit (int): Maximum number of concurrent holders per event loop.
+        """
+        self.limit = limit
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def slot(self):
+        """
+        Returns the semaphore for the running loop; use as `async with limiter.slot():`.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.limit)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+# Example usage:
+# client = get_openai_client(openai_api_key)
+# async def ask():
+#     async_client = get_async_openai_client(openai_api_key)
+#     return await async_client.chat.completions.create(model="gpt-3.5-turbo", messages=[...])
+# response = run_sync(ask())
+# for token in iterate_sync(agent.stream_request_async(query)):
+#     print(token, end="", flush=True)
@@ -1,23 +1,143 @@
-import fitz  # PyMuPDF
 import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from config.constants import PDF_EXTRACTION_WORKERS, PDF_PAGES_PER_RECORD
+
+# Text of a run of pages from one PDF; pages are 1-based and inclusive
+PdfTextRecord = namedtuple("PdfTextRecord", ["file_path", "page_start", "page_end", "text"])
+
+def extract_text_from_pdf(file_path):
+    """
+    Extracts the text of a single PDF file.
+
+    Parameters:
+    - file_path (str): Path to the PDF file.
+
+    Returns:
+    - str: The text of all pages, in page order.
+    """
+    import fitz  # PyMuPDF; imported on first extraction, since serving never needs it
+    with fitz.open(file_path) as pdf:
+        return "".join(page.get_text() for page in pdf)
+
+def extract_pdf_records(file_path, pages_per_record=PDF_PAGES_PER_RECORD):
+    """
+    Extracts the text of a single PDF file as records of consecutive pages.
+
+    Parameters:
+    - file_path (str): Path to the PDF file.
+    - pages_per_record (int): Number of pages per record.
+
+    Returns:
+    - list of PdfTextRecord: The file's records, in page order.
+    """
+    import fitz
+    records = []
+    with fitz.open(file_path) as pdf:
+        page_count = len(pdf)
+        for first in range(0, page_count, pages_per_record):
+            last = min(first + pages_per_record, page_count)
+            text = "".join(pdf[number].get_text() for number in range(first, last))
+            records.append(PdfTextRecord(file_path, first + 1, last, text))
+    return records
+
+def list_pdf_files(folder_path, recursive=False):
+    """
+    Lists the PDF files in a given folder.
+
+    Parameters:
+    - folder_path (str): Path to the folder containing PDF files.
+    - recursive (bool): Whether to include PDFs in subfolders.
+
+    Returns:
+    - list of str: Sorted paths of the PDF files.
+    """
+    if not recursive:
+        return sorted(
+            os.path.join(folder_path, filename)
+            for filename in os.listdir(folder_path)
+            if filename.endswith(".pdf")
+        )
+    return sorted(
+        os.path.join(root, filename)
+        for root, _, filenames in os.walk(folder_path)
+        for filename in filenames
+        if filename.endswith(".pdf")
+    )
+
+def iter_pdf_records(file_paths, max_workers=PDF_EXTRACTION_WORKERS, pages_per_record=PDF_PAGES_PER_RECORD):
+    """
+    Extracts PDFs on a process pool and yields their records as each file finishes.
+
+    At most two files per worker are pending at once, so memory stays flat regardless of
+    corpus size, and consumers can chunk and embed while extraction continues.
+
+    Parameters:
+    - file_paths (list of str): The PDF files to extract.
+    - max_workers (int): Number of worker processes; 1 extracts in the calling process.
+    - pages_per_record (int): Number of pages per record.
+
+    Yields:
+    - PdfTextRecord: Records in page order within each file; files in completion order.
+    """
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            yield from extract_pdf_records(file_path, pages_per_record)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        remaining = iter(file_paths)
+        for file_path in remaining:
+            pending.append(executor.submit(extract_pdf_records, file_path, pages_per_record))
+            if len(pending) >= 2 * max_workers:
+                break
+
+        while pending:
+            records = pending.popleft().result()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                pending.append(executor.submit(extract_pdf_records, next_path, pages_per_record))
+            yield from records
+
+def stream_pdf_texts(folder_path, recursive=True, skip_manifest=None, max_workers=PDF_EXTRACTION_WORKERS,
+                     pages_per_record=PDF_PAGES_PER_RECORD):
+    """
+    Streams the text of every PDF under a folder as (file, page range, text) records.
+
+    Parameters:
+    - folder_path (str): Path to the folder containing PDF files.
+    - recursive (bool): Whether to include PDFs in subfolders.
+    - skip_manifest (dict, optional): A vector store manifest; files whose mtime and size
+                                      match their manifest entry are skipped.
+    - max_workers (int): Number of worker processes.
+    - pages_per_record (int): Number of pages per record.
+
+    Yields:
+    - PdfTextRecord: One record per run of pages.
+    """
+    file_paths = list_pdf_files(folder_path, recursive=recursive)
+    if skip_manifest is not None:
+        tracked = skip_manifest["files"]
+        unchanged = set()
+        for file_path in file_paths:
+            entry = tracked.get(os.path.relpath(file_path, folder_path))
+            stat = os.stat(file_path)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                unchanged.add(file_path)
+        file_paths = [file_path for file_path in file_paths if file_path not in unchanged]
+
+    yield from iter_pdf_records(file_paths, max_workers=max_workers, pages_per_record=pages_per_record)
 
 def extract_text_from_pdfs(folder_path):
     """
     Extracts text from all PDF files in a given folder.
-    
+
     Parameters:
     - folder_path (str): Path to the folder containing PDF files.
-    
+
     Returns:
     - list: A list of strings, each containing the text of one PDF file.
     """
-    documents = []
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            file_path = os.path.join(folder_path, filename)
-            text = ""
-            with fitz.open(file_path) as pdf:
-                for page in pdf:
-                    text += page.get_text()
-            documents.append(text)
-    return documents
+    return [extract_text_from_pdf(file_path) for file_path in list_pdf_files(folder_path)]
@@ -0,0 +1,224 @@
+# core/providers.py
+
+# Embedding and completion backends, selected per team.
+#
+# A team's `providers` setting picks where embeddings and chat completions come from:
+#   embeddings:  'openai' (the OpenAI API), 'local_hashing' (a deterministic, CPU-only
+#                feature-hashing embedder that needs no network or model download) or
+#                'fake' (the random vectors of core/fake_openai.py);
+#   completions: 'openai' or 'fake' (canned answers with no latency).
+# Models other than OpenAI's are tokenized by core.text_utils.LocalEncoding, so the local
+# and fake providers run without downloading a tiktoken encoding.
+# Whatever is chosen is wrapped in an OpenAI-shaped client, so callers keep using
+# `client.embeddings.create` and `client.chat.completions.create`.
+#
+# Every index records the embedder that built it (see `embedder_identity`); a store is
+# refused when loaded by an agent whose embedder differs, since its query vectors would
+# be compared with vectors from another space.
+
+import asyncio
+import functools
+import hashlib
+import math
+import re
+from types import SimpleNamespace
+
+import numpy as np
+
+from config.constants import (COMPLETION_PROVIDER, DEFAULT_CHAT_MODEL, DEFAULT_EMBEDDING_MODEL, DEFAULT_TIMEOUT,
+                              EMBEDDING_PROVIDER, FAKE_CHAT_MODEL, KNOWN_EMBEDDING_DIMENSIONS, LOCAL_EMBEDDING_DIMENSION,
+                              OPENAI_MAX_CONNECTIONS)
+from core.fake_openai import FakeAsyncOpenAIClient, FakeOpenAIClient
+from core.openai_clients import get_async_openai_client, get_openai_client
+
+EMBEDDING_PROVIDERS = ("openai", "local_hashing", "fake")
+COMPLETION_PROVIDERS = ("openai", "fake")
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+
+def _feature_slot(feature, dimension):
+    """
+    Hashes a feature to a (vector position, sign) pair.
+    """
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dimension, 1.0 if digest >> 63 else -1.0
+
+def hashing_embedding(text, dimension=LOCAL_EMBEDDING_DIMENSION):
+    """
+    Embeds a text by signed feature hashing of its words and word pairs.
+
+    Texts sharing words get similar vectors, so nearest-neighbour search behaves sensibly,
+    though with less semantic reach than a trained model. The result only depends on the
+    text and the dimension.
+
+    Parameters:
+    - text (str): The text to embed.
+    - dimension (int): Length of the embedding vector.
+
+    Returns:
+    - np.ndarray: A float32 unit vector (all zeros for a text without words).
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    counts = {}
+    for i, word in enumerate(words):
+        counts[word] = counts.get(word, 0) + 1
+        if i:
+            pair = words[i - 1] + " " + word
+            counts[pair] = counts.get(pair, 0) + 1
+    vector = np.zeros(dimension, dtype='float32')
+    for feature, count in counts.items():
+        slot, sign = _feature_slot(feature, dimension)
+        vector[slot] += sign * (1.0 + math.log(count))  # Sublinear term frequency
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class _HashingEmbeddings:
+    def __init__(self, dimension):
+        self.dimension = dimension
+
+    def _response(self, model, input):
+        inputs = [input] if isinstance(input, str) else list(input)
+        data = [SimpleNamespace(index=i, embedding=hashing_embedding(text, self.dimension).tolist(), object="embedding")
+                for i, text in enumerate(inputs)]
+        return SimpleNamespace(data=data, model=model, object="list")
+
+    def create(self, model, input):
+        """
+        Mimics `client.embeddings.create`, computing the embeddings locally.
+        """
+        return self._response(model, input)
+
+class _AsyncHashingEmbeddings(_HashingEmbeddings):
+    async def create(self, model, input):
+        """
+        Mimics `AsyncOpenAI.embeddings.create`; large batches are hashed in a worker thread.
+        """
+        if isinstance(input, str):
+            return self._response(model, input)
+        return await asyncio.to_thread(self._response, model, input)
+
+def resolve_providers(config_manager=None, team_name=None):
+    """
+    Resolves a team's embedding and completion providers.
+
+    Parameters:
+    - config_manager (ConfigManager, optional): Source of the `providers` setting.
+    - team_name (str, optional): Team whose setting overrides the global one; None for the global setting.
+
+    Returns:
+    - dict: {'embeddings': {'type', 'model', 'dimension'}, 'completions': {'type', 'model'}}.
+    """
+    settings = (config_manager.get_team_setting(team_name, "providers", {}) or {}) if config_manager is not None else {}
+    embedding_settings = dict(settings.get("embeddings", {}) or {})
+    completion_settings = dict(settings.get("completions", {}) or {})
+
+    embedding_type = embedding_settings.get("type", EMBEDDING_PROVIDER)
+    if embedding_type not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{embedding_type}'; expected one of {EMBEDDING_PROVIDERS}.")
+    completion_type = completion_settings.get("type", COMPLETION_PROVIDER)
+    if completion_type not in COMPLETION_PROVIDERS:
+        raise ValueError(f"Unknown completion provider '{completion_type}'; expected one of {COMPLETION_PROVIDERS}.")
+
+    if embedding_type == "openai":
+        embedding_model = embedding_settings.get("model", DEFAULT_EMBEDDING_MODEL)
+        dimension = embedding_settings.get("dimension", KNOWN_EMBEDDING_DIMENSIONS.get(embedding_model))
+    else:
+        dimension = embedding_settings.get("dimension", LOCAL_EMBEDDING_DIMENSION if embedding_type == "local_hashing"
+                                                          else KNOWN_EMBEDDING_DIMENSIONS[DEFAULT_EMBEDDING_MODEL])
+        # The model name keys the embedding caches, so it must differ between embedders
+        embedding_model = embedding_settings.get("model", f"{embedding_type}-{dimension}")
+    # Fake completions ignore the model, whose name would only select an OpenAI tokenizer
+    chat_model = completion_settings.get("model", DEFAULT_CHAT_MODEL) if completion_type == "openai" else FAKE_CHAT_MODEL
+    return {
+        "embeddings": {"type": embedding_type, "model": embedding_model, "dimension": dimension},
+        "completions": {"type": completion_type, "model": chat_model},
+    }
+
+def embedder_identity(providers):
+    """
+    Describes the embedder that builds and queries an index, as recorded with the index.
+
+    Parameters:
+    - providers (dict): Providers from `resolve_providers`.
+
+    Returns:
+    - dict: {'provider', 'model', 'dimension'}; the dimension may be None for unknown OpenAI models.
+    """
+    embeddings = providers["embeddings"]
+    return {"provider": embeddings["type"], "model": embeddings["model"], "dimension": embeddings["dimension"]}
+
+def check_embedder(recorded, expected, index_dimension, vector_store_path):
+    """
+    Checks that an index was built by the embedder that will query it.
+
+    Parameters:
+    - recorded (dict or None): The embedder recorded with the index; None for indexes built before
+                               embedders were recorded, which are only checked by dimension.
+    - expected (dict): The querying agent's `embedder_identity`.
+    - index_dimension (int): The index's vector dimension.
+    - vector_store_path (str): Path of the index, for the error message.
+
+    Raises:
+    - ValueError: If the embedders or dimensions differ.
+    """
+    if recorded is not None and (recorded.get("provider"), recorded.get("model")) != (expected["provider"], expected["model"]):
+        raise ValueError(f"Vector store {vector_store_path} was built with {recorded.get('provider')} embeddings "
+                         f"({recorded.get('model')}) but is queried with {expected['provider']} embeddings "
+                         f"({expected['model']}); rebuild it.")
+    if expected.get("dimension") and index_dimension != expected["dimension"]:
+        raise ValueError(f"Vector store {vector_store_path} has {index_dimension}-dimensional vectors but "
+                         f"{expected['model']} produces {expected['dimension']}; rebuild it.")
+
+def uses_openai(providers):
+    """
+    Returns whether either provider calls the OpenAI API, i.e. whether an API key is needed.
+    """
+    return "openai" in (providers["embeddings"]["type"], providers["completions"]["type"])
+
+@functools.lru_cache(maxsize=None)
+def _offline_client(asynchronous, dimension):
+    # Fake clients hold no connections, so one per kind is shared by every agent and event loop
+    client_class = FakeAsyncOpenAIClient if asynchronous else FakeOpenAIClient
+    return client_class(dimension=dimension, latency=0.0, completion_latency=0.0, first_token_latency=0.0)
+
+def create_client(providers, openai_api_key=None, timeout=DEFAULT_TIMEOUT, max_connections=OPENAI_MAX_CONNECTIONS,
+                  asynchronous=False):
+    """
+    Returns an OpenAI-shaped client serving embeddings and chat completions from the configured providers.
+
+    When both providers are 'openai' this is the shared pooled OpenAI client itself.
+
+    Parameters:
+    - providers (dict): Providers from `resolve_providers`.
+    - openai_api_key (str, optional): API key; only needed for 'openai' providers.
+    - timeout (float): OpenAI request timeout, in seconds.
+    - max_connections (int): Size of the OpenAI connection pool.
+    - asynchronous (bool): Return a client with coroutine methods, for use on the running event loop.
+
+    Returns:
+    - object: A client with `embeddings.create` and `chat.completions.create`.
+    """
+    embedding_type = providers["embeddings"]["type"]
+    completion_type = providers["completions"]["type"]
+    openai_client = None
+    if uses_openai(providers):
+        get_client = get_async_openai_client if asynchronous else get_openai_client
+        openai_client = get_client(openai_api_key, timeout=timeout, max_connections=max_connections)
+        if embedding_type == completion_type == "openai":
+            return openai_client
+
+    dimension = providers["embeddings"]["dimension"] or KNOWN_EMBEDDING_DIMENSIONS[DEFAULT_EMBEDDING_MODEL]
+    if embedding_type == "openai":
+        embeddings = openai_client.embeddings
+    elif embedding_type == "local_hashing":
+        embeddings = _AsyncHashingEmbeddings(dimension) if asynchronous else _HashingEmbeddings(dimension)
+    else:
+        embeddings = _offline_client(asynchronous, dimension).embeddings
+    chat = openai_client.chat if completion_type == "openai" else _offline_client(asynchronous, dimension).chat
+    return SimpleNamespace(embeddings=embeddings, chat=chat)
+
+# Example usage:
+# providers = resolve_providers(config_manager, 'intel_vpro')
+# client = create_client(providers, os.getenv('OPENAI_API_KEY'))
+# embeddings = embed_texts(chunks, client, model=providers['embeddings']['model'])
+# check_embedder(recorded, embedder_identity(providers), vector_index.d, 'vector_store.index')
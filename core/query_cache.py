@@ -0,0 +1,205 @@
+# core/query_cache.py
+
+# In-process caches for the request path:
+# - LRUCache: a bounded, optionally expiring map, used for query embeddings.
+# - SemanticAnswerCache: returns a stored answer when a new query is close enough to an
+#   earlier one and retrieval returned the same chunks, skipping the chat completion.
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config.constants import (
+    ANSWER_CACHE_INITIAL_ROWS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+)
+
+class LRUCache:
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS):
+        """
+        Initialize a thread-safe least-recently-used cache with optional expiry.
+
+        Parameters:
+        - max_entries (int): Maximum number of entries kept.
+        - ttl_seconds (float): Seconds an entry stays valid; None or 0 disables expiry.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value for a key, or `default` if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        Returns:
+        - dict: Hits, misses, hit rate, and current number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries)}
+
+class SemanticAnswerCache:
+    def __init__(self, similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD, max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                 ttl_seconds=ANSWER_CACHE_TTL_SECONDS):
+        """
+        Initialize a cache of answers keyed by query meaning rather than exact text.
+
+        Answers are grouped into namespaces (one per team and prompt). Each namespace is tied
+        to an index version and is emptied when the version changes, so answers never
+        outlive the documents they were based on.
+
+        Parameters:
+        - similarity_threshold (float): Minimum cosine similarity between query embeddings for a hit.
+        - max_entries (int): Maximum answers kept per namespace; the oldest are dropped first.
+        - ttl_seconds (float): Seconds an answer stays valid; None or 0 disables expiry.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _namespace(self, namespace, index_version):
+        entries = self._namespaces.get(namespace)
+        if entries is None or entries["index_version"] != index_version:
+            # Rows live in a ring buffer: `count` rows are filled and `next` is the row written next
+            entries = {"index_version": index_version, "vectors": None, "chunk_ids": [], "answers": [], "created": [],
+                       "count": 0, "next": 0}
+            self._namespaces[namespace] = entries
+        return entries
+
+    def lookup(self, namespace, index_version, query_embedding, chunk_ids):
+        """
+        Finds a stored answer for a similar query that retrieved the same chunks.
+
+        Parameters:
+        - namespace (str): Team/prompt namespace.
+        - index_version: Version of the index the chunks came from.
+        - query_embedding (np.ndarray): The query's embedding.
+        - chunk_ids (iterable): Sortable keys (e.g. IDs) of the chunks retrieved for the query.
+
+        Returns:
+        - str or None: The cached answer, or None on a miss.
+        """
+        vector = _normalize(query_embedding)
+        chunk_key = tuple(sorted(chunk_ids))
+        with self._lock:
+            entries = self._namespace(namespace, index_version)
+            if entries["count"] and entries["vectors"].shape[1] == len(vector):
+                similarities = entries["vectors"][:entries["count"]] @ vector
+                now = time.monotonic()
+                for row in np.argsort(-similarities):
+                    if similarities[row] < self.similarity_threshold:
+                        break
+                    if self.ttl_seconds and now - entries["created"][row] > self.ttl_seconds:
+                        continue
+                    if entries["chunk_ids"][row] == chunk_key:
+                        self.hits += 1
+                        return entries["answers"][row]
+            self.misses += 1
+            return None
+
+    def store(self, namespace, index_version, query_embedding, chunk_ids, answer):
+        """
+        Stores an answer for a query and the chunks it was based on.
+
+        Rows are written in place; once `max_entries` answers are stored, each new one
+        overwrites the oldest.
+        """
+        vector = _normalize(query_embedding)
+        chunk_key = tuple(sorted(chunk_ids))
+        with self._lock:
+            entries = self._namespace(namespace, index_version)
+            vectors = entries["vectors"]
+            if vectors is not None and vectors.shape[1] != len(vector):
+                # Embeddings of another dimension can't be compared with the stored ones
+                del self._namespaces[namespace]
+                entries, vectors = self._namespace(namespace, index_version), None
+            row = entries["next"]
+            if vectors is None or (row == len(vectors) and len(vectors) < self.max_entries):
+                # Capacity doubles up to max_entries, so a namespace only holds the rows it has used
+                capacity = min(self.max_entries, max(ANSWER_CACHE_INITIAL_ROWS, 2 * (0 if vectors is None else len(vectors))))
+                grown = np.empty((capacity, len(vector)), dtype='float32')
+                if vectors is not None:
+                    grown[:len(vectors)] = vectors
+                entries["vectors"] = vectors = grown
+            vectors[row] = vector
+            if row == len(entries["answers"]):
+                entries["chunk_ids"].append(chunk_key)
+                entries["answers"].append(answer)
+                entries["created"].append(time.monotonic())
+            else:
+                entries["chunk_ids"][row], entries["answers"][row] = chunk_key, answer
+                entries["created"][row] = time.monotonic()
+            entries["count"] = max(entries["count"], row + 1)
+            entries["next"] = (row + 1) % self.max_entries
+
+    def invalidate(self, namespace=None):
+        """
+        Drops the answers of one namespace, or of every namespace.
+        """
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        Returns:
+        - dict: Hits, misses, hit rate, and number of stored answers.
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": sum(entries["count"] for entries in self._namespaces.values())}
+
+def _normalize(embedding):
+    vector = np.asarray(embedding, dtype='float32').reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
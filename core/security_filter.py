@@ -0,0 +1,130 @@
+# core/security_filter.py
+
+# Restricts vector searches to the chunks a user is cleared to see.
+#
+# The filter runs inside FAISS: a bitmap of allowed chunk IDs is passed to the search as an
+# ID selector, so excluded vectors are skipped while scanning instead of being fetched and
+# discarded afterwards. One index can then serve public and confidential users, with full
+# top-k results for each. Bitmaps are built once per store, clearance and team, and cached.
+
+import threading
+import weakref
+
+import faiss
+import numpy as np
+
+from config.constants import DEFAULT_SECURITY_LEVEL
+from core.chunk_store import SECURITY_LEVELS
+
+_selector_cache = weakref.WeakKeyDictionary()  # chunk store -> {(clearance, team): (selector, bitmap) or None}
+_selector_lock = threading.Lock()
+
+def check_security_level(level):
+    """
+    Validates a security level name.
+
+    Parameters:
+    - level (str): The level to check.
+
+    Returns:
+    - str: The level, unchanged.
+    """
+    if level not in SECURITY_LEVELS:
+        raise ValueError(f"Unknown security level '{level}'. Expected one of {SECURITY_LEVELS}.")
+    return level
+
+def _selector(document_chunks, clearance, team):
+    """
+    Returns a cached (IDSelectorBitmap, bitmap) for the chunks a user may see, or None
+    when every chunk is allowed.
+    """
+    allowed_ids = getattr(document_chunks, "allowed_ids", None)
+    if allowed_ids is None:
+        # Lists and dicts carry no metadata; every chunk has the default level
+        if SECURITY_LEVELS.index(clearance) >= SECURITY_LEVELS.index(DEFAULT_SECURITY_LEVEL):
+            return None
+        return _NOTHING_VISIBLE
+
+    key = (clearance, team)
+    with _selector_lock:
+        selectors = _selector_cache.setdefault(document_chunks, {})
+        if key in selectors:
+            return selectors[key]
+
+    ids = allowed_ids(clearance, team)
+    if len(ids) == len(document_chunks):
+        entry = None
+    else:
+        allowed = np.zeros(int(document_chunks.ids[-1]) + 1, dtype=bool)
+        allowed[ids] = True
+        entry = _bitmap_selector(allowed)
+
+    with _selector_lock:
+        _selector_cache.setdefault(document_chunks, {})[key] = entry
+    return entry
+
+def _bitmap_selector(allowed):
+    # At least one byte, so an all-excluded bitmap is still a valid array
+    bitmap = np.packbits(allowed, bitorder='little') if len(allowed) else np.zeros(1, dtype='uint8')
+    # The selector only holds a pointer, so the bitmap is kept alongside it to stay alive
+    return faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap
+
+_NOTHING_VISIBLE = _bitmap_selector(np.zeros(0, dtype=bool))
+
+def security_search_parameters(vector_index, document_chunks, clearance, team=None):
+    """
+    Builds FAISS search parameters that exclude chunks above a user's clearance.
+
+    Query-time settings already on the index (IVF nprobe, HNSW efSearch) are carried over,
+    since search parameters replace them.
+
+    Parameters:
+    - vector_index (faiss.Index): The index to be searched, possibly wrapped in an ID map.
+    - document_chunks (ChunkStore, list or dict): The store's chunks, holding per-chunk security levels.
+    - clearance (str): The user's security level.
+    - team (str, optional): The team the user acts for; confidential chunks of other teams are excluded.
+
+    Returns:
+    - faiss.SearchParameters or None: Parameters for `vector_index.search`, or None if no filtering is needed.
+    """
+    entry = _selector(document_chunks, check_security_level(clearance), team)
+    if entry is None:
+        return None
+    selector, _ = entry
+
+    base_index = faiss.downcast_index(vector_index.index) if isinstance(vector_index, faiss.IndexIDMap) else vector_index
+    if isinstance(base_index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base_index.nprobe)
+    if isinstance(base_index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=base_index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def visible_mask(document_chunks, clearance, ids, team=None):
+    """
+    Checks which chunk IDs a user may see, using the same cached bitmap as the FAISS filter.
+    Used to filter results that don't come from a FAISS search, such as keyword hits.
+
+    Parameters:
+    - document_chunks (ChunkStore, list or dict): The store's chunks, holding per-chunk security levels.
+    - clearance (str): The user's security level.
+    - ids (np.ndarray): Chunk IDs to check.
+    - team (str, optional): The team the user acts for.
+
+    Returns:
+    - np.ndarray: A boolean mask, True for the IDs the user may see.
+    """
+    entry = _selector(document_chunks, check_security_level(clearance), team)
+    ids = np.asarray(ids, dtype='int64')
+    if entry is None:
+        return np.ones(len(ids), dtype=bool)
+    _, bitmap = entry
+    byte_positions = ids >> 3
+    inside = (ids >= 0) & (byte_positions < len(bitmap))
+    mask = np.zeros(len(ids), dtype=bool)
+    mask[inside] = (bitmap[byte_positions[inside]] >> (ids[inside] & 7).astype('uint8')) & 1 == 1
+    return mask
+
+# Example usage:
+# params = security_search_parameters(vector_index, chunk_store, 'public')
+# distances, ids = vector_index.search(query_vectors, 5, params=params)
+# visible_mask(chunk_store, 'public', np.array([3, 7, 11]))
@@ -1,63 +1,439 @@
 # core/session_manager.py
 
+# Session data and conversation memory, kept in a pluggable backend.
+#
+# InMemorySessionBackend holds sessions in a bounded LRU with a sliding expiry;
+# SQLiteSessionBackend persists them, so conversations survive restarts. Each session's
+# history is bounded too: once its turns exceed the token budget, the oldest are folded
+# into a rolling summary that is itself capped, so memory stays bounded however many
+# sessions are open and however long they run.
+#
+# A session ID is a bearer secret: whoever presents it gets the session's data, including
+# its clearance. Create sessions with `new_session_id()` (or let `create_session` pick one)
+# and hand the ID only to the user who authenticated for it.
+
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config.constants import (DEFAULT_CHAT_MODEL, SESSION_BACKEND, SESSION_DB_PATH, SESSION_HISTORY_TOKEN_BUDGET, SESSION_ID_BYTES,
+                              SESSION_MAX_SESSIONS, SESSION_MAX_TURNS, SESSION_SUMMARY_TOKEN_BUDGET, SESSION_TTL_SECONDS)
+from core.text_utils import count_tokens, truncate_to_tokens
+
+_FIRST_SENTENCE_PATTERN = re.compile(r"(.+?[.!?])(?:\s|$)", re.DOTALL)
+_LOCK_STRIPES = 64
+_PURGE_EVERY_SAVES = 1000
+
+class SessionBackend:
+    """
+    Storage for session records. A record is a JSON-serializable dict.
+    """
+    def load(self, session_id):
+        """
+        Returns a session's record, or None if it does not exist or has expired.
+        """
+        raise NotImplementedError
+
+    def save(self, session_id, record):
+        """
+        Stores a session's record, refreshing its expiry.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """
+        Removes a session's record, if present.
+        """
+        raise NotImplementedError
+
+    def update(self, session_id, update):
+        """
+        Replaces a session's record with `update(record)` as one atomic step, so concurrent
+        updates (from other threads or processes sharing the store) are never lost.
+
+        Parameters:
+        - session_id (str): The unique session identifier.
+        - update (callable): record or None -> new record, or None to leave the session unchanged.
+        """
+        raise NotImplementedError
+
+class InMemorySessionBackend(SessionBackend):
+    def __init__(self, max_sessions=SESSION_MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS):
+        """
+        Initialize an in-process session store.
+
+        Sessions expire `ttl_seconds` after their last use; beyond `max_sessions`, the least
+        recently used sessions are dropped.
+
+        Parameters:
+        - max_sessions (int): Maximum number of sessions kept.
+        - ttl_seconds (float): Idle time after which a session expires.
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()  # session_id -> (last_used, record), least recently used first
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        with self._lock:
+            return self._load(session_id)
+
+    def save(self, session_id, record):
+        with self._lock:
+            self._save(session_id, record)
+
+    def _load(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        self._sessions[session_id] = (time.monotonic(), entry[1])
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    def _save(self, session_id, record):
+        now = time.monotonic()
+        self._sessions[session_id] = (now, record)
+        self._sessions.move_to_end(session_id)
+        # Expiry slides with use, so expired sessions are always at the front
+        while self._sessions:
+            oldest_id, (last_used, _) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used <= self.ttl_seconds:
+                break
+            del self._sessions[oldest_id]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def update(self, session_id, update):
+        with self._lock:
+            record = update(self._load(session_id))
+            if record is not None:
+                self._save(session_id, record)
+
+    def __len__(self):
+        return len(self._sessions)
+
+class SQLiteSessionBackend(SessionBackend):
+    def __init__(self, db_path=SESSION_DB_PATH, max_sessions=SESSION_MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS):
+        """
+        Initialize a persistent session store in SQLite.
+
+        Expired sessions, and the least recently used ones beyond `max_sessions`, are purged
+        periodically as sessions are saved.
+
+        Parameters:
+        - db_path (str): Path of the SQLite database file (created if missing).
+        - max_sessions (int): Maximum number of sessions kept.
+        - ttl_seconds (float): Idle time after which a session expires.
+        """
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._saves = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, record TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        self._conn.commit()
+
+    def load(self, session_id):
+        with self._lock:
+            return self._load(session_id)
+
+    def save(self, session_id, record):
+        with self._lock:
+            self._save(session_id, record)
+            self._conn.commit()
+
+    def update(self, session_id, update):
+        with self._lock:
+            # Takes the database's write lock before reading, so a process updating the same
+            # session waits for this one to commit instead of overwriting it
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                record = update(self._load(session_id))
+                if record is not None:
+                    self._save(session_id, record)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _load(self, session_id):
+        row = self._conn.execute(
+            "SELECT record FROM sessions WHERE session_id = ? AND last_used >= ?",
+            (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, session_id, record):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, record, last_used) VALUES (?, ?, ?)",
+            (session_id, json.dumps(record), time.time())
+        )
+        self._saves += 1
+        if self._saves % _PURGE_EVERY_SAVES == 0:
+            self._purge()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def _purge(self):
+        self._conn.execute("DELETE FROM sessions WHERE last_used < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN "
+            "(SELECT session_id FROM sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def new_session_id():
+    """
+    Generates a random, unguessable session ID.
+
+    Returns:
+    - str: A URL-safe session ID.
+    """
+    return secrets.token_urlsafe(SESSION_ID_BYTES)
+
+def extractive_summary(summary, turns, token_budget, model=DEFAULT_CHAT_MODEL):
+    """
+    Folds conversation turns into a running summary without a model call.
+
+    Each turn contributes its first sentence; when the summary outgrows its budget, its
+    oldest lines are dropped.
+
+    Parameters:
+    - summary (str): The summary so far.
+    - turns (list of dict): Turns to fold in, oldest first, each with 'role' and 'content'.
+    - token_budget (int): Maximum tokens of summary.
+    - model (str): Chat model whose tokenizer measures the budget.
+
+    Returns:
+    - str: The updated summary.
+    """
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        match = _FIRST_SENTENCE_PATTERN.match(turn["content"].strip())
+        sentence = " ".join((match.group(1) if match else turn["content"]).split())
+        sentence, _ = truncate_to_tokens(sentence, max(token_budget // 4, 1), model=model)
+        if sentence:
+            lines.append(f"{turn['role']}: {sentence}")
+    while len(lines) > 1 and count_tokens("\n".join(lines), model=model) > token_budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
 class SessionManager:
-    def __init__(self):
+    def __init__(self, backend=None, max_turns=SESSION_MAX_TURNS, history_token_budget=SESSION_HISTORY_TOKEN_BUDGET,
+                 summary_token_budget=SESSION_SUMMARY_TOKEN_BUDGET, summarizer=None):
         """
-        Initializes the SessionManager with an empty session store.
-        This session store can hold temporary data, such as multi-step interaction contexts.
+        Initializes the SessionManager with a session store.
+        Sessions hold temporary data, such as multi-step interaction contexts, and conversation history.
+
+        Parameters:
+        - backend (SessionBackend, optional): Where sessions are kept; defaults to an in-memory store.
+        - max_turns (int): Most recent turns kept verbatim per session.
+        - history_token_budget (int): Tokens of verbatim turns kept before the oldest are summarized.
+        - summary_token_budget (int): Maximum tokens of the rolling summary.
+        - summarizer (callable, optional): (summary, turns, token_budget, model) -> summary; defaults
+                                           to `extractive_summary`.
         """
-        self.sessions = {}
+        self.backend = backend if backend is not None else InMemorySessionBackend()
+        self.max_turns = max_turns
+        self.history_token_budget = history_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.summarizer = summarizer or extractive_summary
+        # Updates to one session are serialized; different sessions rarely share a stripe
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
 
-    def create_session(self, session_id, initial_data=None):
+    def _lock_for(self, session_id):
+        return self._locks[hash(session_id) % _LOCK_STRIPES]
+
+    def create_session(self, session_id=None, initial_data=None):
         """
         Creates a new session with an optional initial data dictionary.
-        
+
         Parameters:
-        - session_id (str): A unique identifier for the session.
+        - session_id (str, optional): A unique identifier for the session; a random one from
+                                      `new_session_id()` when omitted.
         - initial_data (dict): Initial data to populate the session (default is empty dict).
+
+        Returns:
+        - str: The session ID, to be given only to the session's user.
         """
-        self.sessions[session_id] = initial_data if initial_data else {}
+        session_id = session_id if session_id is not None else new_session_id()
+        with self._lock_for(session_id):
+            self.backend.save(session_id, {"data": dict(initial_data) if initial_data else {}, "turns": [], "summary": ""})
+        return session_id
 
     def get_session_data(self, session_id, key, default=None):
         """
         Retrieves data from an existing session.
-        
+
         Parameters:
         - session_id (str): The unique session identifier.
         - key (str): The key for the data to retrieve.
         - default: Default value if the key is not found in the session.
-        
+
         Returns:
         - The value associated with the key, or the default if the key does not exist.
         """
-        return self.sessions.get(session_id, {}).get(key, default)
+        record = self.backend.load(session_id)
+        return record["data"].get(key, default) if record is not None else default
 
     def set_session_data(self, session_id, key, value):
         """
         Sets data in an existing session.
-        
+
         Parameters:
         - session_id (str): The unique session identifier.
         - key (str): The key for the data to set.
         - value: The value to store under the given key.
         """
-        if session_id in self.sessions:
-            self.sessions[session_id][key] = value
-        else:
-            print(f"Session '{session_id}' does not exist. Use create_session() first.")
+        def update(record):
+            if record is None:
+                print(f"Session '{session_id}' does not exist. Use create_session() first.")
+                return None
+            record["data"][key] = value
+            return record
+
+        with self._lock_for(session_id):
+            self.backend.update(session_id, update)
 
     def delete_session(self, session_id):
         """
         Deletes a session from the session store.
-        
+
+        Parameters:
+        - session_id (str): The unique session identifier.
+        """
+        with self._lock_for(session_id):
+            self.backend.delete(session_id)
+
+    def add_turns(self, session_id, turns, model=DEFAULT_CHAT_MODEL):
+        """
+        Appends conversation turns to a session, creating the session if needed.
+
+        When the verbatim turns exceed `max_turns` or `history_token_budget`, the oldest
+        are folded into the session's rolling summary; the newest turn is always kept.
+
+        Parameters:
+        - session_id (str): The unique session identifier.
+        - turns (list of (str, str)): (role, content) pairs, e.g. [('user', q), ('assistant', a)].
+        - model (str): Chat model the history is sent to, whose tokenizer counts its tokens.
+        """
+        # Counted before the update, so the store is locked no longer than needed
+        new_turns = [{"role": role, "content": content, "tokens": count_tokens(content, model=model)}
+                     for role, content in turns]
+
+        def update(record):
+            record = record if record is not None else {"data": {}, "turns": [], "summary": ""}
+            history = record["turns"] + new_turns
+            folded = 0
+            history_tokens = sum(turn["tokens"] for turn in history)
+            while len(history) - folded > 1 and (len(history) - folded > self.max_turns
+                                                 or history_tokens > self.history_token_budget):
+                history_tokens -= history[folded]["tokens"]
+                folded += 1
+            if folded:
+                record["summary"] = self.summarizer(record["summary"], history[:folded], self.summary_token_budget, model)
+            record["turns"] = history[folded:]
+            return record
+
+        with self._lock_for(session_id):
+            self.backend.update(session_id, update)
+
+    def get_history(self, session_id):
+        """
+        Returns a session's conversation memory.
+
         Parameters:
         - session_id (str): The unique session identifier.
+
+        Returns:
+        - (str, list of dict): The rolling summary ('' if none) and the verbatim turns, oldest
+          first, each with 'role', 'content' and 'tokens'.
         """
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        record = self.backend.load(session_id)
+        if record is None:
+            return "", []
+        return record["summary"], record["turns"]
+
+    def history_messages(self, session_id):
+        """
+        Returns a session's conversation memory as chat messages, to precede a new user message.
+
+        Parameters:
+        - session_id (str): The unique session identifier.
+
+        Returns:
+        - list of dict: A system message with the summary (if any), then the turns.
+        """
+        summary, turns = self.get_history(session_id)
+        messages = [{"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}] if summary else []
+        return messages + [{"role": turn["role"], "content": turn["content"]} for turn in turns]
+
+def create_session_manager(config_manager=None):
+    """
+    Creates a SessionManager from the global `sessions` settings.
+
+    Parameters:
+    - config_manager (ConfigManager, optional): Source of the settings; defaults apply without one.
+
+    Returns:
+    - SessionManager: A manager backed by 'memory' or 'sqlite' storage.
+    """
+    settings = (config_manager.get_global_setting("sessions", {}) or {}) if config_manager is not None else {}
+    backend_name = settings.get("backend", SESSION_BACKEND)
+    max_sessions = settings.get("max_sessions", SESSION_MAX_SESSIONS)
+    ttl_seconds = settings.get("ttl_seconds", SESSION_TTL_SECONDS)
+    if backend_name == "sqlite":
+        backend = SQLiteSessionBackend(settings.get("path", SESSION_DB_PATH), max_sessions, ttl_seconds)
+    elif backend_name == "memory":
+        backend = InMemorySessionBackend(max_sessions, ttl_seconds)
+    else:
+        raise ValueError(f"Unknown session backend '{backend_name}'. Expected 'memory' or 'sqlite'.")
+    return SessionManager(
+        backend,
+        max_turns=settings.get("max_turns", SESSION_MAX_TURNS),
+        history_token_budget=settings.get("history_token_budget", SESSION_HISTORY_TOKEN_BUDGET),
+        summary_token_budget=settings.get("summary_token_budget", SESSION_SUMMARY_TOKEN_BUDGET),
+    )
 
 # Example usage:
 # session_manager = SessionManager()
+# session_id = session_manager.create_session(initial_data={'clearance': 'confidential'})  # After authenticating the user
 # session_manager.create_session('session_123', {'step': 1})
 # session_manager.set_session_data('session_123', 'step', 2)
 # step = session_manager.get_session_data('session_123', 'step')
+# session_manager.add_turns('session_123', [('user', 'AMT is not responding'), ('assistant', 'Check the MEBx settings.')])
+# messages = session_manager.history_messages('session_123')
+#
+# Persistent sessions that survive restarts:
+# session_manager = SessionManager(SQLiteSessionBackend('sessions/sessions.sqlite'))
@@ -0,0 +1,230 @@
+# core/store_versions.py
+
+# Versioned on-disk layout for vector stores, so a store can be rebuilt while it is served.
+#
+# A store's logical path (e.g. teams/intel_vpro/vector_store/vector_store.index) stays what
+# agents and the registry are configured with. Each build goes into its own directory next
+# to it, `<path>_versions/<number>/`, holding the index, chunk store, keyword index, exact
+# vectors, embedder record and manifest under the usual names. A `CURRENT` file in
+# `<path>_versions/` names the version being served and is replaced atomically once a
+# version is complete, so a reader opening the store sees either the old files or the new
+# ones, never a mix. Stores built before versioning (files at the logical path itself) are
+# served as they are until their first versioned build.
+#
+# A new version is seeded with hard links to the current version's files (copies where the
+# filesystem has no hard links); every writer replaces files through a temporary file, so
+# updating the new version never touches the files the current one is serving.
+#
+# Builds of one store are serialized by a `BUILD.lock` file in `<path>_versions/`, held from
+# creating a version until it is published or discarded, so a second builder (another thread
+# or process) waits rather than removing a version that is still being written.
+
+import contextlib
+import os
+import shutil
+import socket
+import time
+
+from config.constants import VECTOR_STORE_BUILD_LOCK_POLL_SECONDS, VECTOR_STORE_BUILD_LOCK_STALE_SECONDS
+
+from core.vector_store import (chunk_store_path_for, embedder_path_for, exact_vectors_path_for, keyword_index_path_for,
+                               manifest_path_for)
+
+CURRENT_POINTER_NAME = "CURRENT"
+BUILD_LOCK_NAME = "BUILD.lock"
+
+def versions_path_for(vector_store_path):
+    """
+    Returns the directory holding a store's versions.
+    """
+    return vector_store_path + "_versions"
+
+def store_file_paths(vector_store_path):
+    """
+    Returns the paths of every file that makes up a store (the embedding cache is shared by all versions).
+    """
+    return [vector_store_path, chunk_store_path_for(vector_store_path), keyword_index_path_for(vector_store_path),
+            exact_vectors_path_for(vector_store_path), embedder_path_for(vector_store_path),
+            manifest_path_for(vector_store_path)]
+
+def _version_names(versions_path):
+    if not os.path.isdir(versions_path):
+        return []
+    return sorted((name for name in os.listdir(versions_path) if name.isdigit()), key=int)
+
+def current_version_name(vector_store_path):
+    """
+    Returns the name of the version being served, or None if the store has never been built into a version.
+    """
+    try:
+        with open(os.path.join(versions_path_for(vector_store_path), CURRENT_POINTER_NAME), 'r') as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def current_vector_store_path(vector_store_path):
+    """
+    Resolves a store's logical path to the index file of the version being served.
+
+    Parameters:
+    - vector_store_path (str): The store's configured (logical) index path.
+
+    Returns:
+    - str: The current version's index path, or the logical path itself for stores built before versioning.
+    """
+    name = current_version_name(vector_store_path)
+    if name is None:
+        return vector_store_path
+    return os.path.join(versions_path_for(vector_store_path), name, os.path.basename(vector_store_path))
+
+def _is_stale_build_lock(lock_path, stale_seconds):
+    """
+    Returns whether a build lock was left behind by a builder that is gone.
+
+    A lock taken on this host is stale once its process has exited; one taken on another
+    host (a shared filesystem), or whose holder cannot be checked, once it is older than `stale_seconds`.
+    """
+    try:
+        age = time.time() - os.path.getmtime(lock_path)
+        with open(lock_path, 'r') as file:
+            holder = file.read().split()
+    except FileNotFoundError:
+        return False  # Released meanwhile; the next attempt takes it
+    # os.kill on Windows terminates the process rather than probing it
+    if os.name != "nt" and len(holder) == 2 and holder[0] == socket.gethostname() and holder[1].isdigit():
+        try:
+            os.kill(int(holder[1]), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass  # Alive, run by another user
+        return False
+    return age > stale_seconds
+
+@contextlib.contextmanager
+def vector_store_build_lock(vector_store_path, timeout=None, stale_seconds=VECTOR_STORE_BUILD_LOCK_STALE_SECONDS):
+    """
+    Holds a store's build lock, waiting while another thread or process is building it.
+
+    Parameters:
+    - vector_store_path (str): The store's logical index path.
+    - timeout (float, optional): Seconds to wait for the lock; None waits until it is free.
+    - stale_seconds (float): Age after which a lock taken on another host is treated as abandoned.
+
+    Raises:
+    - TimeoutError: If the lock is still held after `timeout` seconds.
+    """
+    versions_path = versions_path_for(vector_store_path)
+    os.makedirs(versions_path, exist_ok=True)
+    lock_path = os.path.join(versions_path, BUILD_LOCK_NAME)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    waiting = False
+    while True:
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if _is_stale_build_lock(lock_path, stale_seconds):
+                print(f"Removing an abandoned build lock for {vector_store_path}.")
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(lock_path)
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Another build of {vector_store_path} is still running.")
+            if not waiting:
+                print(f"Waiting for another build of {vector_store_path} to finish...")
+                waiting = True
+            time.sleep(VECTOR_STORE_BUILD_LOCK_POLL_SECONDS)
+    with os.fdopen(descriptor, 'w') as file:
+        file.write(f"{socket.gethostname()} {os.getpid()}\n")
+    try:
+        yield
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lock_path)
+
+def new_vector_store_version(vector_store_path, seed_path=None):
+    """
+    Creates the directory for the next version of a store.
+
+    Must be called with the store's build lock held (see `vector_store_build_lock`) until the
+    version is published or discarded. Versions left behind by interrupted builds (newer than
+    the current one) are removed first; with the lock held, none of them is still being written.
+
+    Parameters:
+    - vector_store_path (str): The store's logical index path.
+    - seed_path (str, optional): Index path of a version whose files the new version starts
+                                 from, for incremental updates; None starts empty.
+
+    Returns:
+    - str: The new version's index path, to build or update the store at.
+    """
+    versions_path = versions_path_for(vector_store_path)
+    os.makedirs(versions_path, exist_ok=True)
+    current = current_version_name(vector_store_path)
+    names = _version_names(versions_path)
+    for name in names:
+        if current is None or int(name) > int(current):
+            shutil.rmtree(os.path.join(versions_path, name), ignore_errors=True)
+    number = max([int(name) for name in names if current is not None and int(name) <= int(current)] or [0]) + 1
+    version_directory = os.path.join(versions_path, f"{number:06d}")
+    os.makedirs(version_directory)
+    version_path = os.path.join(version_directory, os.path.basename(vector_store_path))
+    if seed_path is not None:
+        for source, target in zip(store_file_paths(seed_path), store_file_paths(version_path)):
+            if not os.path.exists(source):
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+    return version_path
+
+def publish_vector_store_version(vector_store_path, version_path):
+    """
+    Makes a fully written version the one readers open, by replacing the CURRENT pointer atomically.
+    """
+    pointer_path = os.path.join(versions_path_for(vector_store_path), CURRENT_POINTER_NAME)
+    with open(pointer_path + ".tmp", 'w') as file:
+        file.write(os.path.basename(os.path.dirname(version_path)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(pointer_path + ".tmp", pointer_path)
+
+def discard_vector_store_version(version_path):
+    """
+    Removes a version that was never published, e.g. because its build failed or changed nothing.
+    """
+    shutil.rmtree(os.path.dirname(version_path), ignore_errors=True)
+
+def prune_vector_store_versions(vector_store_path, keep, in_use=()):
+    """
+    Removes old versions of a store, keeping the newest ones and any still being read.
+
+    Parameters:
+    - vector_store_path (str): The store's logical index path.
+    - keep (int): Published versions to keep, counting the current one (at least 1).
+    - in_use (iterable of str): Index paths of versions open readers still hold.
+
+    Returns:
+    - list of str: Names of the removed versions.
+    """
+    current = current_version_name(vector_store_path)
+    if current is None:
+        return []
+    versions_path = versions_path_for(vector_store_path)
+    held = {os.path.basename(os.path.dirname(os.path.abspath(path))) for path in in_use}
+    published = [name for name in _version_names(versions_path) if int(name) <= int(current)]
+    removed = []
+    for name in published[:-max(1, keep)]:
+        if name not in held:
+            shutil.rmtree(os.path.join(versions_path, name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+# Example usage:
+# with vector_store_build_lock('teams/intel_vpro/vector_store/vector_store.index'):
+#     version_path = new_vector_store_version('teams/intel_vpro/vector_store/vector_store.index',
+#                                             seed_path=current_vector_store_path('teams/intel_vpro/vector_store/vector_store.index'))
+#     update_vector_store(folder_path, version_path, chunk_store_path_for(version_path), openai_api_key)
+#     publish_vector_store_version('teams/intel_vpro/vector_store/vector_store.index', version_path)
@@ -1,28 +1,265 @@
-import tiktoken
+import functools
+import re
+from collections import namedtuple
 
-def chunk_text(text, max_tokens=1000):
+import numpy as np
+
+# A chunk of a document, with its character and token span in the original text
+TextChunk = namedtuple("TextChunk", ["text", "start", "end", "token_start", "token_end"])
+
+# Preferred split points, strongest first. Each pattern's match end is where a new chunk may start.
+_HEADING_PATTERN = re.compile(r"\n+(?=[ \t]*(?:#{1,6} |\d+(?:\.\d+)*\.? +[A-Z]|[A-Z][A-Z0-9 /&-]{3,}\n))")
+_HEADING_LINE_PATTERN = re.compile(_HEADING_PATTERN.pattern + r"[^\n]*\n*")
+_PARAGRAPH_PATTERN = re.compile(r"\n[ \t]*\n+")
+_SENTENCE_PATTERN = re.compile(r"[.!?][\"')\]]*(?=\s)")
+_LINE_PATTERN = re.compile(r"\n")
+_SPLIT_SCORES = ((_HEADING_PATTERN, 4), (_PARAGRAPH_PATTERN, 3), (_SENTENCE_PATTERN, 2), (_LINE_PATTERN, 1))
+_WHITESPACE_BYTES = np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8)
+# Pieces of the local tokenizer: a word or punctuation run with one leading space, or whitespace
+_LOCAL_PIECE_PATTERN = re.compile(rb" ?[A-Za-z0-9_\x80-\xff]+| ?[^\sA-Za-z0-9_\x80-\xff]+|\s+(?!\S)|\s+")
+_LOCAL_TOKEN_BYTES = 4  # About the average length of a cl100k_base token in English text
+
+class LocalEncoding:
+    """
+    A tokenizer for models tiktoken has no encoding for (local and fake embedders, fake
+    completions), so they run with no encoding download.
+
+    Words and punctuation runs, each with one leading space, and whitespace runs are cut into
+    tokens of at most four UTF-8 bytes, which keeps token counts close to cl100k_base's for
+    English text. A token ID holds its bytes and their length, so decoding needs no vocabulary.
+    It offers the parts of tiktoken.Encoding this module and its callers use.
+    """
+    name = "local"
+    max_token_value = (_LOCAL_TOKEN_BYTES << 32) | 0xFFFFFFFF
+
+    def encode_ordinary(self, text):
+        data = text.encode("utf-8")
+        if not data:
+            return []
+        spans = np.array([match.span() for match in _LOCAL_PIECE_PATTERN.finditer(data)], dtype=np.int64)
+        piece_starts, piece_lengths = spans[:, 0], spans[:, 1] - spans[:, 0]
+        counts = -(-piece_lengths // _LOCAL_TOKEN_BYTES)
+        first_token = np.repeat(np.cumsum(counts) - counts, counts)
+        offsets = (np.arange(counts.sum()) - first_token) * _LOCAL_TOKEN_BYTES
+        starts = np.repeat(piece_starts, counts) + offsets
+        lengths = np.minimum(np.repeat(piece_lengths, counts) - offsets, _LOCAL_TOKEN_BYTES)
+
+        padded = np.frombuffer(data + b"\0" * _LOCAL_TOKEN_BYTES, dtype=np.uint8).astype(np.int64)
+        values = np.zeros(len(starts), dtype=np.int64)
+        for position in range(_LOCAL_TOKEN_BYTES):
+            present = position < lengths
+            values[present] = (values[present] << 8) | padded[starts[present] + position]
+        return ((lengths << 32) | values).tolist()
+
+    def encode(self, text, **kwargs):
+        return self.encode_ordinary(text)
+
+    def decode_single_token_bytes(self, token):
+        return (token & 0xFFFFFFFF).to_bytes(token >> 32, "big")
+
+    def decode(self, tokens):
+        return b"".join(self.decode_single_token_bytes(token) for token in tokens).decode("utf-8", errors="replace")
+
+    def token_byte_lengths(self, tokens):
+        return np.asarray(tokens, dtype=np.int64) >> 32
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model="text-embedding-ada-002"):
+    """
+    Returns a model's tokenizer, loading it only once per process.
+
+    OpenAI models use their tiktoken encoding. Models tiktoken does not know (e.g. local or
+    fake embedders) use LocalEncoding, which is only used to size chunks, batches and
+    contexts for them and needs no download.
+
+    Parameters:
+    - model (str): The model name whose tokenizer should be returned.
+
+    Returns:
+    - tiktoken.Encoding or LocalEncoding: The cached encoding for the model.
+    """
+    import tiktoken  # Deferred: loading tiktoken and its encodings is a large part of startup
+    try:
+        return tiktoken.encoding_for_model(model)  # Raises KeyError before downloading anything
+    except KeyError:
+        return LocalEncoding()
+
+def count_tokens(text, model="text-embedding-ada-002"):
+    """
+    Counts the tokens in a text using the model's tokenizer.
+
+    Parameters:
+    - text (str): The text to measure.
+    - model (str): The model name whose tokenizer should be used.
+
+    Returns:
+    - int: The number of tokens in the text.
+    """
+    return len(get_encoding(model).encode_ordinary(text))
+
+@functools.lru_cache(maxsize=None)
+def _token_byte_lengths(model):
+    """
+    Builds a lookup table of the UTF-8 byte length of every token in a model's vocabulary.
+    """
+    encoding = get_encoding(model)
+    lengths = np.zeros(encoding.max_token_value + 1, dtype=np.int64)
+    for token in range(len(lengths)):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass  # Unused IDs between the regular and special tokens
+    return lengths
+
+def _token_char_offsets(model, tokens, text):
+    """
+    Maps each token to the character offset where it starts, in a single vectorized pass.
+
+    Returns:
+    - (np.ndarray, np.ndarray): Character offsets with a trailing len(text) sentinel, and a
+      boolean mask of tokens that start with whitespace.
+    """
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+    encoding = get_encoding(model)
+    if isinstance(encoding, LocalEncoding):
+        token_lengths = encoding.token_byte_lengths(tokens)  # Its IDs are too sparse for a lookup table
+    else:
+        token_lengths = _token_byte_lengths(model)[np.asarray(tokens, dtype=np.int64)]
+    byte_starts = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(token_lengths, out=byte_starts[1:])
+
+    # Character index of every byte: count UTF-8 lead bytes up to and including it
+    char_of_byte = np.cumsum((data & 0xC0) != 0x80) - 1
+    char_starts = np.empty(len(tokens) + 1, dtype=np.int64)
+    char_starts[:-1] = char_of_byte[byte_starts[:-1]]
+    char_starts[-1] = len(text)
+
+    starts_with_space = np.isin(data[byte_starts[:-1]], _WHITESPACE_BYTES)
+    return char_starts, starts_with_space
+
+def _split_scores(text, char_starts, starts_with_space):
+    """
+    Scores every token boundary as a split point: 4 before headings, 3 for paragraph breaks,
+    2 for sentence ends, 1 for line breaks, 0 between words and -1 inside a word.
+    """
+    scores = np.where(starts_with_space, 0, -1).astype(np.int8)
+    scores = np.append(scores, np.int8(4))  # The end of the text is always a valid split
+
+    for pattern, score in _SPLIT_SCORES:
+        positions = np.fromiter((m.end() for m in pattern.finditer(text)), dtype=np.int64)
+        if len(positions):
+            token_positions = np.searchsorted(char_starts, positions, side="left")
+            np.maximum.at(scores, token_positions, np.int8(score))
+
+    # Never split between a heading and the text it introduces
+    for match in _HEADING_LINE_PATTERN.finditer(text):
+        heading_start, heading_end = np.searchsorted(char_starts, [match.end() - len(match.group().lstrip("\n")), match.end()])
+        scores[heading_start + 1:heading_end + 1] = -1
+    return scores
+
+def chunk_text_with_offsets(text, max_tokens=1000, overlap_tokens=0, model="text-embedding-ada-002", min_chunk_fraction=0.5):
+    """
+    Splits a text into token-limited chunks, encoding it only once.
+
+    Chunks end at the strongest available split point (heading, then paragraph break,
+    sentence end, line break, word boundary) within the last part of each token window,
+    so work is linear in the length of the text.
+
+    Parameters:
+    - text (str): The text to split.
+    - max_tokens (int): The maximum tokens per chunk.
+    - overlap_tokens (int): Tokens shared between consecutive chunks.
+    - model (str): The model whose tokenizer defines token boundaries.
+    - min_chunk_fraction (float): Earliest point in a window, as a fraction of max_tokens, to look for a split.
+
+    Returns:
+    - list of TextChunk: Chunks with their character offsets into `text` and token offsets.
+    """
+    if overlap_tokens < 0 or overlap_tokens >= max_tokens * min_chunk_fraction:
+        raise ValueError("overlap_tokens must be non-negative and smaller than max_tokens * min_chunk_fraction")
+
+    encoding = get_encoding(model)
+    tokens = encoding.encode_ordinary(text)
+    token_count = len(tokens)
+    if token_count == 0:
+        return []
+
+    char_starts, starts_with_space = _token_char_offsets(model, tokens, text)
+    scores = _split_scores(text, char_starts, starts_with_space)
+    min_length = max(1, int(max_tokens * min_chunk_fraction))
+
+    chunks = []
+    start = 0
+    while start < token_count:
+        end = min(start + max_tokens, token_count)
+        if end < token_count:
+            # Prefer the strongest split point in the window, and the latest among equals
+            window = scores[start + min_length:end + 1]
+            best = window.max()
+            if best >= 0:
+                end = start + min_length + int(np.flatnonzero(window == best)[-1])
+
+        chunk_start, chunk_end = int(char_starts[start]), int(char_starts[end])
+        piece = text[chunk_start:chunk_end]
+        stripped = piece.strip()
+        if stripped:
+            leading = len(piece) - len(piece.lstrip())
+            chunks.append(TextChunk(stripped, chunk_start + leading, chunk_start + leading + len(stripped), start, end))
+
+        if end >= token_count:
+            break
+        next_start = end
+        if overlap_tokens:
+            # Start the overlap on a word boundary when one is available
+            overlap_window = scores[end - overlap_tokens:end]
+            boundaries = np.flatnonzero(overlap_window >= 0)
+            next_start = end - overlap_tokens + (int(boundaries[0]) if len(boundaries) else 0)
+        start = next_start
+
+    return chunks
+
+def chunk_text(text, max_tokens=1000, overlap_tokens=0, model="text-embedding-ada-002"):
     """
     Splits a text into chunks, each within the max token limit.
     
     Parameters:
     - text (str): The text to split.
     - max_tokens (int): The maximum tokens per chunk.
+    - overlap_tokens (int): Tokens shared between consecutive chunks.
+    - model (str): The embedding model the chunks are for, whose tokenizer counts the tokens.
     
     Returns:
     - list of str: List of text chunks.
     """
-    encoding = tiktoken.encoding_for_model("text-embedding-ada-002")
-    words = text.split()
-    chunks = []
-    current_chunk = []
+    return [chunk.text for chunk in chunk_text_with_offsets(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens,
+                                                            model=model)]
 
-    for word in words:
-        current_chunk.append(word)
-        if len(encoding.encode(" ".join(current_chunk))) > max_tokens:
-            chunks.append(" ".join(current_chunk[:-1]))  # Exclude the last word to stay within limit
-            current_chunk = [word]
-    
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
+def truncate_to_tokens(text, max_tokens, model="text-embedding-ada-002"):
+    """
+    Shortens a text to a token limit, cutting at the last sentence end that fits.
+
+    Texts without a sentence end in range (tables, lists) are cut at the last line break,
+    and failing that at the token limit itself.
+
+    Parameters:
+    - text (str): The text to shorten.
+    - max_tokens (int): The maximum number of tokens to keep.
+    - model (str): The model name whose tokenizer should be used.
+
+    Returns:
+    - (str, int): The shortened text and its token count.
+    """
+    encoding = get_encoding(model)
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+
+    prefix = encoding.decode(tokens[:max(max_tokens, 0)])
+    for pattern in (_SENTENCE_PATTERN, _LINE_PATTERN):
+        ends = [match.end() for match in pattern.finditer(prefix)]
+        if ends:
+            prefix = prefix[:ends[-1]]
+            break
+    prefix = prefix.rstrip()
+    return prefix, len(encoding.encode_ordinary(prefix))
 
-    return chunks
@@ -1,83 +1,191 @@
 
 import faiss
+import json
 import os
-import openai
 import pickle
 import numpy as np
-from tqdm import tqdm
+from config.constants import DEFAULT_EMBEDDING_MODEL, DEFAULT_SECURITY_LEVEL, EMBEDDING_FLUSH_CHUNKS, EMBEDDING_MAX_CONCURRENCY
+from core.chunk_store import ChunkStore, is_chunk_store, write_chunk_store
+from core.embeddings import embed_query, embed_texts
+from core.exact_vectors import ExactVectors, write_exact_vectors
+from core.index_factory import IndexBuilder, index_signature, keeps_exact_vectors, prepare_vectors, resolve_index_config
+from core.keyword_index import update_keyword_index
+from core.metrics import increment, span
+from core.index_manifest import diff_source_files, load_manifest, new_manifest, save_manifest
+from core.openai_clients import get_openai_client
+from core.providers import check_embedder
+from core.pdf_tools import PdfTextRecord, iter_pdf_records, list_pdf_files
+from core.security_filter import security_search_parameters, visible_mask
 from core.text_utils import chunk_text
 
-def save_vector_store(vector_index, vector_store_path, document_chunks_path, document_chunks):
+def save_vector_store(vector_index, vector_store_path, document_chunks_path, document_chunks, chunk_metadata=None,
+                      embedder=None, exact_vectors=None):
     """
     Saves the FAISS vector store and document chunks to disk.
+
+    Chunks are written as a memory-mappable chunk store (see core/chunk_store.py). The
+    embedder that built the index is recorded next to it, so loading it with another
+    embedder fails instead of returning meaningless neighbours.
     
     Parameters:
-    - vector_index (faiss.IndexFlatL2): The FAISS index to save.
+    - vector_index (faiss.Index): The FAISS index to save.
     - vector_store_path (str): Path to save the vector store index.
-    - document_chunks_path (str): Path to save the document chunks list.
-    - document_chunks (list): List of document text chunks.
+    - document_chunks_path (str): Path to save the document chunk store.
+    - document_chunks (list or dict): Document text chunks, as a list or a {chunk_id: text} dict.
+    - chunk_metadata (dict, optional): Per-chunk source, page and security level, keyed by chunk ID.
+    - embedder (dict, optional): The `embedder_identity` of the embedder that built the index.
+    - exact_vectors (tuple, optional): (ids, vectors) of a compressed index, written to its
+                                       reranking side file (see core/exact_vectors.py).
     """
-    faiss.write_index(vector_index, vector_store_path)
-    with open(document_chunks_path, 'wb') as f:
-        pickle.dump(document_chunks, f)
+    # Write to temporary files first so a crash never leaves a half-written index in place
+    faiss.write_index(vector_index, vector_store_path + ".tmp")
+    write_chunk_store(document_chunks_path, document_chunks, chunk_metadata)
+    if exact_vectors is not None:
+        write_exact_vectors(exact_vectors_path_for(vector_store_path), *exact_vectors)
+    if embedder is not None:
+        save_embedder_record(vector_store_path, dict(embedder, dimension=vector_index.d))
+    os.replace(vector_store_path + ".tmp", vector_store_path)
     print("Vector store and document chunks saved to disk.")
 
-def load_vector_store(vector_store_path, document_chunks_path):
+def read_index(vector_store_path, mmap=True):
+    """
+    Reads a FAISS index, memory-mapping its vectors when the index type allows it.
+
+    Parameters:
+    - vector_store_path (str): Path of the index file.
+    - mmap (bool): Whether to memory-map the index instead of reading it into RAM.
+                   Memory-mapped indexes are read-only.
+
+    Returns:
+    - faiss.Index: The index.
+    """
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(vector_store_path, flags)
+        except RuntimeError:
+            pass  # Index type without mmap support; fall back to a regular read
+    return faiss.read_index(vector_store_path)
+
+def load_vector_store(vector_store_path, document_chunks_path, mmap=True, embedder=None):
     """
     Loads the FAISS vector store and document chunks from disk, if available.
+
+    Chunk stores are memory-mapped, so only the chunks a query returns are ever read.
+    Legacy pickled chunk lists are still accepted.
     
     Parameters:
     - vector_store_path (str): Path to load the vector store index.
-    - document_chunks_path (str): Path to load the document chunks list.
+    - document_chunks_path (str): Path to load the document chunks from.
+    - mmap (bool): Whether to memory-map the index; pass False if it will be modified.
+    - embedder (dict, optional): The `embedder_identity` that will query the index; the index is
+                                 checked against the embedder recorded when it was built.
     
     Returns:
-    - (faiss.IndexFlatL2, list): The FAISS index and list of document text chunks.
+    - (faiss.Index, ChunkStore or list): The FAISS index and the document text chunks.
+
+    Raises:
+    - ValueError: If the index was built by a different embedder.
     """
     if os.path.exists(vector_store_path) and os.path.exists(document_chunks_path):
-        vector_index = faiss.read_index(vector_store_path)
-        with open(document_chunks_path, 'rb') as f:
-            document_chunks = pickle.load(f)
+        vector_index = read_index(vector_store_path, mmap=mmap)
+        if embedder is not None:
+            check_embedder(load_embedder_record(vector_store_path), embedder, vector_index.d, vector_store_path)
+        if is_chunk_store(document_chunks_path):
+            document_chunks = ChunkStore(document_chunks_path)
+        else:
+            with open(document_chunks_path, 'rb') as f:
+                document_chunks = pickle.load(f)
         print("Vector store and document chunks loaded from disk.")
         return vector_index, document_chunks
     return None, None
 
+def embed_chunk_stream(chunk_stream, client, model=DEFAULT_EMBEDDING_MODEL, cache=None,
+                       max_concurrency=EMBEDDING_MAX_CONCURRENCY, flush_size=EMBEDDING_FLUSH_CHUNKS):
+    """
+    Embeds chunks from a stream as they arrive, a buffer at a time.
+
+    Parameters:
+    - chunk_stream (iterable): Yields (chunk_id, chunk_text) pairs.
+    - client (object): Embeddings client.
+    - model (str): OpenAI model for embedding generation.
+    - cache (EmbeddingCache, optional): Cache of previous embeddings.
+    - max_concurrency (int): Maximum number of embedding requests in flight at once.
+    - flush_size (int): Number of buffered chunks that triggers an embedding round.
+
+    Yields:
+    - (list of int, list of str, np.ndarray): Chunk IDs, chunk texts and their float32 embeddings.
+    """
+    chunk_ids, chunks = [], []
+    for chunk_id, chunk in chunk_stream:
+        chunk_ids.append(chunk_id)
+        chunks.append(chunk)
+        if len(chunks) >= flush_size:
+            yield chunk_ids, chunks, _embed_chunks(chunks, client, model, cache, max_concurrency)
+            chunk_ids, chunks = [], []
+    if chunks:
+        yield chunk_ids, chunks, _embed_chunks(chunks, client, model, cache, max_concurrency)
+
+def _embed_chunks(chunks, client, model, cache, max_concurrency):
+    with span("build_embedding"):
+        embeddings = embed_texts(chunks, client, model=model, max_concurrency=max_concurrency, show_progress=False,
+                                 cache=cache)
+    increment("chunks_embedded", len(chunks), help="Chunks embedded for vector store builds and updates")
+    return embeddings
 
-def build_vector_store(documents, openai_api_key, model="text-embedding-ada-002"):
+def build_vector_store(documents, openai_api_key, model=DEFAULT_EMBEDDING_MODEL, client=None,
+                       max_concurrency=EMBEDDING_MAX_CONCURRENCY, cache=None, index_config=None,
+                       exact_vectors_path=None):
     """
     Builds a FAISS vector store from a list of documents by creating embeddings for each.
+
+    Documents may be a generator (e.g. `stream_pdf_texts`); they are chunked and
+    embedded in batches as they arrive, with several requests in flight at once.
     
     Parameters:
-    - documents (list): List of document texts to embed.
+    - documents (iterable): Document texts or PdfTextRecord objects to embed.
     - openai_api_key (str): OpenAI API key to use for embedding generation.
     - model (str): OpenAI model for embedding generation.
+    - client (object, optional): Embeddings client to use instead of creating an OpenAI client.
+    - max_concurrency (int): Maximum number of embedding requests in flight at once.
+    - cache (EmbeddingCache, optional): Cache of previous embeddings; only uncached chunks are sent to the API.
+    - index_config (dict, optional): Index settings from `resolve_index_config`; defaults to a flat L2 index.
+    - exact_vectors_path (str, optional): Where to write the exact vectors if the index uses
+                                          compressed storage (see `exact_vectors_path_for`).
 
     Returns:
-    - (faiss.IndexFlatL2, list): The FAISS index and list of processed document chunks.
+    - (faiss.Index, list): The FAISS index and list of processed document chunks.
     """
-    client = openai.OpenAI(api_key=openai_api_key)  # Initialize OpenAI client
-    embeddings = []
+    if client is None:
+        client = get_openai_client(openai_api_key)  # Shared, pooled OpenAI client
+    index_config = index_config or resolve_index_config()
+    builder = IndexBuilder(index_config)
     document_chunks = []
 
-    for doc in tqdm(documents, desc="Processing documents", unit="doc"):
-        chunks = chunk_text(doc, max_tokens=1000)
-        
-        for chunk in chunks:
-            response = client.embeddings.create(
-                model=model,
-                input=chunk
-            )
-            embeddings.append(response.data[0].embedding)
-            document_chunks.append(chunk)
-
-    # Convert embeddings to a FAISS index
-    embeddings = np.array(embeddings).astype('float32')
-    vector_index = faiss.IndexFlatL2(embeddings.shape[1])
-    vector_index.add(embeddings)
+    def iter_chunks():
+        from tqdm import tqdm
+        for doc in tqdm(documents, desc="Processing documents", unit="doc"):
+            text = doc.text if isinstance(doc, PdfTextRecord) else doc
+            yield from chunk_text(text, max_tokens=index_config["chunk_max_tokens"],
+                                  overlap_tokens=index_config["chunk_overlap_tokens"], model=model)
+
+    # Rows come back in chunk order, so positions in the index match the chunk list
+    for _, chunks, embeddings in embed_chunk_stream(enumerate(iter_chunks()), client, model=model, cache=cache,
+                                                    max_concurrency=max_concurrency):
+        with span("build_index"):
+            builder.add(embeddings)
+        document_chunks.extend(chunks)
+
+    with span("build_index"):
+        vector_index = builder.finish()
+    if exact_vectors_path is not None and builder.exact_vectors() is not None:
+        write_exact_vectors(exact_vectors_path, *builder.exact_vectors())
     print("Vector store built successfully.")
 
     return vector_index, document_chunks
 
-def query_vector_store(query, vector_index, document_chunks, openai_api_key, model="text-embedding-ada-002", top_k=3):
+def query_vector_store(query, vector_index, document_chunks, openai_api_key, model=DEFAULT_EMBEDDING_MODEL, top_k=3,
+                       client=None, cache=None, exact_vectors=None):
     """
     Queries the vector store to find the most relevant documents for a given query.
     
@@ -88,26 +196,426 @@ def query_vector_store(query, vector_index, document_chunks, openai_api_key, mod
     - openai_api_key (str): OpenAI API key for embedding generation.
     - model (str): OpenAI model for embedding generation.
     - top_k (int): Number of top documents to retrieve.
+    - client (object, optional): Embeddings client to use instead of creating an OpenAI client.
+    - cache (EmbeddingCache, optional): Cache consulted before embedding the query.
+    - exact_vectors (ExactVectors, optional): Exact vectors for reranking a compressed index.
 
     Returns:
     - list: List of top-k relevant document texts, or an empty list if no results found.
     """
-    client = openai.OpenAI(api_key=openai_api_key)  # Initialize OpenAI client
-    response = client.embeddings.create(
-        model=model,
-        input=query
-    )
-    query_embedding = np.array(response.data[0].embedding).astype('float32').reshape(1, -1)
+    if client is None:
+        client = get_openai_client(openai_api_key)  # Shared, pooled OpenAI client
+    with span("embedding"):
+        query_embedding = embed_query(query, client, model=model, cache=cache)
+    with span("vector_search"):
+        hits = search_vector_store(query_embedding, vector_index, document_chunks, top_k=top_k,
+                                   exact_vectors=exact_vectors)
+    return [text for _, text, _ in hits]
+
+def search_vector_store(query_embedding, vector_index, document_chunks, top_k=3, clearance=None, team=None,
+                        exact_vectors=None):
+    """
+    Searches the vector store with an already computed query embedding.
 
-    # Retrieve top-k similar documents
-    distances, indices = vector_index.search(query_embedding, top_k)
+    With a clearance, chunks the user may not see are excluded inside the FAISS search
+    itself (see core/security_filter.py), so the top-k results are all visible ones.
 
-    # Check if any indices were returned; if not, return an empty list
-    if len(indices[0]) == 0 or indices[0][0] == -1:
+    Parameters:
+    - query_embedding (np.ndarray): The query embedding, shape (1, dimension).
+    - vector_index (faiss.Index): The FAISS index for similarity search.
+    - document_chunks (list, dict or ChunkStore): Chunks corresponding to the FAISS index entries.
+    - top_k (int): Number of top documents to retrieve.
+    - clearance (str, optional): The user's security level; None searches every chunk.
+    - team (str, optional): The team the user acts for; other teams' confidential chunks are excluded.
+    - exact_vectors (ExactVectors, optional): Exact vectors for reranking a compressed index.
+
+    Returns:
+    - list of tuple: (chunk_id, text, distance) for each hit, best first; empty if nothing was found.
+    """
+    hits = search_vector_store_batch(query_embedding, vector_index, document_chunks, top_k, clearance, team,
+                                     exact_vectors)[0]
+    if not hits:
         print("No relevant documents found for the query.")
-        return []  # No results found
+    return hits
+
+def search_vector_store_batch(query_embeddings, vector_index, document_chunks, top_k=3, clearance=None, team=None,
+                              exact_vectors=None):
+    """
+    Searches the vector store for many queries with a single matrix search.
+
+    For a compressed index, `rerank_factor` times as many candidates are fetched and
+    re-scored with their exact vectors, so the approximate codes only have to get the
+    true neighbours into the candidate list.
 
-    # Otherwise, retrieve and return the document chunks
-    results = [document_chunks[i] for i in indices[0] if i < len(document_chunks)]
+    Parameters:
+    - query_embeddings (np.ndarray): The query embeddings, shape (queries, dimension).
+    - vector_index (faiss.Index): The FAISS index for similarity search.
+    - document_chunks (list, dict or ChunkStore): Chunks corresponding to the FAISS index entries.
+    - top_k (int): Number of top documents to retrieve per query.
+    - clearance (str, optional): The user's security level; None searches every chunk.
+    - team (str, optional): The team the user acts for.
+    - exact_vectors (ExactVectors, optional): Exact vectors for reranking a compressed index.
+
+    Returns:
+    - list of list of tuple: For each query, (chunk_id, text, distance) for each hit, best first.
+    """
+    params = security_search_parameters(vector_index, document_chunks, clearance, team) if clearance else None
+    query_vectors = prepare_vectors(query_embeddings, vector_index.metric_type)
+    if exact_vectors is None:
+        distances, indices = vector_index.search(query_vectors, top_k, params=params)
+    else:
+        _, candidates = vector_index.search(query_vectors, top_k * exact_vectors.rerank_factor, params=params)
+        with span("rerank"):
+            distances, indices = exact_vectors.rerank(query_vectors, candidates, top_k, vector_index.metric_type)
+    results = []
+    for row_ids, row_distances in zip(indices.tolist(), distances.tolist()):
+        hits = []
+        for chunk_id, distance in zip(row_ids, row_distances):
+            text = get_chunk(document_chunks, chunk_id) if chunk_id != -1 else None
+            if text is not None:
+                hits.append((chunk_id, text, distance))
+        results.append(hits)
     return results
 
+def search_keyword_index(query, keyword_index, document_chunks, top_k=10, clearance=None, team=None):
+    """
+    Searches a store's keyword index; no embedding is needed.
+
+    Parameters:
+    - query (str): The query text.
+    - keyword_index (KeywordIndex): The store's keyword index.
+    - document_chunks (list, dict or ChunkStore): The store's chunks.
+    - top_k (int): Number of chunks to retrieve.
+    - clearance (str, optional): The user's security level; None searches every chunk.
+    - team (str, optional): The team the user acts for.
+
+    Returns:
+    - list of tuple: (chunk_id, text, BM25 score) for each hit, best first.
+    """
+    visible = (lambda ids: visible_mask(document_chunks, clearance, ids, team)) if clearance else None
+    hits = []
+    for chunk_id, score in keyword_index.search(query, top_k=top_k, visible=visible):
+        text = get_chunk(document_chunks, chunk_id)
+        if text is not None:
+            hits.append((chunk_id, text, score))
+    return hits
+
+def get_chunk(document_chunks, chunk_id):
+    """
+    Looks up a chunk by the ID returned from a FAISS search.
+
+    Parameters:
+    - document_chunks (list, dict or ChunkStore): Chunks by position (lists) or by chunk ID.
+    - chunk_id (int): The ID from the search results; -1 means no result.
+
+    Returns:
+    - str or None: The chunk text, or None if the ID is unknown.
+    """
+    if isinstance(document_chunks, list):
+        return document_chunks[chunk_id] if 0 <= chunk_id < len(document_chunks) else None
+    return document_chunks.get(int(chunk_id))
+
+def chunk_store_path_for(vector_store_path):
+    """
+    Returns the path of the chunk store kept next to a vector store index.
+    """
+    return vector_store_path + "_chunks.bin"
+
+def keyword_index_path_for(vector_store_path):
+    """
+    Returns the path of the keyword index kept next to a vector store index.
+    """
+    return vector_store_path + "_keywords.bin"
+
+def exact_vectors_path_for(vector_store_path):
+    """
+    Returns the path of the exact vectors kept next to a compressed vector store index.
+    """
+    return vector_store_path + "_vectors.bin"
+
+def load_exact_vectors(vector_store_path, index_config):
+    """
+    Opens a store's exact vectors for reranking, if its index is compressed and reranking is on.
+
+    Parameters:
+    - vector_store_path (str): Path of the FAISS index file.
+    - index_config (dict): Index settings from `resolve_index_config`.
+
+    Returns:
+    - ExactVectors or None: The memory-mapped vectors, or None if searches use the index alone.
+    """
+    path = exact_vectors_path_for(vector_store_path)
+    if not keeps_exact_vectors(index_config) or index_config.get("rerank_factor", 0) <= 0 or not os.path.exists(path):
+        return None
+    return ExactVectors(path, rerank_factor=index_config["rerank_factor"])
+
+def embedder_path_for(vector_store_path):
+    """
+    Returns the path of the embedder record kept next to a vector store index.
+    """
+    return vector_store_path + "_embedder.json"
+
+def save_embedder_record(vector_store_path, embedder):
+    """
+    Records which embedder (provider, model and dimension) built a vector store.
+    """
+    record_path = embedder_path_for(vector_store_path)
+    with open(record_path + ".tmp", 'w') as file:
+        json.dump(embedder, file)
+    os.replace(record_path + ".tmp", record_path)
+
+def load_embedder_record(vector_store_path):
+    """
+    Returns the embedder recorded for a vector store, or None for stores built before embedders were recorded.
+    """
+    record_path = embedder_path_for(vector_store_path)
+    if not os.path.exists(record_path):
+        return None
+    with open(record_path, 'r') as file:
+        return json.load(file)
+
+def security_level_for_path(relative_path, default=DEFAULT_SECURITY_LEVEL):
+    """
+    Returns the security level of a source file: anything under a `confidential` folder is confidential.
+    """
+    parts = os.path.normpath(relative_path).split(os.sep)
+    return "confidential" if "confidential" in parts[:-1] else default
+
+def manifest_path_for(vector_store_path):
+    """
+    Returns the path of the source-file manifest kept next to a vector store index.
+    """
+    return vector_store_path + "_manifest.json"
+
+def vector_store_version(vector_store_path):
+    """
+    Returns a value that changes whenever the vector store on disk is rebuilt or updated.
+
+    Parameters:
+    - vector_store_path (str): Path of the FAISS index file.
+
+    Returns:
+    - tuple: (manifest version, index file mtime in ns); (0, 0) if the index does not exist.
+    """
+    manifest = load_manifest(manifest_path_for(vector_store_path))
+    mtime = os.stat(vector_store_path).st_mtime_ns if os.path.exists(vector_store_path) else 0
+    return (manifest["version"] if manifest else 0, mtime)
+
+def is_vector_store_current(folder_path, vector_store_path, document_chunks_path, index_config=None, embedder=None):
+    """
+    Checks, without opening the index, whether `update_vector_store` would leave a store unchanged.
+
+    Only the manifest, the embedder record and the source files' mtimes and sizes are read
+    (files whose mtime changed are hashed), so startup can skip loading the index for
+    writing and extracting PDFs when nothing has changed.
+
+    Parameters:
+    - folder_path (str): Folder containing the source PDF files, searched recursively.
+    - vector_store_path (str): Path of the vector store index.
+    - document_chunks_path (str): Path of the document chunks file.
+    - index_config (dict, optional): Index settings from `resolve_index_config`.
+    - embedder (dict, optional): The `embedder_identity` that will query the store.
+
+    Returns:
+    - bool: True if the store, its chunk store and keyword index exist, were built with these
+      settings and embedder, and every source file is unchanged.
+    """
+    manifest = load_manifest(manifest_path_for(vector_store_path))
+    if manifest is None or manifest.get("index") != index_signature(index_config or resolve_index_config()):
+        return False
+    if not (os.path.exists(vector_store_path) and os.path.exists(document_chunks_path)
+            and os.path.exists(keyword_index_path_for(vector_store_path)) and is_chunk_store(document_chunks_path)):
+        return False
+    if keeps_exact_vectors(index_config or resolve_index_config()) and not os.path.exists(exact_vectors_path_for(vector_store_path)):
+        return False
+    if embedder is not None:
+        recorded = load_embedder_record(vector_store_path)
+        if recorded is None:
+            return False  # Built before embedders were recorded; the update checks the index itself
+        try:
+            check_embedder(recorded, embedder, recorded.get("dimension"), vector_store_path)
+        except ValueError:
+            return False
+    changes = diff_source_files(manifest, folder_path, list_pdf_files(folder_path, recursive=True))
+    return not (changes["added"] or changes["changed"] or changes["removed"] or changes["fingerprints"])
+
+def update_vector_store(folder_path, vector_store_path, document_chunks_path, openai_api_key, model=DEFAULT_EMBEDDING_MODEL,
+                        client=None, cache=None, force_rebuild=False, max_concurrency=EMBEDDING_MAX_CONCURRENCY,
+                        index_config=None, security_level=DEFAULT_SECURITY_LEVEL, team_name=None, embedder=None):
+    """
+    Brings a vector store in line with the PDFs in a folder, embedding only what changed.
+
+    Each source file's mtime, size and content hash are tracked in a manifest next to the
+    index, along with the stable IDs of its chunks. Added and changed files are extracted,
+    chunked and embedded; the vectors of changed and deleted files are removed by ID. The
+    updated index, chunks, keyword index and manifest are then swapped into place. Each chunk
+    records its source file, page range, security level and team in the chunk store.
+
+    Parameters:
+    - folder_path (str): Folder containing the source PDF files, searched recursively.
+    - vector_store_path (str): Path of the vector store index.
+    - document_chunks_path (str): Path of the document chunks file.
+    - openai_api_key (str): OpenAI API key to use for embedding generation.
+    - model (str): OpenAI model for embedding generation.
+    - client (object, optional): Embeddings client to use instead of creating an OpenAI client.
+    - cache (EmbeddingCache, optional): Cache of previous embeddings.
+    - force_rebuild (bool): Ignore the existing store and rebuild from every file.
+    - max_concurrency (int): Maximum number of embedding requests in flight at once.
+    - index_config (dict, optional): Index settings from `resolve_index_config`. If the build-time
+                                     settings differ from the stored index's, it is rebuilt.
+    - security_level (str): Security level of the folder's files; files under a `confidential`
+                            subfolder are always confidential.
+    - team_name (str, optional): Team that owns the folder's documents, recorded on each chunk.
+    - embedder (dict, optional): The `embedder_identity` of `client` and `model`. A store built by
+                                 another embedder is rebuilt rather than updated.
+
+    Returns:
+    - (faiss.IndexIDMap2, ChunkStore, dict): The index, the chunk store, and the detected
+      file changes (see `diff_source_files`).
+    """
+    index_config = index_config or resolve_index_config()
+    manifest_path = manifest_path_for(vector_store_path)
+    manifest = None if force_rebuild else load_manifest(manifest_path)
+    vector_index, document_chunks, chunk_metadata = None, None, None
+
+    if manifest is not None and manifest.get("index") != index_signature(index_config):
+        print("Vector index settings changed; rebuilding.")
+        manifest = None
+    if (manifest is not None and keeps_exact_vectors(index_config)
+            and not os.path.exists(exact_vectors_path_for(vector_store_path))):
+        # Built before exact vectors were kept; reranking needs every vector's row
+        print("Exact vectors for reranking are missing; rebuilding.")
+        manifest = None
+
+    if manifest is not None:
+        try:
+            vector_index, document_chunks = load_vector_store(vector_store_path, document_chunks_path, mmap=False,
+                                                              embedder=embedder)
+        except ValueError:
+            print("Embedding provider or model changed; rebuilding.")
+            manifest = None
+        # Stores from full builds have positional IDs and can't be updated in place
+        if manifest is not None and (not isinstance(vector_index, faiss.IndexIDMap2)
+                                     or not isinstance(document_chunks, (ChunkStore, dict))):
+            print("Existing vector store does not support incremental updates; rebuilding.")
+            manifest, vector_index, document_chunks = None, None, None
+
+    file_paths = list_pdf_files(folder_path, recursive=True)
+    if manifest is not None:
+        changes = diff_source_files(manifest, folder_path, file_paths)
+        stale_ids = [chunk_id for key in changes["changed"] + changes["removed"] for chunk_id in manifest["files"][key]["chunk_ids"]]
+        if stale_ids:
+            try:
+                vector_index.remove_ids(np.array(stale_ids, dtype='int64'))
+            except RuntimeError:
+                # HNSW graphs can't delete vectors; start over from every file instead
+                print(f"{index_config['type']} index does not support removal; rebuilding.")
+                manifest, vector_index, document_chunks = None, None, None
+
+    if manifest is not None and (changes["added"] or changes["changed"] or changes["removed"]):
+        # Copy the memory-mapped chunks into dicts that can be edited
+        if isinstance(document_chunks, ChunkStore):
+            chunk_store = document_chunks
+            document_chunks, chunk_metadata = chunk_store.to_dicts()
+            chunk_store.close()
+        else:
+            chunk_metadata = {}
+
+    rebuilt = manifest is None
+    if manifest is None:
+        manifest, document_chunks, chunk_metadata = new_manifest(), {}, {}
+        changes = diff_source_files(manifest, folder_path, file_paths)
+        stale_ids = []
+    manifest["index"] = index_signature(index_config)
+
+    to_embed = changes["added"] + changes["changed"]
+    to_remove = changes["changed"] + changes["removed"]
+
+    # Drop the chunks of changed and deleted files; their vectors were removed above
+    for chunk_id in stale_ids:
+        document_chunks.pop(chunk_id, None)
+        chunk_metadata.pop(chunk_id, None)
+    for key in changes["removed"]:
+        del manifest["files"][key]
+
+    # Extract, chunk and embed added and changed files, streaming records from the extraction pool
+    for key in to_embed:
+        manifest["files"][key] = dict(changes["fingerprints"][key], chunk_ids=[])
+
+    def chunk_stream():
+        from tqdm import tqdm
+        records = iter_pdf_records([os.path.join(folder_path, key) for key in to_embed])
+        for record in tqdm(records, desc="Processing documents", unit="record"):
+            key = os.path.relpath(record.file_path, folder_path)
+            file_chunk_ids = manifest["files"][key]["chunk_ids"]
+            metadata = {"source": key, "page_start": record.page_start, "page_end": record.page_end,
+                        "security_level": security_level_for_path(key, security_level), "team": team_name}
+            for chunk in chunk_text(record.text, max_tokens=index_config["chunk_max_tokens"],
+                                    overlap_tokens=index_config["chunk_overlap_tokens"], model=model):
+                chunk_id = manifest["next_chunk_id"]
+                manifest["next_chunk_id"] += 1
+                file_chunk_ids.append(chunk_id)
+                chunk_metadata[chunk_id] = metadata
+                yield chunk_id, chunk
+
+    if to_embed and client is None:
+        client = get_openai_client(openai_api_key)  # Shared, pooled OpenAI client
+    builder = IndexBuilder(index_config, with_ids=True, vector_index=vector_index)
+    added_chunks = {}
+    for chunk_ids, chunks, embeddings in embed_chunk_stream(chunk_stream(), client, model=model, cache=cache,
+                                                            max_concurrency=max_concurrency):
+        with span("build_index"):
+            builder.add(embeddings, chunk_ids)
+        added_chunks.update(zip(chunk_ids, chunks))
+    if added_chunks:
+        document_chunks.update(added_chunks)  # Unchanged stores keep their memory-mapped ChunkStore
+    with span("build_index"):
+        vector_index = builder.finish()
+
+    # Touched-but-identical files only need their fingerprints refreshed
+    for key in changes["unchanged"]:
+        if key in changes["fingerprints"]:
+            manifest["files"][key].update(changes["fingerprints"][key])
+
+    if vector_index is None:
+        print("No documents found to build the vector store.")
+        return None, None, changes
+
+    if to_embed or to_remove or not isinstance(document_chunks, ChunkStore):
+        manifest["version"] += 1
+        save_vector_store(vector_index, vector_store_path, document_chunks_path, document_chunks, chunk_metadata,
+                          embedder=embedder, exact_vectors=_updated_exact_vectors(builder, vector_store_path, rebuilt,
+                                                                                  stale_ids))
+        # Serve from the memory-mapped store rather than the copy made for updating
+        document_chunks = ChunkStore(document_chunks_path)
+        # The keyword index is patched with just the changed chunks, unless it has to be built
+        keyword_path = keyword_index_path_for(vector_store_path)
+        if rebuilt or not os.path.exists(keyword_path):
+            update_keyword_index(keyword_path, document_chunks.items(), rebuild=True)
+        else:
+            update_keyword_index(keyword_path, added_chunks, stale_ids)
+        # The manifest goes last: if anything above fails, the next update redoes the work
+        save_manifest(manifest, manifest_path)
+    elif changes["fingerprints"]:
+        save_manifest(manifest, manifest_path)
+    if not os.path.exists(keyword_index_path_for(vector_store_path)):
+        # Stores built before keyword search get their keyword index on the next update
+        update_keyword_index(keyword_index_path_for(vector_store_path), document_chunks.items(), rebuild=True)
+
+    print(f"Vector store updated: {len(changes['added'])} added, {len(changes['changed'])} changed, "
+          f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged.")
+    return vector_index, document_chunks, changes
+
+def _updated_exact_vectors(builder, vector_store_path, rebuilt, stale_ids):
+    # The side file's rows for vectors kept in the index, plus the rows just added
+    added = builder.exact_vectors()
+    path = exact_vectors_path_for(vector_store_path)
+    if added is None or rebuilt or not os.path.exists(path):
+        return added
+    previous = ExactVectors(path)
+    ids, vectors = previous.items(exclude=stale_ids)
+    previous.close()
+    if not len(added[0]):
+        return ids, vectors
+    return np.concatenate([ids, added[0]]), np.vstack([vectors, added[1]])
+
@@ -0,0 +1,394 @@
+# core/vector_store_registry.py
+
+# Process-wide registry of open vector stores.
+#
+# Each team's index and chunk store are resolved from its configuration and opened the
+# first time they are queried, not at startup. Open stores are shared by every agent in
+# the process and kept in a least-recently-used list; when their combined size exceeds
+# the memory budget, the least recently used stores are closed.
+#
+# Stores are versioned on disk (see core/store_versions.py): the registry opens the version
+# the store's CURRENT pointer names, and `register` swaps a newly published version in.
+# Requests hold the version they started with through `acquire`/`release`; an old version's
+# directory is removed once it has been replaced and its last reader has released it.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config.constants import SHARED_VECTOR_STORE_PATH, VECTOR_STORE_KEEP_VERSIONS, VECTOR_STORE_MEMORY_BUDGET_MB
+from core.index_factory import apply_search_params
+from core.metrics import MetricSample, get_metrics
+from core.keyword_index import load_keyword_index
+from core.providers import check_embedder
+from core.store_versions import current_vector_store_path, prune_vector_store_versions
+from core.vector_store import (chunk_store_path_for, keyword_index_path_for, load_embedder_record, load_exact_vectors,
+                               load_vector_store, vector_store_version)
+
+VECTOR_STORE_FILENAME = "vector_store.index"
+SHARED_STORE_NAME = "shared"
+
+def resolve_vector_store_path(team_name, config_manager=None):
+    """
+    Resolves where a team's vector store index lives.
+
+    The team's `vector_store.path` setting wins; otherwise the index lives under
+    `teams/<team>/vector_store/`. The pseudo-team 'shared' maps to SHARED_VECTOR_STORE_PATH.
+
+    Parameters:
+    - team_name (str): Name of the team, or 'shared'.
+    - config_manager (ConfigManager, optional): Source of team settings.
+
+    Returns:
+    - str: Path of the team's FAISS index file.
+    """
+    if config_manager is not None:
+        configured_path = (config_manager.get_team_config(team_name).get("vector_store", {}) or {}).get("path")
+        if configured_path:
+            return configured_path
+    if team_name == SHARED_STORE_NAME:
+        return os.path.join(SHARED_VECTOR_STORE_PATH, VECTOR_STORE_FILENAME)
+    return os.path.join("teams", team_name, "vector_store", VECTOR_STORE_FILENAME)
+
+class VectorStoreHandle:
+    def __init__(self, vector_store_path, vector_index, document_chunks, version, keyword_index=None, embedder=None,
+                 exact_vectors=None, version_path=None):
+        """
+        An open vector store: its index, its chunks, its keyword index, and the version they were loaded at.
+
+        Agents should fetch the handle from the registry for each request and use its
+        index and chunks together, so a store replaced mid-request is never mixed with
+        its successor.
+
+        Parameters:
+        - vector_store_path (str): The store's logical index path, as configured.
+        - vector_index (faiss.Index): The index.
+        - document_chunks (ChunkStore, dict or list): The chunks the index refers to.
+        - version (tuple): The store's version, from `vector_store_version`.
+        - keyword_index (KeywordIndex, optional): BM25 index over the same chunks, if one was built.
+        - embedder (dict, optional): The embedder recorded as having built the index.
+        - exact_vectors (ExactVectors, optional): Exact vectors for reranking a compressed index.
+        - version_path (str, optional): Index path of the on-disk version the store was opened
+                                        from; defaults to `vector_store_path`.
+        """
+        self.vector_store_path = vector_store_path
+        self.version_path = version_path or vector_store_path
+        self.vector_index = vector_index
+        self.document_chunks = document_chunks
+        self.version = version
+        self.keyword_index = keyword_index
+        self.embedder = embedder
+        self.exact_vectors = exact_vectors
+        self.size_bytes = _store_size(self.version_path)
+        self.last_used = time.monotonic()
+        self.readers = 0  # Requests holding this handle through `VectorStoreRegistry.acquire`
+
+def _store_size(vector_store_path):
+    """
+    Estimates a store's memory footprint from its index, chunk and keyword files.
+
+    Exact vectors for reranking are left out: only the few rows each search re-scores are
+    paged in, and the page cache can drop them again.
+    """
+    size = 0
+    for path in (vector_store_path, chunk_store_path_for(vector_store_path), keyword_index_path_for(vector_store_path)):
+        if os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+class VectorStoreRegistry:
+    def __init__(self, config_manager=None, memory_budget_mb=None, keep_versions=None):
+        """
+        Initialize an empty registry.
+
+        Parameters:
+        - config_manager (ConfigManager, optional): Used to resolve team store paths and the global
+                                                    `vector_store_registry` memory budget and versions kept.
+        - memory_budget_mb (float, optional): Maximum combined size of open stores, in MB.
+        - keep_versions (int, optional): On-disk versions kept per store, counting the current one.
+        """
+        self.config_manager = config_manager
+        registry_settings = {}
+        if config_manager is not None:
+            registry_settings = config_manager.get_global_setting("vector_store_registry", {}) or {}
+        if memory_budget_mb is None:
+            memory_budget_mb = registry_settings.get("memory_budget_mb")
+        self.memory_budget_bytes = int((memory_budget_mb or VECTOR_STORE_MEMORY_BUDGET_MB) * 1024 * 1024)
+        self.keep_versions = keep_versions or registry_settings.get("keep_versions", VECTOR_STORE_KEEP_VERSIONS)
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+        self._stores = OrderedDict()  # absolute index path -> VectorStoreHandle, least recently used first
+        self._held = {}  # id(handle) -> VectorStoreHandle, for handles with readers
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        get_metrics().register_collector(self.metric_samples)
+
+    def get(self, vector_store_path, index_config=None, embedder=None):
+        """
+        Returns an open vector store, loading it from disk on first use.
+
+        Parameters:
+        - vector_store_path (str): Path of the FAISS index file.
+        - index_config (dict, optional): Configuration whose query-time settings are applied on load.
+        - embedder (dict, optional): The caller's `embedder_identity`, checked against the store's.
+
+        Returns:
+        - VectorStoreHandle or None: The store, or None if it does not exist on disk yet.
+
+        Raises:
+        - ValueError: If the store was built by a different embedder.
+        """
+        handle = self._get(vector_store_path, index_config)
+        if handle is not None and embedder is not None:
+            check_embedder(handle.embedder, embedder, handle.vector_index.d, vector_store_path)
+        return handle
+
+    def acquire(self, vector_store_path, index_config=None, embedder=None):
+        """
+        Returns an open vector store like `get`, and holds it for the caller until `release`.
+
+        A held store's version stays on disk even after a newer version is swapped in, so a
+        request can keep reading the version it started with. Every acquired handle must be
+        released, including when the request fails.
+
+        Raises:
+        - ValueError: If the store was built by a different embedder.
+        """
+        handle = self._get(vector_store_path, index_config, hold=True)
+        if handle is not None and embedder is not None:
+            try:
+                check_embedder(handle.embedder, embedder, handle.vector_index.d, vector_store_path)
+            except ValueError:
+                self.release(handle)
+                raise
+        return handle
+
+    def release(self, handle):
+        """
+        Releases a handle from `acquire`. The last reader of a replaced version removes it from disk.
+        """
+        with self._lock:
+            handle.readers -= 1
+            if handle.readers > 0:
+                return
+            self._held.pop(id(handle), None)
+            replaced = self._stores.get(os.path.abspath(handle.vector_store_path)) is not handle
+        if replaced:
+            self._prune_versions(handle.vector_store_path)
+
+    def _get(self, vector_store_path, index_config, hold=False):
+        key = os.path.abspath(vector_store_path)
+        with self._lock:
+            handle = self._touch(key, hold)
+            if handle is not None:
+                return handle
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other stores stay available; the per-store lock
+        # makes concurrent first queries for the same store share a single load
+        with load_lock:
+            with self._lock:
+                handle = self._touch(key, hold)
+                if handle is not None:
+                    return handle
+            handle = self._load(vector_store_path, index_config)
+            if handle is None:
+                return None
+            with self._lock:
+                self.loads += 1
+                self._insert(key, handle)
+                if hold:
+                    self._hold(handle)
+            return handle
+
+    def get_team(self, team_name, index_config=None, embedder=None):
+        """
+        Returns a team's open vector store, resolving its path from the configuration.
+        """
+        return self.get(resolve_vector_store_path(team_name, self.config_manager), index_config, embedder)
+
+    def register(self, vector_store_path, vector_index, document_chunks, index_config=None):
+        """
+        Installs a freshly built or updated store, replacing any open copy.
+
+        The store is opened from the version its CURRENT pointer names, so a new version must be
+        published first. Requests already holding the previous version finish with it; new
+        requests get this one. Replaced versions nobody holds are removed from disk.
+
+        Returns:
+        - VectorStoreHandle: The handle for the new store.
+        """
+        if index_config is not None:
+            apply_search_params(vector_index, index_config)
+        version_path = current_vector_store_path(vector_store_path)
+        handle = VectorStoreHandle(vector_store_path, vector_index, document_chunks, vector_store_version(version_path),
+                                   load_keyword_index(keyword_index_path_for(version_path)),
+                                   load_embedder_record(version_path),
+                                   load_exact_vectors(version_path, index_config) if index_config else None,
+                                   version_path)
+        with self._lock:
+            replaced = self._stores.get(os.path.abspath(vector_store_path))
+            self._insert(os.path.abspath(vector_store_path), handle)
+            if replaced is not None:
+                self.swaps += 1
+        self._prune_versions(vector_store_path)
+        return handle
+
+    def refresh(self, vector_store_path, index_config=None):
+        """
+        Swaps in the store's current on-disk version if the open copy is older, e.g. after another
+        process published a new version. The new version is loaded before it replaces the old one,
+        so requests never wait for the load.
+
+        Returns:
+        - bool: Whether a newer version was swapped in.
+        """
+        key = os.path.abspath(vector_store_path)
+        with self._lock:
+            handle = self._stores.get(key)
+        if handle is None or os.path.abspath(current_vector_store_path(vector_store_path)) == os.path.abspath(handle.version_path):
+            return False
+        new_handle = self._load(vector_store_path, index_config)
+        if new_handle is None:
+            return False
+        with self._lock:
+            self.loads += 1
+            self.swaps += 1
+            self._insert(key, new_handle)
+        self._prune_versions(vector_store_path)
+        return True
+
+    def evict(self, vector_store_path):
+        """
+        Closes a store if it is open. Requests still holding its handle can finish using it.
+        """
+        with self._lock:
+            self._stores.pop(os.path.abspath(vector_store_path), None)
+
+    def loaded_paths(self):
+        """
+        Returns the paths of the open stores, least recently used first.
+        """
+        with self._lock:
+            return list(self._stores)
+
+    def stats(self):
+        """
+        Returns registry counters.
+
+        Returns:
+        - dict: Open store count, their combined size and the budget in bytes, loads and evictions.
+        """
+        with self._lock:
+            return {
+                "open_stores": len(self._stores),
+                "size_bytes": sum(handle.size_bytes for handle in self._stores.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "swaps": self.swaps,
+                "held_versions": len({handle.version_path for handle in self._held.values()}),
+            }
+
+    def metric_samples(self):
+        """
+        Returns the registry's counters and each open store's size, for the metrics registry.
+        """
+        stats = self.stats()
+        with self._lock:
+            handles = list(self._stores.items())
+        samples = [MetricSample("vector_stores_open", "gauge", {}, stats["open_stores"], "Open vector stores"),
+                   MetricSample("vector_stores_bytes", "gauge", {}, stats["size_bytes"], "Size of the open vector stores"),
+                   MetricSample("vector_store_loads", "counter", {}, stats["loads"], "Vector stores loaded from disk"),
+                   MetricSample("vector_store_evictions", "counter", {}, stats["evictions"], "Vector stores closed for memory"),
+                   MetricSample("vector_store_swaps", "counter", {}, stats["swaps"], "New vector store versions swapped in"),
+                   MetricSample("vector_store_held_versions", "gauge", {}, stats["held_versions"],
+                                "Vector store versions held by in-flight requests")]
+        for path, handle in handles:
+            samples += [MetricSample("vector_store_vectors", "gauge", {"path": path}, handle.vector_index.ntotal,
+                                     "Vectors in each open store"),
+                        MetricSample("vector_store_file_bytes", "gauge", {"path": path}, handle.size_bytes,
+                                     "Index, chunk and keyword file size of each open store")]
+        return samples
+
+    def _touch(self, key, hold=False):
+        handle = self._stores.get(key)
+        if handle is not None:
+            self._stores.move_to_end(key)
+            handle.last_used = time.monotonic()
+            if hold:
+                self._hold(handle)
+        return handle
+
+    def _hold(self, handle):
+        handle.readers += 1
+        self._held[id(handle)] = handle
+
+    def _prune_versions(self, vector_store_path):
+        key = os.path.abspath(vector_store_path)
+        with self._lock:
+            in_use = [handle.version_path for handle in list(self._stores.values()) + list(self._held.values())
+                      if os.path.abspath(handle.vector_store_path) == key]
+        for name in prune_vector_store_versions(vector_store_path, self.keep_versions, in_use):
+            print(f"Removed vector store version {name} of {vector_store_path}.")
+
+    def _insert(self, key, handle):
+        self._stores[key] = handle
+        self._stores.move_to_end(key)
+        # Evict least recently used stores until within budget, but always keep the newest one
+        total = sum(open_handle.size_bytes for open_handle in self._stores.values())
+        while total > self.memory_budget_bytes and len(self._stores) > 1:
+            evicted_key, evicted = self._stores.popitem(last=False)
+            total -= evicted.size_bytes
+            self.evictions += 1
+            print(f"Evicted vector store {evicted_key} to stay within the memory budget.")
+
+    def _load(self, vector_store_path, index_config):
+        version_path = current_vector_store_path(vector_store_path)
+        document_chunks_path = chunk_store_path_for(version_path)
+        legacy_chunks_path = version_path + "_chunks.pkl"  # Pickled chunks from older builds
+        if not os.path.exists(document_chunks_path) and os.path.exists(legacy_chunks_path):
+            document_chunks_path = legacy_chunks_path
+
+        vector_index, document_chunks = load_vector_store(version_path, document_chunks_path)
+        if vector_index is None or not document_chunks:
+            return None
+        if index_config is not None:
+            apply_search_params(vector_index, index_config)
+        return VectorStoreHandle(vector_store_path, vector_index, document_chunks, vector_store_version(version_path),
+                                 load_keyword_index(keyword_index_path_for(version_path)),
+                                 load_embedder_record(version_path),
+                                 load_exact_vectors(version_path, index_config) if index_config else None,
+                                 version_path)
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+def get_default_registry(config_manager=None):
+    """
+    Returns the registry shared by every agent in the process, creating it on first use.
+
+    Parameters:
+    - config_manager (ConfigManager, optional): Configuration for the registry when it is created.
+
+    Returns:
+    - VectorStoreRegistry: The shared registry.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = VectorStoreRegistry(config_manager)
+        return _default_registry
+
+# Example usage:
+# registry = get_default_registry(config_manager)
+# handle = registry.get_team('intel_vpro', resolve_index_config(config_manager, 'intel_vpro'))
+# if handle:
+#     hits = search_vector_store(query_embedding, handle.vector_index, handle.document_chunks)
+# handle = registry.acquire(vector_store_path)  # Holds this version for the whole request
+# try:
+#     hits = search_vector_store(query_embedding, handle.vector_index, handle.document_chunks)
+# finally:
+#     registry.release(handle)
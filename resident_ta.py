@@ -1,10 +1,14 @@
 
-import os
+import argparse
 import os
 from agents.troubleshooting_agent import VProTroubleshootingAgent
+from core.background_indexer import BackgroundIndexer
+from core.chunk_store import SECURITY_LEVELS
 from core.config_manager import ConfigManager
-from core.session_manager import SessionManager
-from core.pdf_tools import extract_text_from_pdfs
+from core.providers import resolve_providers, uses_openai
+from core.session_manager import create_session_manager
+from core.store_versions import current_vector_store_path
+from core.vector_store_registry import resolve_vector_store_path
 from config.constants import DEFAULT_SECURITY_LEVEL
 
 def clear_screen():
@@ -12,46 +16,80 @@ def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
 def main():
+    parser = argparse.ArgumentParser(description="Interactive vPro troubleshooting assistant.")
+    parser.add_argument("--clearance", choices=SECURITY_LEVELS, default=None,
+                        help="Security level of the user at this terminal (default: access_control.default_clearance).")
+    args = parser.parse_args()
+
     clear_screen()
-    # Fetch OpenAI API key from environment
+    config_manager = ConfigManager('config/team_config.yaml')
+    clearance = args.clearance or (config_manager.get_global_setting('access_control', {}) or {}).get(
+        'default_clearance') or DEFAULT_SECURITY_LEVEL
+
+    # Fetch OpenAI API key from environment; teams on local providers run without one
     openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        raise EnvironmentError("OPENAI_API_KEY not found in environment variables.")
-    
-    print("OpenAI API Key successfully retrieved.")
+    if uses_openai(resolve_providers(config_manager, 'intel_vpro')):
+        if not openai_api_key:
+            raise EnvironmentError("OPENAI_API_KEY not found in environment variables.")
+        print("OpenAI API Key successfully retrieved.")
 
-    config_manager = ConfigManager('config/team_config.yaml')
-    session_manager = SessionManager()
+    # Conversation history is kept per session and, with the sqlite backend, survives restarts
+    session_manager = create_session_manager(config_manager)
+    session_id = "resident_ta"
+
+    # Only documents this terminal's user may read are embedded. A public-only index is kept
+    # apart from the team store, which the server and background indexer build from every
+    # document, so the two never undo each other's updates.
+    if clearance == "confidential":
+        pdf_folder_path = "teams/intel_vpro/reference_materials"
+        vector_store_path = None
+    else:
+        pdf_folder_path = "teams/intel_vpro/reference_materials/public"
+        root, extension = os.path.splitext(resolve_vector_store_path("intel_vpro", config_manager))
+        vector_store_path = f"{root}_public{extension}"
 
     # Initialize VProTroubleshootingAgent with the generic agent structure
     vpro_agent = VProTroubleshootingAgent(
         openai_api_key=openai_api_key,
         config_manager=config_manager,
-        session_manager=session_manager
+        session_manager=session_manager,
+        vector_store_path=vector_store_path
     )
-    
-    # Option to rebuild vector store on demand
-    regenerate = input("Would you like to regenerate the vector store? (yes/no): ").strip().lower()
-    force_rebuild = regenerate == 'yes'
-    
-    pdf_folder_path = "teams/intel_vpro/reference_materials/public"
-    documents = extract_text_from_pdfs(pdf_folder_path)
-    
-    # Initialize (load or build) vector store based on user input
-    vpro_agent.initialize_vector_store(documents, force_rebuild=force_rebuild)
+
+    # Only a first build, with nothing to serve yet, happens before the prompt
+    if not os.path.exists(current_vector_store_path(vpro_agent.vector_store_path)):
+        vpro_agent.update_vector_store(pdf_folder_path)
+
+    # Added, changed or removed PDFs are embedded in the background and the new index is swapped
+    # in between queries; the existing store keeps answering meanwhile
+    indexer = BackgroundIndexer(config_manager)
+    indexer.watch(vpro_agent, pdf_folder_path)
+    indexer.start()
+
+    # Open the store and load the tokenizer and clients while the user types the first query
+    vpro_agent.prewarm()
 
     print("\nVector store ready.")
     print("\n--- Start Interaction ---")
-    print("Type 'exit' to end the conversation.\n")
+    print("Type 'rebuild' to rebuild the vector store in the background, 'exit' to end the conversation.\n")
     
     while True:
         user_query = input("Enter your troubleshooting query: ")
         if user_query.lower() == "exit":
             print("Ending interaction.")
+            indexer.stop(timeout=1)
             break
+        if user_query.strip().lower() == "rebuild":
+            indexer.request_rebuild(vpro_agent)
+            print("Rebuilding the vector store in the background; answers come from the current one until it is done.")
+            continue
         
-        response = vpro_agent.handle_request(user_query)
-        print("Troubleshooting Response:", response)
+        # Print the response as it is generated rather than after the whole completion
+        print("Troubleshooting Response: ", end="", flush=True)
+        for token in vpro_agent.stream_request(user_query, clearance=clearance, session_id=session_id):
+            print(token, end="", flush=True)
+        print()
 
 # Run the main function
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
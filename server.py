@@ -0,0 +1,358 @@
+# server.py
+
+# HTTP entry point: an ASGI application serving OperatorAgent routing and the team
+# agents to many users at once.
+#
+# Run it with any ASGI server, e.g.
+#   uvicorn server:create_app --factory --host 0.0.0.0 --port 8000 --workers 4
+# or `python server.py --workers 4`. Each worker process opens the vector stores once at
+# startup; indexes and chunk stores are memory-mapped, so every worker shares one copy in
+# the page cache. Requests beyond `max_in_flight` wait in a bounded queue; once that is
+# full the server answers 429 with a Retry-After header rather than queueing without limit.
+# Workers don't rebuild stores themselves: run `python -m core.background_indexer` (or
+# resident_ta.py) alongside, and each worker swaps in the versions it publishes.
+#
+# Endpoints:
+#   GET  /health                  Readiness, queue depth and open vector stores
+#   GET  /metrics                 Stage latency histograms, cache hit rates, token counts and
+#                                 index sizes in the Prometheus text format (/metrics.json for JSON)
+#   POST /route                   {"type", "content", "session_id", "security_level"} via OperatorAgent;
+#                                 without a "type", the intent router picks the agent
+#   POST /agents/<name>/query     {"query", "session_id"} answered by one agent; with
+#                                 `metrics.allow_profiling`, "profile": "cprofile" or "tracemalloc"
+#                                 writes a profile of the request
+#   POST /agents/<name>/stream    Same, streamed as plain text while it is generated
+#
+# A "session_id" is a bearer secret: the request gets that session's clearance. Whatever
+# authenticates users should create their sessions with SessionManager.create_session(),
+# which issues random IDs, and the server should only be reachable over TLS. Requests without
+# a session (or with a short, guessable ID) get `access_control.default_clearance`.
+#
+# Set RESIDENT_TA_FAKE_OPENAI=1 to serve from the offline fake OpenAI client (no API key needed),
+# or pick local embedding and completion backends with the `providers` setting.
+
+import argparse
+import asyncio
+import json
+import os
+
+from agents.operator import OperatorAgent
+from agents.troubleshooting_agent import VProTroubleshootingAgent
+from config.constants import SERVER_MAX_BODY_BYTES, SERVER_MAX_IN_FLIGHT, SERVER_MAX_QUEUED, SERVER_RETRY_AFTER_SECONDS
+from core.background_indexer import BackgroundIndexer
+from core.config_manager import ConfigManager
+from core.generic_agent import GenericAgent
+from core.metrics import MetricSample, configure_metrics, get_metrics
+from core.openai_clients import ConcurrencyLimiter
+from core.providers import resolve_providers, uses_openai
+from core.session_manager import create_session_manager
+
+class ResidentTAServer:
+    def __init__(self, operator_agent, agents, max_in_flight=SERVER_MAX_IN_FLIGHT, max_queued=SERVER_MAX_QUEUED,
+                 retry_after_seconds=SERVER_RETRY_AFTER_SECONDS, allow_profiling=False, metrics=None, indexer=None):
+        """
+        Initialize the ASGI application.
+
+        Parameters:
+        - operator_agent (OperatorAgent): Routes /route requests and decides users' clearance.
+        - agents (dict): {name: GenericAgent} served under /agents/<name>/.
+        - max_in_flight (int): Requests processed at once.
+        - max_queued (int): Requests allowed to wait for a slot; further requests get 429.
+        - retry_after_seconds (int): Retry-After value sent with 429 responses.
+        - allow_profiling (bool): Whether query requests may ask for a profile.
+        - metrics (MetricsRegistry, optional): Registry served at /metrics; defaults to the process-wide one.
+        - indexer (BackgroundIndexer, optional): Started with the server to swap in new store versions.
+        """
+        self.operator_agent = operator_agent
+        self.agents = agents
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.retry_after_seconds = retry_after_seconds
+        self.ready = False
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.allow_profiling = allow_profiling
+        self.indexer = indexer
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.metrics.register_collector(self.metric_samples)
+        self._limiter = ConcurrencyLimiter(max_in_flight)
+
+    async def startup(self):
+        """
+        Opens every agent's vector store, so the first requests don't pay for loading them.
+        """
+        for agent in self.agents.values():
+            if isinstance(agent, GenericAgent):
+                await asyncio.to_thread(agent.get_vector_store)
+        if self.indexer is not None:
+            self.indexer.start()
+        self.ready = True
+
+    async def shutdown(self):
+        """
+        Stops the background indexer, letting a store swap in progress finish.
+        """
+        if self.indexer is not None:
+            await asyncio.to_thread(self.indexer.stop)
+
+    def health(self):
+        """
+        Returns the server's readiness and load.
+
+        Returns:
+        - dict: 'status', the in-flight, queued, rejected and completed request counts,
+          the vector store registry's stats and the background indexer's status.
+        """
+        registries = {id(agent.vector_store_registry): agent.vector_store_registry
+                      for agent in self.agents.values() if isinstance(agent, GenericAgent)}
+        return {
+            "status": "ok" if self.ready else "starting",
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "vector_stores": [registry.stats() for registry in registries.values()],
+            "intent_router": self.operator_agent.intent_router.stats() if self.operator_agent.intent_router else None,
+            "indexer": self.indexer.status() if self.indexer is not None else None,
+        }
+
+    def metric_samples(self):
+        """
+        Returns the server's load figures for the metrics registry.
+        """
+        return [MetricSample("server_in_flight", "gauge", {}, self.in_flight, "Requests being processed"),
+                MetricSample("server_queued", "gauge", {}, self.queued, "Requests waiting for a slot"),
+                MetricSample("server_rejected", "counter", {}, self.rejected, "Requests refused with 429"),
+                MetricSample("server_completed", "counter", {}, self.completed, "Requests completed")]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"].rstrip("/")
+        if path == "/health" and method == "GET":
+            await _send_json(send, 200 if self.ready else 503, self.health())
+            return
+        if path == "/metrics" and method == "GET":
+            body = self.metrics.render_prometheus().encode("utf-8")
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        if path == "/metrics.json" and method == "GET":
+            await _send_json(send, 200, self.metrics.to_dict())
+            return
+        if method != "POST":
+            await _send_json(send, 404, {"error": "Not found."})
+            return
+
+        if path == "/route":
+            handler = self._route
+        elif path.startswith("/agents/") and path.count("/") == 3:
+            _, _, agent_name, action = path.split("/")
+            agent = self.agents.get(agent_name)
+            if agent is None or action not in ("query", "stream"):
+                await _send_json(send, 404, {"error": "Not found."})
+                return
+            handler = self._query_agent(agent, stream=action == "stream")
+        else:
+            await _send_json(send, 404, {"error": "Not found."})
+            return
+
+        body, error = await _read_json(receive)
+        if error:
+            await _send_json(send, error[0], {"error": error[1]})
+            return
+
+        # Backpressure: refuse new work once the queue in front of the in-flight slots is full
+        if self.in_flight + self.queued >= self.max_in_flight + self.max_queued:
+            self.rejected += 1
+            await _send_json(send, 429, {"error": "Server is busy; retry later."},
+                             headers=[(b"retry-after", str(self.retry_after_seconds).encode())])
+            return
+
+        response_started = False
+
+        async def tracked_send(message):
+            nonlocal response_started
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        self.queued += 1
+        try:
+            async with self._limiter.slot():
+                self.queued -= 1
+                self.in_flight += 1
+                try:
+                    await handler(body, tracked_send)
+                    self.completed += 1
+                finally:
+                    self.in_flight -= 1
+        except Exception as e:
+            print(f"Error handling {path}: {e}")
+            if not response_started:
+                await _send_json(send, 500, {"error": "Internal server error."})
+
+    async def _route(self, body, send):
+        content = body.get("content")
+        if not isinstance(content, str) or not content.strip():
+            await _send_json(send, 400, {"error": "'content' must be a non-empty string."})
+            return
+        if not isinstance(body.get("type"), (str, type(None))):
+            await _send_json(send, 400, {"error": "'type' must be a string."})
+            return
+        response, decision = await self.operator_agent.route_request_async(body, return_route=True)
+        # Untyped requests report which router stage picked the agent
+        route = {"agent": decision.route, "path": decision.path} if decision else None
+        await _send_json(send, 200, {"response": response, "route": route})
+
+    def _query_agent(self, agent, stream):
+        async def handle(body, send):
+            query = body.get("query")
+            if not isinstance(query, str) or not query.strip():
+                await _send_json(send, 400, {"error": "'query' must be a non-empty string."})
+                return
+            session_id = body.get("session_id")
+            # Clearance comes from the session the ID names, not from a level in the body;
+            # the ID is a bearer secret, so anyone holding it gets that session's clearance
+            clearance = self.operator_agent.clearance_for({"session_id": session_id})
+            profile = body.get("profile") if self.allow_profiling else None
+            if profile not in (None, "cprofile", "tracemalloc"):
+                await _send_json(send, 400, {"error": "'profile' must be 'cprofile' or 'tracemalloc'."})
+                return
+            if not stream:
+                response = await agent.handle_request_async(query, clearance=clearance, session_id=session_id,
+                                                            profile=profile)
+                await _send_json(send, 200, {"response": response})
+                return
+
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+            async for token in agent.stream_request_async(query, clearance=clearance, session_id=session_id):
+                await send({"type": "http.response.body", "body": token.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        return handle
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+async def _read_json(receive):
+    """
+    Reads a request body as a JSON object.
+
+    Returns:
+    - (dict, None) on success, or (None, (status, message)) on failure.
+    """
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None, (400, "Client disconnected.")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > SERVER_MAX_BODY_BYTES:
+            return None, (413, "Request body too large.")
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    try:
+        body = json.loads(b"".join(chunks) or b"{}")
+    except ValueError:
+        return None, (400, "Request body must be JSON.")
+    if not isinstance(body, dict):
+        return None, (400, "Request body must be a JSON object.")
+    return body, None
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+                           + list(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+def create_app(config_path="config/team_config.yaml", fake_openai=None):
+    """
+    Builds the server from the configuration; the factory for `uvicorn --factory`.
+
+    Parameters:
+    - config_path (str): Path of the team configuration file.
+    - fake_openai (bool, optional): Serve from the offline fake OpenAI client. Defaults to the
+                                    RESIDENT_TA_FAKE_OPENAI environment variable.
+
+    Returns:
+    - ResidentTAServer: The ASGI application.
+    """
+    if fake_openai is None:
+        fake_openai = os.getenv("RESIDENT_TA_FAKE_OPENAI") == "1"
+    client, async_client = None, None
+    if fake_openai:
+        from core.fake_openai import FakeAsyncOpenAIClient, FakeOpenAIClient
+        client, async_client = FakeOpenAIClient(), FakeAsyncOpenAIClient()
+    config_manager = ConfigManager(config_path)
+    configure_metrics(config_manager)
+    openai_api_key = os.getenv("OPENAI_API_KEY") or ("fake" if fake_openai else None)
+    # Local providers (the `providers` setting) need no API key
+    needs_key = any(uses_openai(resolve_providers(config_manager, team)) for team in (None, 'intel_vpro'))
+    if not openai_api_key and needs_key:
+        raise EnvironmentError("OPENAI_API_KEY not found in environment variables.")
+
+    session_manager = create_session_manager(config_manager)
+    operator_agent = OperatorAgent(openai_api_key, config_manager=config_manager, session_manager=session_manager,
+                                   client=client, async_client=async_client)
+    vpro_agent = VProTroubleshootingAgent(openai_api_key, config_manager=config_manager, session_manager=session_manager,
+                                          client=client, async_client=async_client)
+    operator_agent.register_agent('vPRO_Troubleshooting', vpro_agent)
+
+    # Several workers serve the same stores, so they only swap in versions another process builds
+    indexer = BackgroundIndexer(config_manager, build=False)
+    indexer.watch(vpro_agent)
+
+    settings = config_manager.get_global_setting("server", {}) or {}
+    return ResidentTAServer(
+        operator_agent,
+        {"intel_vpro": vpro_agent},
+        max_in_flight=settings.get("max_in_flight", SERVER_MAX_IN_FLIGHT),
+        max_queued=settings.get("max_queued", SERVER_MAX_QUEUED),
+        retry_after_seconds=settings.get("retry_after_seconds", SERVER_RETRY_AFTER_SECONDS),
+        allow_profiling=(config_manager.get_global_setting("metrics", {}) or {}).get("allow_profiling", False),
+        indexer=indexer,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the assistant over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes; they share the memory-mapped indexes.")
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is required to run the server: pip install uvicorn")
+    uvicorn.run("server:create_app", factory=True, host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
+
+# Example usage:
+# $ uvicorn server:create_app --factory --workers 4
+# $ curl -X POST localhost:8000/agents/intel_vpro/query -d '{"query": "AMT provisioning fails", "session_id": "<id from create_session>"}'
+# $ curl localhost:8000/health
+# $ curl localhost:8000/metrics
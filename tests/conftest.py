@@ -0,0 +1,42 @@
+# tests/conftest.py
+
+# Shared fixtures. Every test runs offline: embeddings come from the local hashing embedder
+# and tokens are counted with the local tokenizer, so no API key or download is needed.
+
+import os
+
+import pytest
+
+from core.index_factory import resolve_index_config
+from core.providers import create_client, embedder_identity
+from core.vector_store import chunk_store_path_for, update_vector_store
+
+LOCAL_DIMENSION = 64
+LOCAL_PROVIDERS = {"embeddings": {"type": "local_hashing", "model": f"local_hashing-{LOCAL_DIMENSION}", "dimension": LOCAL_DIMENSION},
+                   "completions": {"type": "fake", "model": "fake-chat"}}
+LOCAL_MODEL = LOCAL_PROVIDERS["embeddings"]["model"]
+
+def write_pdf(path, pages):
+    """
+    Writes a PDF with one page per text.
+    """
+    import fitz
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pdf = fitz.open()
+    for text in pages:
+        pdf.new_page().insert_textbox(fitz.Rect(36, 36, 576, 806), text, fontsize=10)
+    pdf.save(path)
+    pdf.close()
+
+def update_store(folder_path, vector_store_path, client, **kwargs):
+    """
+    Runs `update_vector_store` with the local embedder and the default index settings.
+    """
+    return update_vector_store(folder_path, vector_store_path, chunk_store_path_for(vector_store_path), None,
+                               model=LOCAL_MODEL, client=client, index_config=resolve_index_config(),
+                               embedder=embedder_identity(LOCAL_PROVIDERS), **kwargs)
+
+@pytest.fixture
+def local_client():
+    return create_client(LOCAL_PROVIDERS)
@@ -0,0 +1,88 @@
+import json
+import os
+
+from core.index_factory import resolve_index_config
+from core.keyword_index import load_keyword_index
+from core.providers import embedder_identity
+from core.vector_store import (chunk_store_path_for, is_vector_store_current, keyword_index_path_for, load_vector_store,
+                               manifest_path_for, search_keyword_index)
+from tests.conftest import LOCAL_PROVIDERS, update_store, write_pdf
+
+def rewrite_pdf(path, pages):
+    previous = os.stat(path).st_mtime_ns
+    write_pdf(path, pages)
+    os.utime(path, ns=(previous + 10 ** 9, previous + 10 ** 9))  # A visibly newer mtime on coarse filesystems
+
+def file_chunk_ids(vector_store_path):
+    with open(manifest_path_for(vector_store_path)) as file:
+        return {key: entry["chunk_ids"] for key, entry in json.load(file)["files"].items()}
+
+def keyword_hits(vector_store_path, query):
+    _, document_chunks = load_vector_store(vector_store_path, chunk_store_path_for(vector_store_path))
+    keyword_index = load_keyword_index(keyword_index_path_for(vector_store_path))
+    hits = [chunk_id for chunk_id, _, _ in search_keyword_index(query, keyword_index, document_chunks)]
+    document_chunks.close()
+    return hits
+
+def is_current(folder, vector_store_path):
+    return is_vector_store_current(str(folder), vector_store_path, chunk_store_path_for(vector_store_path),
+                                   resolve_index_config(), embedder_identity(LOCAL_PROVIDERS))
+
+def test_update_embeds_only_changes_and_removes_stale_chunks(tmp_path, local_client):
+    folder = tmp_path / "docs"
+    write_pdf(str(folder / "amt.pdf"), ["AMT provisioning needs a valid certificate."])
+    write_pdf(str(folder / "kvm.pdf"), ["The remote KVM session drops after a timeout."])
+    write_pdf(str(folder / "wol.pdf"), ["Wake on LAN requires the network stack in the BIOS."])
+    vector_store_path = str(tmp_path / "vector_store.index")
+
+    vector_index, _, changes = update_store(str(folder), vector_store_path, local_client)
+    assert sorted(changes["added"]) == ["amt.pdf", "kvm.pdf", "wol.pdf"]
+    assert vector_index.ntotal == 3
+    before = file_chunk_ids(vector_store_path)
+    assert is_current(folder, vector_store_path)
+
+    rewrite_pdf(str(folder / "kvm.pdf"), ["The remote KVM session needs user consent first."])
+    os.remove(folder / "wol.pdf")
+    write_pdf(str(folder / "mebx.pdf"), ["Reset the MEBx password with Ctrl+P."])
+    assert not is_current(folder, vector_store_path)
+
+    vector_index, document_chunks, changes = update_store(str(folder), vector_store_path, local_client)
+    assert changes["added"] == ["mebx.pdf"]
+    assert changes["changed"] == ["kvm.pdf"]
+    assert changes["removed"] == ["wol.pdf"]
+    assert changes["unchanged"] == ["amt.pdf"]
+    after = file_chunk_ids(vector_store_path)
+    assert after["amt.pdf"] == before["amt.pdf"]  # Unchanged files keep their chunk IDs
+    assert not set(after["kvm.pdf"]) & set(before["kvm.pdf"])  # Changed files get new ones
+    assert "wol.pdf" not in after
+    assert vector_index.ntotal == 3
+    assert sorted(document_chunks.ids.tolist()) == sorted(id for ids in after.values() for id in ids)
+    document_chunks.close()
+
+    # Removed and replaced text is gone from the keyword index too
+    assert keyword_hits(vector_store_path, "Wake LAN") == []
+    assert keyword_hits(vector_store_path, "timeout") == []
+    assert keyword_hits(vector_store_path, "consent") == after["kvm.pdf"]
+    assert is_current(folder, vector_store_path)
+
+def test_update_without_changes_leaves_the_store_alone(tmp_path, local_client):
+    folder = tmp_path / "docs"
+    write_pdf(str(folder / "amt.pdf"), ["AMT provisioning needs a valid certificate."])
+    vector_store_path = str(tmp_path / "vector_store.index")
+    update_store(str(folder), vector_store_path, local_client)
+    mtime = os.stat(vector_store_path).st_mtime_ns
+
+    _, _, changes = update_store(str(folder), vector_store_path, local_client)
+    assert changes["unchanged"] == ["amt.pdf"]
+    assert not (changes["added"] or changes["changed"] or changes["removed"])
+    assert os.stat(vector_store_path).st_mtime_ns == mtime
+
+def test_changed_chunk_settings_rebuild_the_store(tmp_path, local_client):
+    folder = tmp_path / "docs"
+    write_pdf(str(folder / "amt.pdf"), ["AMT provisioning needs a valid certificate."])
+    vector_store_path = str(tmp_path / "vector_store.index")
+    update_store(str(folder), vector_store_path, local_client)
+
+    index_config = resolve_index_config(overrides={"chunk_max_tokens": 200})
+    assert not is_vector_store_current(str(folder), vector_store_path, chunk_store_path_for(vector_store_path),
+                                       index_config, embedder_identity(LOCAL_PROVIDERS))
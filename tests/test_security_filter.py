@@ -0,0 +1,59 @@
+import pytest
+
+from core.embeddings import embed_query
+from core.keyword_index import load_keyword_index
+from core.providers import create_client
+from core.vector_store import (chunk_store_path_for, keyword_index_path_for, load_vector_store, search_keyword_index,
+                               search_vector_store)
+from tests.conftest import LOCAL_MODEL, LOCAL_PROVIDERS, update_store, write_pdf
+
+PUBLIC_TEXT = "Reset the MEBx password from the boot menu by pressing Ctrl+P during startup."
+CONFIDENTIAL_TEXT = "Unreleased firmware build 42 fixes the AMT provisioning certificate rollover defect."
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("security")
+    folder = directory / "reference_materials"
+    write_pdf(str(folder / "public" / "mebx.pdf"), [PUBLIC_TEXT])
+    write_pdf(str(folder / "confidential" / "firmware.pdf"), [CONFIDENTIAL_TEXT])
+    vector_store_path = str(directory / "store" / "vector_store.index")
+    (directory / "store").mkdir()
+    client = create_client(LOCAL_PROVIDERS)
+    update_store(str(folder), vector_store_path, client, team_name="intel_vpro")
+    vector_index, document_chunks = load_vector_store(vector_store_path, chunk_store_path_for(vector_store_path))
+    yield vector_store_path, vector_index, document_chunks, client
+    document_chunks.close()
+
+def vector_texts(store, query, **kwargs):
+    _, vector_index, document_chunks, client = store
+    query_embedding = embed_query(query, client, model=LOCAL_MODEL)
+    return [text for _, text, _ in search_vector_store(query_embedding, vector_index, document_chunks, top_k=5, **kwargs)]
+
+def test_public_clearance_never_sees_confidential_chunks(store):
+    texts = vector_texts(store, CONFIDENTIAL_TEXT, clearance="public", team="intel_vpro")
+    assert texts == [PUBLIC_TEXT]
+
+def test_confidential_clearance_sees_its_own_team_chunks(store):
+    texts = vector_texts(store, CONFIDENTIAL_TEXT, clearance="confidential", team="intel_vpro")
+    assert texts[0] == CONFIDENTIAL_TEXT
+    assert PUBLIC_TEXT in texts
+
+def test_confidential_chunks_of_other_teams_are_hidden(store):
+    assert vector_texts(store, CONFIDENTIAL_TEXT, clearance="confidential", team="wifi") == [PUBLIC_TEXT]
+
+def test_unknown_clearance_is_rejected(store):
+    with pytest.raises(ValueError):
+        vector_texts(store, PUBLIC_TEXT, clearance="secret")
+
+def keyword_texts(store, query, **kwargs):
+    vector_store_path, _, document_chunks, _ = store
+    keyword_index = load_keyword_index(keyword_index_path_for(vector_store_path))
+    return [text for _, text, _ in search_keyword_index(query, keyword_index, document_chunks, **kwargs)]
+
+def test_keyword_search_filters_by_clearance(store):
+    assert keyword_texts(store, "firmware rollover", clearance="public", team="intel_vpro") == []
+    assert keyword_texts(store, "firmware rollover", clearance="confidential", team="intel_vpro") == [CONFIDENTIAL_TEXT]
+    assert keyword_texts(store, "firmware rollover", clearance="confidential", team="wifi") == []
+
+def test_keyword_search_still_finds_public_chunks(store):
+    assert keyword_texts(store, "MEBx password", clearance="public") == [PUBLIC_TEXT]
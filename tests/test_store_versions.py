@@ -0,0 +1,92 @@
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+from core.store_versions import (current_vector_store_path, current_version_name, discard_vector_store_version,
+                                 new_vector_store_version, prune_vector_store_versions, publish_vector_store_version,
+                                 vector_store_build_lock, versions_path_for)
+from core.vector_store import chunk_store_path_for
+from tests.conftest import update_store, write_pdf
+
+def build_version(vector_store_path, folder, client, seed=True):
+    with vector_store_build_lock(vector_store_path, timeout=0):
+        seed_path = current_vector_store_path(vector_store_path) if seed and current_version_name(vector_store_path) else None
+        version_path = new_vector_store_version(vector_store_path, seed_path=seed_path)
+        update_store(str(folder), version_path, client)
+        publish_vector_store_version(vector_store_path, version_path)
+    return version_path
+
+@pytest.fixture
+def layout(tmp_path):
+    folder = tmp_path / "docs"
+    write_pdf(str(folder / "amt.pdf"), ["AMT provisioning needs a valid certificate."])
+    return folder, str(tmp_path / "store" / "vector_store.index")
+
+def test_unversioned_store_resolves_to_its_own_path(layout):
+    _, vector_store_path = layout
+    assert current_version_name(vector_store_path) is None
+    assert current_vector_store_path(vector_store_path) == vector_store_path
+
+def test_publish_points_current_at_the_new_version(layout, local_client):
+    folder, vector_store_path = layout
+    first = build_version(vector_store_path, folder, local_client)
+    assert current_version_name(vector_store_path) == "000001"
+    assert current_vector_store_path(vector_store_path) == first
+    assert os.path.exists(first) and os.path.exists(chunk_store_path_for(first))
+
+    write_pdf(str(folder / "kvm.pdf"), ["The remote KVM session drops after a timeout."])
+    second = build_version(vector_store_path, folder, local_client)
+    assert current_version_name(vector_store_path) == "000002"
+    assert current_vector_store_path(vector_store_path) == second
+    assert os.path.exists(first)  # The previous version stays readable until pruned
+    assert not os.path.exists(os.path.join(versions_path_for(vector_store_path), "CURRENT.tmp"))
+
+def test_new_version_is_seeded_with_links_to_the_current_one(layout, local_client):
+    folder, vector_store_path = layout
+    first = build_version(vector_store_path, folder, local_client)
+    with vector_store_build_lock(vector_store_path, timeout=0):
+        seeded = new_vector_store_version(vector_store_path, seed_path=first)
+        assert os.path.samefile(chunk_store_path_for(seeded), chunk_store_path_for(first))
+        discard_vector_store_version(seeded)
+    assert not os.path.exists(os.path.dirname(seeded))
+    assert current_vector_store_path(vector_store_path) == first
+
+def test_interrupted_versions_are_replaced(layout, local_client):
+    folder, vector_store_path = layout
+    build_version(vector_store_path, folder, local_client)
+    with vector_store_build_lock(vector_store_path, timeout=0):
+        abandoned = new_vector_store_version(vector_store_path)  # Never published
+    second = build_version(vector_store_path, folder, local_client, seed=False)
+    assert os.path.dirname(second) == os.path.dirname(abandoned)  # Its number is reused
+    assert current_version_name(vector_store_path) == "000002"
+
+def test_prune_keeps_the_newest_versions_and_those_in_use(layout, local_client):
+    folder, vector_store_path = layout
+    paths = [build_version(vector_store_path, folder, local_client, seed=False) for _ in range(4)]
+    assert prune_vector_store_versions(vector_store_path, keep=2, in_use=[paths[0]]) == ["000002"]
+    assert [os.path.exists(path) for path in paths] == [True, False, True, True]
+    assert prune_vector_store_versions(vector_store_path, keep=1) == ["000001", "000003"]
+    assert current_vector_store_path(vector_store_path) == paths[3]
+    assert os.path.exists(paths[3])
+
+def test_build_lock_excludes_a_second_builder(layout):
+    _, vector_store_path = layout
+    with vector_store_build_lock(vector_store_path, timeout=0):
+        with pytest.raises(TimeoutError):
+            with vector_store_build_lock(vector_store_path, timeout=0):
+                pass
+    with vector_store_build_lock(vector_store_path, timeout=0):
+        pass  # Released on exit
+
+def test_build_lock_left_by_a_dead_process_is_taken_over(layout):
+    _, vector_store_path = layout
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    os.makedirs(versions_path_for(vector_store_path))
+    with open(os.path.join(versions_path_for(vector_store_path), "BUILD.lock"), 'w') as file:
+        file.write(f"{socket.gethostname()} {process.pid}\n")
+    with vector_store_build_lock(vector_store_path, timeout=0):
+        pass
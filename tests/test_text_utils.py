@@ -0,0 +1,75 @@
+import pytest
+
+from core.text_utils import LocalEncoding, chunk_text, chunk_text_with_offsets, count_tokens, truncate_to_tokens
+from tests.conftest import LOCAL_MODEL
+
+def make_document(sections=6, paragraphs=4):
+    parts = []
+    for section in range(sections):
+        parts.append(f"# Section {section}\n")
+        for paragraph in range(paragraphs):
+            parts.append(" ".join(f"Sentence {section}.{paragraph}.{n} about AMT provisioning and MEBx setup."
+                                  for n in range(5)) + "\n\n")
+    return "".join(parts)
+
+@pytest.mark.parametrize("max_tokens", [40, 120, 1000])
+def test_chunks_stay_within_max_tokens(max_tokens):
+    text = make_document()
+    chunks = chunk_text_with_offsets(text, max_tokens=max_tokens, model=LOCAL_MODEL)
+    assert chunks
+    for chunk in chunks:
+        assert chunk.token_end - chunk.token_start <= max_tokens
+        assert count_tokens(chunk.text, LOCAL_MODEL) <= max_tokens
+
+def test_offsets_point_into_the_original_text():
+    text = make_document()
+    chunks = chunk_text_with_offsets(text, max_tokens=60, model=LOCAL_MODEL)
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk.text
+    # Without overlap, consecutive chunks share their token boundary and cover the whole text
+    assert chunks[0].token_start == 0
+    assert chunks[-1].token_end == count_tokens(text, LOCAL_MODEL)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.token_start == previous.token_end
+        assert chunk.start >= previous.end
+    assert " ".join(chunk.text for chunk in chunks).split() == text.split()
+
+def test_overlap_is_bounded():
+    text = make_document()
+    chunks = chunk_text_with_offsets(text, max_tokens=100, overlap_tokens=20, model=LOCAL_MODEL)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.token_end - 20 <= chunk.token_start < previous.token_end
+        assert chunk.token_end - chunk.token_start <= 100
+
+def test_splits_prefer_paragraph_breaks():
+    text = make_document(sections=1, paragraphs=12)
+    paragraph_tokens = count_tokens(text.split("\n\n")[1], LOCAL_MODEL)
+    chunks = chunk_text(text, max_tokens=3 * paragraph_tokens, model=LOCAL_MODEL)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.endswith("setup.")
+
+def test_invalid_overlap_is_rejected():
+    with pytest.raises(ValueError):
+        chunk_text_with_offsets("Some text.", max_tokens=10, overlap_tokens=5, model=LOCAL_MODEL)
+    with pytest.raises(ValueError):
+        chunk_text_with_offsets("Some text.", max_tokens=10, overlap_tokens=-1, model=LOCAL_MODEL)
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text_with_offsets("", model=LOCAL_MODEL) == []
+    assert chunk_text(" \n\n ", model=LOCAL_MODEL) == []
+
+def test_local_encoding_round_trips_any_text():
+    encoding = LocalEncoding()
+    text = "Résumé:  AMT\tprovisioning — déjà vu 测试\n\nend. "
+    tokens = encoding.encode_ordinary(text)
+    assert encoding.decode(tokens) == text
+    assert b"".join(encoding.decode_single_token_bytes(token) for token in tokens) == text.encode("utf-8")
+    assert all(token <= encoding.max_token_value for token in tokens)
+
+def test_truncate_cuts_at_a_sentence_end():
+    text = make_document(sections=1, paragraphs=2)
+    truncated, tokens = truncate_to_tokens(text, 50, model=LOCAL_MODEL)
+    assert tokens <= 50
+    assert truncated.endswith(".")
+    assert text.startswith(truncated)